@@ -0,0 +1,28 @@
+"""add_vector_store_soft_delete
+
+Revision ID: 5b8e0d4c7a19
+Revises: c3f7a9e21b54
+Create Date: 2026-10-18 10:03:27.584120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8e0d4c7a19'
+down_revision = 'c3f7a9e21b54'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 软删除标记，向量缓存通过墓碑查询增量移除已删除的行
+    op.add_column('vector_store', sa.Column('is_deleted', sa.Boolean(), server_default=sa.false(), nullable=False, comment='软删除标记，供向量缓存增量刷新识别删除'))
+    # 增量刷新按 updated_at 高水位查询
+    op.create_index(op.f('ix_vector_store_updated_at'), 'vector_store', ['updated_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_vector_store_updated_at'), table_name='vector_store')
+    op.drop_column('vector_store', 'is_deleted')
@@ -0,0 +1,63 @@
+"""add_vector_store_content_hash
+
+Revision ID: 9a4d6e2f1c83
+Revises: 5b8e0d4c7a19
+Create Date: 2026-10-18 11:26:51.902417
+
+"""
+import hashlib
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4d6e2f1c83'
+down_revision = '5b8e0d4c7a19'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 500
+
+
+def _content_hash(content):
+    # 与 app.services.knowledge_ingestion.content_hash 保持一致
+    return hashlib.sha256(re.sub(r'\s+', ' ', content or '').strip().encode('utf-8')).hexdigest()
+
+
+def upgrade():
+    op.add_column('vector_store', sa.Column('content_hash', sa.String(length=64), nullable=True, comment='内容哈希(SHA-256)，批量导入时用于去重'))
+    op.create_index(op.f('ix_vector_store_content_hash'), 'vector_store', ['content_hash'], unique=False)
+
+    # 分批回填已有数据
+    bind = op.get_bind()
+    vector_store = sa.table(
+        'vector_store',
+        sa.column('id', sa.Integer),
+        sa.column('content', sa.Text),
+        sa.column('content_hash', sa.String),
+    )
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(vector_store.c.id, vector_store.c.content)
+            .where(vector_store.c.id > last_id)
+            .order_by(vector_store.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+
+        bind.execute(
+            vector_store.update()
+            .where(vector_store.c.id == sa.bindparam('row_id'))
+            .values(content_hash=sa.bindparam('hash')),
+            [{'row_id': row.id, 'hash': _content_hash(row.content)} for row in rows]
+        )
+        last_id = rows[-1].id
+
+
+def downgrade():
+    op.drop_index(op.f('ix_vector_store_content_hash'), table_name='vector_store')
+    op.drop_column('vector_store', 'content_hash')
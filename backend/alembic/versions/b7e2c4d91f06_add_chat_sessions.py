@@ -0,0 +1,51 @@
+"""add_chat_sessions
+
+Revision ID: b7e2c4d91f06
+Revises: 9a4d6e2f1c83
+Create Date: 2026-10-18 16:42:13.318205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2c4d91f06'
+down_revision = '9a4d6e2f1c83'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('chat_sessions',
+    sa.Column('session_id', sa.String(length=64), nullable=False, comment='会话ID，由客户端生成'),
+    sa.Column('user_id', sa.Integer(), nullable=True, comment='用户ID'),
+    sa.Column('summary', sa.Text(), nullable=True, comment='已滚出内存窗口的早期对话摘要'),
+    sa.Column('summarized_turns', sa.Integer(), server_default='0', nullable=False, comment='摘要已覆盖的轮次'),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True, comment='创建时间'),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True, comment='更新时间'),
+    sa.PrimaryKeyConstraint('session_id'),
+    comment='AI 对话会话表'
+    )
+    op.create_index(op.f('ix_chat_sessions_user_id'), 'chat_sessions', ['user_id'], unique=False)
+    op.create_table('chat_turns',
+    sa.Column('id', sa.Integer(), nullable=False, comment='主键ID'),
+    sa.Column('session_id', sa.String(length=64), nullable=False, comment='会话ID'),
+    sa.Column('turn', sa.Integer(), nullable=False, comment='轮次，从 1 开始'),
+    sa.Column('question', sa.Text(), nullable=False, comment='用户问题'),
+    sa.Column('answer', sa.Text(), nullable=False, comment='AI 回答'),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True, comment='创建时间'),
+    sa.ForeignKeyConstraint(['session_id'], ['chat_sessions.session_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    comment='AI 对话轮次表'
+    )
+    op.create_index(op.f('ix_chat_turns_id'), 'chat_turns', ['id'], unique=False)
+    op.create_index('ix_chat_turns_session_turn', 'chat_turns', ['session_id', 'turn'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_chat_turns_session_turn', table_name='chat_turns')
+    op.drop_index(op.f('ix_chat_turns_id'), table_name='chat_turns')
+    op.drop_table('chat_turns')
+    op.drop_index(op.f('ix_chat_sessions_user_id'), table_name='chat_sessions')
+    op.drop_table('chat_sessions')
@@ -0,0 +1,95 @@
+"""add_binary_embedding_to_vector_store
+
+Revision ID: c3f7a9e21b54
+Revises: d2abe0592480
+Create Date: 2026-10-18 09:12:40.316205
+
+"""
+import json
+
+from alembic import op
+import numpy as np
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f7a9e21b54'
+down_revision = 'd2abe0592480'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 500
+
+
+def upgrade():
+    op.add_column('vector_store', sa.Column('embedding_bin', sa.LargeBinary(), nullable=True, comment='向量数据(小端二进制)'))
+    op.add_column('vector_store', sa.Column('embedding_dtype', sa.String(length=16), nullable=True, comment='二进制向量类型: float32 / float16'))
+    # JSON 列只作为过渡期的读取兜底，新数据不再写入
+    op.alter_column('vector_store', 'embedding', existing_type=sa.Text(), nullable=True)
+
+    # 分批回填已有数据为小端 float32
+    bind = op.get_bind()
+    vector_store = sa.table(
+        'vector_store',
+        sa.column('id', sa.Integer),
+        sa.column('embedding', sa.Text),
+        sa.column('embedding_bin', sa.LargeBinary),
+        sa.column('embedding_dtype', sa.String),
+    )
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(vector_store.c.id, vector_store.c.embedding)
+            .where(vector_store.c.id > last_id)
+            .where(vector_store.c.embedding_bin.is_(None))
+            .where(vector_store.c.embedding.isnot(None))
+            .order_by(vector_store.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+
+        updates = []
+        for row in rows:
+            try:
+                data = np.asarray(json.loads(row.embedding), dtype='<f4').tobytes()
+            except (ValueError, TypeError):
+                continue
+            updates.append({'row_id': row.id, 'embedding_bin': data, 'embedding_dtype': 'float32'})
+
+        if updates:
+            bind.execute(
+                vector_store.update()
+                .where(vector_store.c.id == sa.bindparam('row_id'))
+                .values(embedding_bin=sa.bindparam('embedding_bin'), embedding_dtype=sa.bindparam('embedding_dtype')),
+                updates
+            )
+        last_id = rows[-1].id
+
+
+def downgrade():
+    # 将二进制向量写回 JSON 列后再删除新列
+    bind = op.get_bind()
+    vector_store = sa.table(
+        'vector_store',
+        sa.column('id', sa.Integer),
+        sa.column('embedding', sa.Text),
+        sa.column('embedding_bin', sa.LargeBinary),
+        sa.column('embedding_dtype', sa.String),
+    )
+    dtypes = {'float32': '<f4', 'float16': '<f2'}
+    rows = bind.execute(
+        sa.select(vector_store.c.id, vector_store.c.embedding_bin, vector_store.c.embedding_dtype)
+        .where(vector_store.c.embedding.is_(None))
+    ).fetchall()
+    for row in rows:
+        vector = np.frombuffer(row.embedding_bin, dtype=dtypes.get(row.embedding_dtype, '<f4'))
+        bind.execute(
+            vector_store.update()
+            .where(vector_store.c.id == row.id)
+            .values(embedding=json.dumps(vector.astype(float).tolist()))
+        )
+
+    op.alter_column('vector_store', 'embedding', existing_type=sa.Text(), nullable=False)
+    op.drop_column('vector_store', 'embedding_dtype')
+    op.drop_column('vector_store', 'embedding_bin')
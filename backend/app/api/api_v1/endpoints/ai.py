@@ -3,6 +3,8 @@ from fastapi import APIRouter, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from app.services.ai_service import AIAssistant
+from app.services.llm_admission import AdmissionRejected, get_admission_controller
+from app.services.chat_session import SessionForbidden, get_session_store
 from typing import Optional, List
 from app.schemas.ai_message import ChatMessage, ChatResponse
 import json
@@ -13,9 +15,18 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 ai_assistant = AIAssistant()
 
+def too_many_requests(e: AdmissionRejected) -> HTTPException:
+    """上游请求被准入控制拒绝时返回 429"""
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+def forbidden(e: SessionForbidden) -> HTTPException:
+    """会话属于其他用户时返回 403"""
+    return HTTPException(status_code=403, detail=str(e))
+
 # 基础对话相关模型
 class BasicChatRequest(BaseModel):
     message: str = Field(..., description="用户问题")
+    session_id: Optional[str] = Field(None, max_length=64, description="会话ID，由客户端生成；提供时服务端保存对话并在回答时参考此前的对话")
 
 # 健康咨询相关模型
 class SleepSchedule(BaseModel):
@@ -34,7 +45,12 @@ class UserHealthData(BaseModel):
 
 class HealthChatRequest(BaseModel):
     message: str = Field(..., description="健康咨询问题")
-    user_data: UserHealthData = Field(..., description="用户健康数据")
+    user_data: Optional[UserHealthData] = Field(None, description="用户健康数据，未提供的字段由服务端记录补全")
+    user_id: Optional[int] = Field(None, description="用户ID，提供时从服务端读取近期健康、睡眠、运动记录")
+    session_id: Optional[str] = Field(None, max_length=64, description="会话ID，由客户端生成；提供时服务端保存对话并在回答时参考此前的对话")
+
+    def user_data_dict(self) -> dict:
+        return self.user_data.dict(exclude_none=True) if self.user_data else {}
 
 class HealthKnowledge(BaseModel):
     content: str
@@ -45,13 +61,18 @@ async def basic_chat(request: BasicChatRequest):
     """普通对话接口：用于一般性问题咨询"""
     try:
         response = await ai_assistant.get_response(
-            message=request.message
+            message=request.message,
+            session_id=request.session_id
         )
         return ChatResponse(
             code=0,
-            data={"response": response},
+            data={"response": response, "session_id": request.session_id},
             msg="success"
         )
+    except AdmissionRejected as e:
+        raise too_many_requests(e)
+    except SessionForbidden as e:
+        raise forbidden(e)
     except Exception as e:
         logger.error(f"对话失败: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -60,11 +81,18 @@ async def basic_chat(request: BasicChatRequest):
 async def basic_chat_stream(request: BasicChatRequest):
     """流式对话接口：用于一般性问题咨询（流式响应）"""
     try:
+        # 开始流式响应后无法再修改状态码，排队已满时先返回 429
+        get_admission_controller().check_capacity()
+        await ai_assistant.check_session(request.session_id, None)
+        
         async def generate():
             try:
-                async for chunk in ai_assistant.get_response_stream(message=request.message):
+                async for chunk in ai_assistant.get_response_stream(
+                    message=request.message,
+                    session_id=request.session_id
+                ):
                     yield f"data: {json.dumps({'content': chunk, 'done': False}, ensure_ascii=False)}\n\n"
-                yield f"data: {json.dumps({'content': '', 'done': True}, ensure_ascii=False)}\n\n"
+                yield f"data: {json.dumps({'content': '', 'done': True, 'session_id': request.session_id}, ensure_ascii=False)}\n\n"
             except Exception as e:
                 logger.error(f"流式对话失败: {str(e)}")
                 yield f"data: {json.dumps({'error': str(e), 'done': True}, ensure_ascii=False)}\n\n"
@@ -79,6 +107,10 @@ async def basic_chat_stream(request: BasicChatRequest):
                 "Access-Control-Allow-Headers": "*",
             }
         )
+    except AdmissionRejected as e:
+        raise too_many_requests(e)
+    except SessionForbidden as e:
+        raise forbidden(e)
     except Exception as e:
         logger.error(f"流式对话初始化失败: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -89,13 +121,19 @@ async def health_chat(request: HealthChatRequest):
     try:
         response = await ai_assistant.get_response(
             message=request.message,
-            user_data=request.user_data.dict(exclude_none=True)
+            user_data=request.user_data_dict(),
+            user_id=request.user_id,
+            session_id=request.session_id
         )
         return ChatResponse(
             code=0,
-            data={"response": response},
+            data={"response": response, "session_id": request.session_id},
             msg="success"
         )
+    except AdmissionRejected as e:
+        raise too_many_requests(e)
+    except SessionForbidden as e:
+        raise forbidden(e)
     except Exception as e:
         logger.error(f"健康咨询失败: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -104,14 +142,20 @@ async def health_chat(request: HealthChatRequest):
 async def health_chat_stream(request: HealthChatRequest):
     """流式健康咨询接口：用于提供个性化健康建议（流式响应）"""
     try:
+        # 开始流式响应后无法再修改状态码，排队已满时先返回 429
+        get_admission_controller().check_capacity()
+        await ai_assistant.check_session(request.session_id, request.user_id)
+        
         async def generate():
             try:
                 async for chunk in ai_assistant.get_response_stream(
                     message=request.message,
-                    user_data=request.user_data.dict(exclude_none=True)
+                    user_data=request.user_data_dict(),
+                    user_id=request.user_id,
+                    session_id=request.session_id
                 ):
                     yield f"data: {json.dumps({'content': chunk, 'done': False}, ensure_ascii=False)}\n\n"
-                yield f"data: {json.dumps({'content': '', 'done': True}, ensure_ascii=False)}\n\n"
+                yield f"data: {json.dumps({'content': '', 'done': True, 'session_id': request.session_id}, ensure_ascii=False)}\n\n"
             except Exception as e:
                 logger.error(f"流式健康咨询失败: {str(e)}")
                 yield f"data: {json.dumps({'error': str(e), 'done': True}, ensure_ascii=False)}\n\n"
@@ -126,6 +170,10 @@ async def health_chat_stream(request: HealthChatRequest):
                 "Access-Control-Allow-Headers": "*",
             }
         )
+    except AdmissionRejected as e:
+        raise too_many_requests(e)
+    except SessionForbidden as e:
+        raise forbidden(e)
     except Exception as e:
         logger.error(f"流式健康咨询初始化失败: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -141,6 +189,42 @@ async def add_knowledge(knowledge: HealthKnowledge):
         raise HTTPException(status_code=500, detail="添加知识失败")
     return {"message": "成功添加新知识"}
 
+@router.get("/sessions/{session_id}", response_model=ChatResponse)
+async def get_chat_session(session_id: str, user_id: Optional[int] = None):
+    """读取会话的摘要和最近几轮对话，会话不存在时返回 404"""
+    try:
+        conversation = await get_session_store().find(session_id, user_id)
+    except SessionForbidden as e:
+        raise forbidden(e)
+    except Exception as e:
+        logger.error(f"读取会话失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if conversation is None:
+        raise HTTPException(status_code=404, detail="会话不存在")
+    return ChatResponse(
+        code=0,
+        data={
+            "session_id": session_id,
+            "summary": conversation.summary,
+            "turns": [
+                {"turn": turn, "question": question, "answer": answer}
+                for turn, question, answer in conversation.turns
+            ],
+        },
+        msg="success"
+    )
 
+@router.delete("/sessions/{session_id}")
+async def delete_chat_session(session_id: str):
+    """删除会话及其全部对话记录"""
+    try:
+        await get_session_store().delete(session_id)
+        return {"message": "会话已删除"}
+    except Exception as e:
+        logger.error(f"删除会话失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-
+@router.get("/stats")
+async def get_ai_stats():
+    """AI 对话服务统计：语义回答缓存命中率、并发请求合并次数等"""
+    return ai_assistant.get_stats()
@@ -5,6 +5,7 @@ from typing import List, Optional
 from datetime import date, datetime, time
 from app.db.session import get_db
 from app.models import HealthGoal, HealthReminder, GoalStatus, GoalType, ReminderType, ReminderFrequency
+from app.services.health_profile import invalidate_health_profile
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -161,6 +162,7 @@ async def create_health_goal(
     db.add(new_goal)
     db.commit()
     db.refresh(new_goal)
+    invalidate_health_profile(new_goal.user_id)
     
     # 计算进度和剩余天数
     progress = (new_goal.current_value or 0) / new_goal.target_value * 100 if new_goal.target_value > 0 else 0
@@ -203,6 +205,7 @@ async def update_health_goal(
     goal.updated_at = datetime.utcnow()
     db.commit()
     db.refresh(goal)
+    invalidate_health_profile(goal.user_id)
     
     # 计算进度和剩余天数
     progress = (goal.current_value or 0) / goal.target_value * 100 if goal.target_value > 0 else 0
@@ -238,6 +241,7 @@ async def delete_health_goal(
     
     db.delete(goal)
     db.commit()
+    invalidate_health_profile(goal.user_id)
     
     return {"message": "目标已删除"}
 
@@ -2,12 +2,16 @@
 RAG服务管理和监控接口
 """
 
+import asyncio
 import logging
 import time
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, File, Form, HTTPException, UploadFile
 from pydantic import BaseModel
 from app.services.rag_factory import get_rag_service, RAGFactory, reset_rag_service
-from typing import List, Dict, Any
+from app.services.answer_cache import get_answer_cache
+from app.services.knowledge_ingestion import KnowledgeIngestor, detect_format, parse_documents
+from app.services.rag_benchmark import LABELED_QUERIES, benchmark_service
+from typing import List, Dict, Any, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +20,8 @@ router = APIRouter()
 class RAGTestRequest(BaseModel):
     query: str
     k: int = 2
+    filters: Optional[Dict[str, Any]] = None  # {"source": ..., "topic": [...], "tags": [...]}
+    mmr_lambda: Optional[float] = None  # 不为空时使用 MMR 重排，越小结果越多样
 
 class RAGTestResponse(BaseModel):
     query: str
@@ -30,15 +36,41 @@ async def get_rag_info():
         performance_info = RAGFactory.get_performance_info()
         rag_service = get_rag_service()
         
+        index_report = None
+        if hasattr(rag_service, 'get_index_report'):
+            try:
+                # 抽样评估召回率需要数十次检索，放到工作线程中执行，不阻塞事件循环
+                index_report = await asyncio.to_thread(rag_service.get_index_report)
+            except Exception as e:
+                logger.warning(f"生成索引报告失败: {str(e)}")
+                index_report = {"error": str(e)}
+        
         return {
             "status": "active",
             "service_class": type(rag_service).__name__,
-            "performance_info": performance_info
+            "performance_info": performance_info,
+            "index_report": index_report
         }
     except Exception as e:
         logger.error(f"获取RAG信息失败: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/quantization/report")
+async def get_quantization_report(sample_size: int = 50, k: int = 10):
+    """并排比较精确、int8、PQ 向量表示的内存占用与召回率"""
+    try:
+        rag_service = get_rag_service()
+        if not hasattr(rag_service, 'get_quantization_report'):
+            return {
+                "message": "当前RAG服务不支持量化报告",
+                "service_type": type(rag_service).__name__
+            }
+        return await asyncio.to_thread(rag_service.get_quantization_report, sample_size, k)
+        
+    except Exception as e:
+        logger.error(f"生成量化报告失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/test", response_model=RAGTestResponse)
 async def test_rag_search(request: RAGTestRequest):
     """测试RAG搜索性能"""
@@ -49,9 +81,11 @@ async def test_rag_search(request: RAGTestRequest):
         
         # 根据服务类型选择搜索方法
         if hasattr(rag_service, 'search_similar_fast'):
-            results = await rag_service.search_similar_fast(request.query, request.k)
+            results = await rag_service.search_similar_fast(
+                request.query, request.k, request.filters, request.mmr_lambda
+            )
         else:
-            results = await rag_service.search_similar(request.query, request.k)
+            results = await rag_service.search_similar(request.query, request.k, request.filters, request.mmr_lambda)
         
         duration = time.time() - start_time
         
@@ -62,54 +96,47 @@ async def test_rag_search(request: RAGTestRequest):
             service_type=type(rag_service).__name__
         )
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"RAG搜索测试失败: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/benchmark")
-async def benchmark_rag():
-    """RAG性能基准测试"""
+@router.post("/ingest")
+async def ingest_knowledge(
+    file: UploadFile = File(..., description="JSON / JSONL / Markdown 知识文件"),
+    source: Optional[str] = Form(None, description="条目未指定来源时使用的默认来源"),
+    batch_size: Optional[int] = Form(None, description="每次 embedding 请求的文档数")
+):
+    """批量导入知识文件，已存储的内容按哈希跳过"""
+    try:
+        fmt = detect_format(file.filename or "")
+        text = (await file.read()).decode("utf-8")
+        documents = parse_documents(text, fmt, default_source=source)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"文件解析失败: {str(e)}")
+    
     try:
-        test_queries = [
-            "什么是健康饮食？",
-            "如何保持良好的睡眠？",
-            "运动对健康有什么好处？",
-            "怎样管理压力？",
-            "定期体检的重要性"
-        ]
-        
         rag_service = get_rag_service()
-        results = []
-        total_time = 0
-        
-        for query in test_queries:
-            start_time = time.time()
-            
-            if hasattr(rag_service, 'search_similar_fast'):
-                search_results = await rag_service.search_similar_fast(query, 2)
-            else:
-                search_results = await rag_service.search_similar(query, 2)
-            
-            duration = time.time() - start_time
-            total_time += duration
-            
-            results.append({
-                "query": query,
-                "duration": duration,
-                "result_count": len(search_results),
-                "results": search_results
-            })
+        ingestor = KnowledgeIngestor(rag_service.embeddings, batch_size=batch_size)
+        report = await ingestor.ingest(documents)
+        if report["inserted"]:
+            get_answer_cache().invalidate()
+        return {"filename": file.filename, "format": fmt, **report}
         
-        avg_time = total_time / len(test_queries)
-        
-        return {
-            "service_type": type(rag_service).__name__,
-            "total_queries": len(test_queries),
-            "total_time": total_time,
-            "average_time": avg_time,
-            "results": results,
-            "performance_rating": "excellent" if avg_time < 0.1 else "good" if avg_time < 0.5 else "needs_improvement"
-        }
+    except Exception as e:
+        logger.error(f"批量导入失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/benchmark")
+async def benchmark_rag(k: int = 2, concurrency: int = 4):
+    """
+    RAG基准测试：并发执行带主题标注的查询集，
+    返回 p50/p95/p99 延迟、吞吐、主题 MRR 以及相对精确检索的 recall@k
+    """
+    try:
+        rag_service = get_rag_service()
+        return await benchmark_service(rag_service, LABELED_QUERIES, k=k, concurrency=concurrency)
         
     except Exception as e:
         logger.error(f"RAG基准测试失败: {str(e)}")
@@ -137,16 +164,8 @@ async def get_cache_stats():
     try:
         rag_service = get_rag_service()
         
-        if hasattr(rag_service, '_embedding_cache'):
-            cache_size = len(rag_service._embedding_cache)
-            vector_cache_size = len(rag_service._vector_cache) if rag_service._vector_cache else 0
-            
-            return {
-                "embedding_cache_size": cache_size,
-                "vector_cache_size": vector_cache_size,
-                "cache_ttl": getattr(rag_service, '_cache_ttl', 0),
-                "last_cache_refresh": getattr(rag_service, '_cache_timestamp', 0)
-            }
+        if hasattr(rag_service, 'get_cache_stats'):
+            return rag_service.get_cache_stats()
         else:
             return {
                 "message": "当前RAG服务不支持缓存统计",
@@ -167,6 +186,7 @@ async def clear_cache():
             rag_service._embedding_cache.clear()
             rag_service._vector_cache = None
             rag_service._cache_timestamp = 0
+            get_answer_cache().invalidate()
             
             return {
                 "message": "RAG缓存已清空",
@@ -5,6 +5,9 @@ from urllib.parse import quote_plus
 from pydantic_settings import BaseSettings
 from pydantic import Field
 
+# 后端根目录（backend/），配置中的相对路径按此解析，不依赖启动时的工作目录
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 
 class Settings(BaseSettings):
     # 项目配置
@@ -34,11 +37,90 @@ class Settings(BaseSettings):
     OPENAI_BASE_URL: str = Field(..., description="OpenAI API基础URL")
     OPENAI_MODEL: str = Field("gpt-3.5-turbo", description="OpenAI模型名称")
     
+    # 回答缓存配置（仅通用对话，不含个性化健康咨询）
+    AI_ANSWER_CACHE_ENABLED: bool = Field(True, description="是否启用语义回答缓存")
+    AI_ANSWER_CACHE_SIZE: int = Field(1000, description="语义回答缓存最大条数")
+    AI_ANSWER_CACHE_TTL: int = Field(3600, description="语义回答缓存过期时间（秒）")
+    AI_ANSWER_CACHE_THRESHOLD: float = Field(0.95, description="问题 embedding 余弦相似度达到该值时复用缓存的回答")
+    AI_COALESCE_REQUESTS: bool = Field(True, description="是否合并相同问题的并发生成请求（流式请求共用一个上游流）")
+    
+    # 上游请求准入控制
+    AI_MAX_IN_FLIGHT: int = Field(16, description="同时进行的上游对话/embedding 请求数上限")
+    AI_MAX_QUEUE: int = Field(64, description="等待名额的请求数上限，超出后返回 429")
+    AI_QUEUE_TIMEOUT: float = Field(10.0, description="请求排队等待名额的最长时间（秒），超时返回 429")
+    AI_RATE_LIMIT_RPM: float = Field(0, description="每个模型每分钟请求数上限，0 表示不限速")
+    AI_MODEL_RATE_LIMITS: Dict[str, float] = Field({}, description="按模型名单独设置的每分钟请求数上限，覆盖 AI_RATE_LIMIT_RPM")
+    
+    # 个性化咨询上下文构建
+    AI_CONTEXT_RETRIEVAL_TIMEOUT: float = Field(3.0, description="构建上下文时知识检索的超时（秒），超时后不带参考知识回答")
+    AI_CONTEXT_RECORDS_TIMEOUT: float = Field(1.0, description="构建上下文时读取用户健康档案的超时（秒），超时后本次回答不使用服务端记录")
+    AI_PROFILE_CACHE_SIZE: int = Field(10000, description="用户健康档案缓存的最大用户数")
+    AI_PROFILE_CACHE_TTL: int = Field(3600, description="用户健康档案缓存过期时间（秒），数据变更时会立即失效")
+
+    # 提示词 token 预算
+    AI_TOKENIZER: str = Field("tiktoken", description="token 计数方式：tiktoken（编码文件不可用时自动退回估算）或 estimate")
+    AI_CONTEXT_WINDOW: int = Field(4096, description="模型上下文窗口的 token 数")
+    AI_MAX_COMPLETION_TOKENS: int = Field(800, description="单次回答的最大 token 数")
+    AI_PROMPT_MAX_TOKENS: int = Field(2400, description="对话提示词（系统提示词、参考资料、问题）的 token 上限，实际不超过上下文窗口减去回答长度")
+    AI_AGENT_PROMPT_MAX_TOKENS: int = Field(1200, description="个性化咨询提示词（系统提示词、模板、参考知识、健康档案、饮食记录、问题）的 token 上限")
+
+    # 对话会话
+    AI_SESSION_ENABLED: bool = Field(True, description="是否启用服务端对话会话（请求带 session_id 时生效）")
+    AI_SESSION_CACHE_SIZE: int = Field(10000, description="内存中保留的会话数上限，超出后按 LRU 淘汰，淘汰的会话下次访问时从数据库加载")
+    AI_SESSION_IDLE_TTL: int = Field(1800, description="会话在内存中的空闲过期时间（秒）")
+    AI_SESSION_MAX_TURNS: int = Field(6, description="每个会话在内存和提示词中保留的最近对话轮数")
+    AI_SESSION_SUMMARY_BATCH: int = Field(4, description="滚出最近窗口的轮数达到该值时合并进会话摘要")
+    AI_SESSION_SUMMARY_MAX_TOKENS: int = Field(300, description="会话摘要的最大 token 数")
+    
     # RAG 优化配置
     RAG_USE_OPTIMIZED: bool = Field(True, description="是否使用优化的RAG服务")
     RAG_CACHE_TTL: int = Field(300, description="RAG缓存过期时间（秒）")
+    RAG_CACHE_DELTA_OVERLAP: int = Field(60, description="向量缓存增量刷新的回看窗口（秒）")
+    RAG_CACHE_FULL_REFRESH_INTERVAL: int = Field(86400, description="向量缓存全量刷新间隔（秒）")
     RAG_ENABLE_KEYWORD_SEARCH: bool = Field(True, description="是否启用关键词搜索")
+    RAG_BM25_K1: float = Field(1.5, description="BM25 词频饱和参数 k1")
+    RAG_BM25_B: float = Field(0.75, description="BM25 文档长度归一化参数 b")
+    RAG_LEXICAL_MIN_COVERAGE: float = Field(0.7, description="BM25 首条结果覆盖查询词的比例达到该值时跳过向量检索")
+    RAG_HYBRID_CANDIDATES: int = Field(20, description="混合检索时每路召回的候选数量")
+    RAG_RRF_K: int = Field(60, description="倒数排名融合常数 k")
+    RAG_FUSION_WEIGHT_BM25: float = Field(1.0, description="融合排序中 BM25 的权重")
+    RAG_FUSION_WEIGHT_VECTOR: float = Field(1.0, description="融合排序中向量检索的权重")
+    RAG_FUSION_WEIGHT_KEYWORD: float = Field(0.5, description="融合排序中关键词索引的权重")
     RAG_EMBEDDING_CACHE_SIZE: int = Field(1000, description="Embedding缓存大小")
+    RAG_EMBEDDING_CACHE_TTL: int = Field(0, description="Embedding缓存过期时间（秒），0表示不过期")
+    RAG_EMBEDDING_CACHE_MAX_BYTES: int = Field(64 * 1024 * 1024, description="Embedding缓存最大字节数")
+    RAG_EMBEDDING_STORAGE_DTYPE: str = Field("float32", description="向量二进制存储类型: float32 / float16")
+    RAG_INGEST_BATCH_SIZE: int = Field(64, description="批量导入时每次 embedding 请求的文档数")
+    RAG_INGEST_CONCURRENCY: int = Field(4, description="批量导入时并发的 embedding 请求数")
+    RAG_INGEST_INSERT_BATCH: int = Field(500, description="批量导入时每条多行 INSERT 的行数")
+    RAG_CHUNKING_ENABLED: bool = Field(True, description="是否将长文档切分为片段后再生成向量")
+    RAG_CHUNK_SIZE: int = Field(300, description="文档片段最大字符数")
+    RAG_CHUNK_OVERLAP: int = Field(50, description="相邻片段重叠的字符数")
+    RAG_COLLAPSE_CHUNKS: bool = Field(True, description="检索时是否合并同一文档的多个命中片段")
+    RAG_EMBEDDING_PROVIDER: str = Field("openai", description="Embedding提供方: openai / hashing（本地字符n-gram哈希，离线可用）")
+    RAG_EMBEDDING_MODEL: str = Field("text-embedding-ada-002", description="Embedding模型名称")
+    RAG_HASHING_DIMENSION: int = Field(512, description="本地哈希Embedding的维度")
+    RAG_HASHING_NGRAM: int = Field(3, description="本地哈希Embedding使用的最大字符n-gram长度")
+    RAG_PERSISTENT_CACHE_PATH: Optional[str] = Field(None, description="持久化Embedding缓存文件路径（SQLite），相对路径按 backend 目录解析，为空时禁用")
+    RAG_PERSISTENT_CACHE_MAX_ROWS: int = Field(100000, description="持久化Embedding缓存最大条数，超出后按最近访问时间压缩")
+    RAG_PERSISTENT_CACHE_WARM_SIZE: int = Field(500, description="启动时从持久化缓存预热到内存的条数")
+
+    # 向量索引配置
+    RAG_VECTOR_INDEX: str = Field("exact", description="向量索引类型: exact / hnsw / ivfpq / int8 / pq")
+    RAG_INDEX_PATH: Optional[str] = Field(None, description="向量索引持久化目录，为空则不落盘")
+    RAG_SNAPSHOT_DIR: Optional[str] = Field(None, description="多个 worker 共享的向量快照目录（内存映射），为空时每个进程各自从数据库加载")
+    RAG_HNSW_M: int = Field(32, description="HNSW 每个节点的邻居数")
+    RAG_HNSW_EF_CONSTRUCTION: int = Field(200, description="HNSW 构建时的搜索宽度")
+    RAG_HNSW_EF_SEARCH: int = Field(64, description="HNSW 查询时的搜索宽度")
+    RAG_IVF_NLIST: int = Field(1024, description="IVF 聚类中心数量")
+    RAG_IVF_NPROBE: int = Field(16, description="IVF 查询时探测的聚类数量")
+    RAG_PQ_M: int = Field(64, description="PQ 子量化器数量")
+    RAG_PQ_NBITS: int = Field(8, description="PQ 每个子量化器的编码位数")
+    RAG_RESCORE_FACTOR: int = Field(4, description="近似/量化索引召回 k 的倍数个候选，再用全精度向量重排")
+    RAG_RESCORE_VECTORS_DIR: Optional[str] = Field(None, description="使用 int8 / pq / ivfpq 量化索引时，全精度向量写入该目录下的临时文件并以内存映射读取，重排时按需换入；为空时使用系统临时目录")
+    RAG_MMR_ENABLED: bool = Field(False, description="检索结果是否默认使用最大边际相关性（MMR）重排")
+    RAG_MMR_LAMBDA: float = Field(0.7, description="MMR 相关性权重，越小结果越多样")
+    RAG_DUPLICATE_THRESHOLD: float = Field(0.95, description="候选与已选结果的余弦相似度不低于该值时视为近似重复并丢弃")
 
     @property
     def SQLALCHEMY_DATABASE_URI(self) -> str:
@@ -1,3 +1,6 @@
+import asyncio
+import logging
+
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
@@ -8,10 +11,12 @@ from app.core.logging import setup_logging
 from app.core.middleware import setup_middlewares
 from app.db.init_db import init_db
 from app.db.session import get_db
+from app.services.chat_session import get_session_store
 from fastapi.staticfiles import StaticFiles
 
 # 设置日志
 setup_logging()
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -63,6 +68,17 @@ async def startup_event():
     init_db(db)
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """
+    应用程序关闭时等待会话记录写入完成
+    """
+    try:
+        await asyncio.wait_for(get_session_store().flush(), timeout=10)
+    except asyncio.TimeoutError:
+        logger.warning("关闭时会话记录未能在 10 秒内写完")
+
+
     
 # # 添加静态文件服务
 # app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -9,6 +9,7 @@ from .health_goals import HealthGoal
 from .sleep_record import SleepRecord
 from .symptom_records import SymptomRecord
 from .health_data import HealthData
+from .chat_session import ChatSession, ChatTurn
 
 # 导出所有模型，确保 Alembic 能够检测到它们
 __all__ = [
@@ -19,5 +20,7 @@ __all__ = [
     "HealthGoal",
     "SleepRecord",
     "SymptomRecord",
-    "HealthData"
+    "HealthData",
+    "ChatSession",
+    "ChatTurn"
 ]
@@ -0,0 +1,38 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index
+from sqlalchemy.sql import func
+from .base import Base
+
+
+class ChatSession(Base):
+    __tablename__ = "chat_sessions"
+
+    session_id = Column(String(64), primary_key=True, comment='会话ID，由客户端生成')
+    # 匿名会话没有用户ID，不加外键约束，避免客户端传入无效用户ID时丢失对话记录
+    user_id = Column(Integer, nullable=True, index=True, comment='用户ID')
+    summary = Column(Text, nullable=True, comment='已滚出内存窗口的早期对话摘要')
+    summarized_turns = Column(Integer, nullable=False, default=0, server_default='0', comment='摘要已覆盖的轮次')
+    created_at = Column(DateTime, server_default=func.current_timestamp(), comment='创建时间')
+    updated_at = Column(DateTime, server_default=func.current_timestamp(),
+                        onupdate=func.current_timestamp(), comment='更新时间')
+
+    __table_args__ = (
+        {"comment": "AI 对话会话表"}
+    )
+
+
+class ChatTurn(Base):
+    __tablename__ = "chat_turns"
+
+    id = Column(Integer, primary_key=True, index=True, comment='主键ID')
+    session_id = Column(String(64), ForeignKey("chat_sessions.session_id", ondelete="CASCADE"),
+                        nullable=False, comment='会话ID')
+    # 一行保存一轮问答
+    turn = Column(Integer, nullable=False, comment='轮次，从 1 开始')
+    question = Column(Text, nullable=False, comment='用户问题')
+    answer = Column(Text, nullable=False, comment='AI 回答')
+    created_at = Column(DateTime, server_default=func.current_timestamp(), comment='创建时间')
+
+    __table_args__ = (
+        Index("ix_chat_turns_session_turn", "session_id", "turn", unique=True),
+        {"comment": "AI 对话轮次表"}
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime
+from sqlalchemy import Boolean, Column, Integer, String, Text, DateTime, LargeBinary, false
 from sqlalchemy.sql import func
 from app.models.base import Base
 
@@ -7,9 +7,14 @@ class VectorStore(Base):
     
     id = Column(Integer, primary_key=True, index=True, comment='主键ID')
     content = Column(Text, nullable=False, comment='文本内容')
-    embedding = Column(Text, nullable=False, comment='向量数据(JSON格式)')
+    embedding = Column(Text, nullable=True, comment='向量数据(JSON格式，仅作旧数据兼容读取)')
+    embedding_bin = Column(LargeBinary, nullable=True, comment='向量数据(小端二进制)')
+    embedding_dtype = Column(String(16), nullable=True, comment='二进制向量类型: float32 / float16')
+    content_hash = Column(String(64), nullable=True, index=True, comment='内容哈希(SHA-256)，批量导入时用于去重')
     source = Column(String(255), nullable=True, comment='来源文档')
     meta_info = Column(Text, nullable=True, comment='元数据(JSON格式)')  # 将 metadata 改为 meta_info
     created_at = Column(DateTime, server_default=func.current_timestamp(), comment='创建时间')
     updated_at = Column(DateTime, server_default=func.current_timestamp(), 
-                       onupdate=func.current_timestamp(), comment='更新时间')
\ No newline at end of file
+                       onupdate=func.current_timestamp(), index=True, comment='更新时间')
+    is_deleted = Column(Boolean, nullable=False, default=False, server_default=false(),
+                        comment='软删除标记，供向量缓存增量刷新识别删除')
\ No newline at end of file
@@ -1,10 +1,21 @@
 from openai import AsyncOpenAI
 from app.core.config import settings
 from app.services.rag_factory import get_rag_service
+from app.services.answer_cache import get_answer_cache, replay_chunks
+from app.services.embedding_cache import normalize_query
+from app.services.single_flight import SingleFlight
+from app.services.llm_admission import PRIORITY_BULK, PRIORITY_INTERACTIVE, AdmissionRejected, get_admission_controller
+from app.services.health_profile import get_profile_cache
+from app.services.prompt_budget import PromptAssembler, TokenCounter, get_prompt_usage, prompt_usage_stats
+from app.services.prompt_templates import get_template
+from app.services.chat_session import (
+    ConversationState, SessionForbidden, Turn, conversation_skeleton, format_turn, get_session_store,
+    render_conversation
+)
 from app.services.base import AIBase
 import logging
 from fastapi import HTTPException
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 import importlib
 import httpx
 
@@ -31,123 +42,116 @@ class AIAssistant(AIBase):
         
         # 使用RAG工厂获取最优的RAG服务
         self.rag = get_rag_service()
+        # 合并相同问题的并发生成请求
+        self._flight = SingleFlight("chat")
+        # 启动时加载 tokenizer，离线时在这里一次性退回估算，不在请求中重试
+        self.token_counter = TokenCounter(settings.OPENAI_MODEL)
         
         # 延迟导入 HealthAgent
         HealthAgent = importlib.import_module('app.services.health_agent').HealthAgent
         self.health_agent = HealthAgent(self)
 
-        self.system_prompt = """
-        你是一个专业的健康助手。请基于提供的参考信息来回答用户的问题。
-        如果参考信息不足以完整回答问题，可以补充其他相关的专业知识。
+        self.system_prompt = get_template("system").text
+        self.chat_template = get_template("chat")
         
-        注意事项：
-        1. 优先使用参考信息中的内容
-        2. 确保回答准确专业
-        3. 使用通俗易懂的语言
-        4. 给出具体、可执行的建议
-        5. 不要提供医疗诊断或治疗建议
-        """
+        # 对话会话，滚出最近窗口的轮次由本实例生成摘要
+        self.sessions = get_session_store()
+        if self.sessions.summarizer is None:
+            self.sessions.summarizer = self._summarize_turns
 
-    async def get_response(self, message: str, user_data: Optional[Dict] = None) -> str:
+    async def _lookup_cached_answer(self, message: str):
         """
-        获取 AI 回答，如果提供了用户数据，则使用 HealthAgent 处理
+        通用对话的语义回答缓存查询，返回 (命中的缓存条目, 问题 embedding)
+        缓存未启用或查询失败时 embedding 为 None，回答生成后也不写入缓存
         """
+        if not settings.AI_ANSWER_CACHE_ENABLED:
+            return None, None
         try:
-            # 如果有用户数据，使用 HealthAgent 处理
-            if user_data is not None:
-                return await self.health_agent.process_request(message, user_data)
-
-            # 否则使用普通的 RAG 处理
-            similar_docs = await self.rag.search_similar(message, k=3)
-            context = "\n\n".join([
-                f"参考信息 {i+1}：{doc['content']}"
-                for i, doc in enumerate(similar_docs)
-            ])
-            
-            messages = [
-                {"role": "system", "content": self.system_prompt},
-                {"role": "user", "content": f"""
-参考以下信息：
+            embedding = await self.rag.embed_query(message)
+            return get_answer_cache().lookup(embedding, self._knowledge_version()), embedding
+        except Exception as e:
+            logger.warning(f"回答缓存查询失败，跳过缓存: {str(e)}")
+            return None, None
 
-{context}
+    def _knowledge_version(self) -> Optional[int]:
+        return getattr(self.rag, "knowledge_version", None)
 
-用户问题：{message}
+    async def _build_messages(self, message: str, conversation: Optional[ConversationState] = None):
+        """检索参考信息并组装通用对话的消息，同时返回检索后的知识库版本"""
+        similar_docs = await self.rag.search_similar(message, k=3)
+        # 检索时可能刷新了向量缓存，以检索后的知识库版本作为回答的版本
+        version = self._knowledge_version()
+        logger.info(f"找到 {len(similar_docs)} 个相关文档")
+        
+        # 参考信息按检索排名放入 token 预算，放不下的截断或丢弃；会话记录优先保留较新的轮次
+        fixed = {
+            "system": self.system_prompt,
+            "template": self.chat_template.render(context="", message=""),
+        }
+        flexible = {"passages": [
+            f"参考信息 {i+1}：{doc['content']}"
+            for i, doc in enumerate(similar_docs)
+        ]}
+        if conversation is not None and conversation.has_history():
+            fixed["conversation_template"] = conversation_skeleton()
+            flexible.update(conversation.prompt_sections())
+        prompt = PromptAssembler(counter=self.token_counter).assemble(
+            fixed=fixed,
+            required={"question": message},
+            flexible=flexible,
+            keep_latest=("conversation",),
+        )
+        get_prompt_usage("chat").record(prompt)
+        logger.info(
+            f"提示词 {prompt.total_tokens}/{prompt.budget} token，"
+            f"参考信息 {prompt.usage.get('passages', 0)} token，丢弃 {prompt.dropped.get('passages', 0)} 条"
+        )
+        
+        messages = [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": render_conversation(
+                prompt.sections.get("summary", ""), prompt.sections.get("conversation", "")
+            ) + self.chat_template.render(
+                context=prompt.sections.get("passages", ""),
+                message=prompt.sections["question"]
+            )}
+        ]
+        return messages, version
 
-请根据以上参考信息和你的专业知识，给出合适的回答。
-                """}
-            ]
-            
+    async def _complete(self, messages: List[Dict], usage: str) -> str:
+        """在上游准入名额内调用对话补全，回答的 token 用量记入 usage 类型的提示词统计"""
+        async with get_admission_controller().slot(settings.OPENAI_MODEL, PRIORITY_INTERACTIVE):
             response = await self.client.chat.completions.create(
                 model=settings.OPENAI_MODEL,
                 messages=messages,
                 temperature=0.7,
-                max_tokens=800
+                max_tokens=settings.AI_MAX_COMPLETION_TOKENS
             )
-            
-            return response.choices[0].message.content
-            
-        except Exception as e:
-            logger.error(f"AI 服务调用失败: {str(e)}")
-            raise HTTPException(
-                status_code=500,
-                detail=f"AI 服务调用失败: {str(e)}"
-            )
-
-    async def get_response_stream(self, message: str, user_data: Optional[Dict] = None):
-        """
-        获取流式 AI 回答
-        """
-        try:
-            logger.info(f"开始流式响应处理，消息: {message[:50]}...")
-            
-            # 如果有用户数据，使用 HealthAgent 处理
-            if user_data is not None:
-                logger.info("使用 HealthAgent 处理用户数据")
-                async for chunk in self.health_agent.process_request_stream(message, user_data):
-                    yield chunk
-                return
-
-            # 否则使用普通的 RAG 处理
-            logger.info("使用普通 RAG 处理")
-            similar_docs = await self.rag.search_similar(message, k=3)
-            logger.info(f"找到 {len(similar_docs)} 个相关文档")
-            
-            context = "\n\n".join([
-                f"参考信息 {i+1}：{doc['content']}"
-                for i, doc in enumerate(similar_docs)
-            ])
-            
-            messages = [
-                {"role": "system", "content": self.system_prompt},
-                {"role": "user", "content": f"""
-参考以下信息：
-
-{context}
-
-用户问题：{message}
+        
+        get_prompt_usage(usage).record_completion(getattr(response, "usage", None))
+        return response.choices[0].message.content
 
-请根据以上参考信息和你的专业知识，给出合适的回答。
-                """}
-            ]
-            
+    async def _complete_stream(self, messages: List[Dict]):
+        """流式对话补全，整个流结束前占用上游名额"""
+        async with get_admission_controller().slot(settings.OPENAI_MODEL, PRIORITY_INTERACTIVE):
             logger.info("开始调用 OpenAI 流式 API")
-            
+        
             # 使用流式响应
             stream = await self.client.chat.completions.create(
                 model=settings.OPENAI_MODEL,
                 messages=messages,
                 temperature=0.7,
-                max_tokens=800,
+                max_tokens=settings.AI_MAX_COMPLETION_TOKENS,
                 stream=True
             )
-            
+        
             logger.info("成功创建流式响应")
             chunk_count = 0
-            
+        
             async for chunk in stream:
                 chunk_count += 1
                 logger.debug(f"处理第 {chunk_count} 个流式块")
-                
+            
                 # 安全地访问流式数据
                 if hasattr(chunk, 'choices') and len(chunk.choices) > 0:
                     choice = chunk.choices[0]
@@ -158,20 +162,212 @@ class AIAssistant(AIBase):
                             yield content
                 else:
                     logger.debug(f"跳过空块: {chunk}")
+        
+        logger.info(f"流式响应完成，共处理 {chunk_count} 个块")
+
+    async def _generate_answer(
+        self, message: str, embedding=None, conversation: Optional[ConversationState] = None
+    ) -> str:
+        """RAG 检索 + 对话补全，embedding 不为空时把回答写入语义缓存"""
+        messages, version = await self._build_messages(message, conversation)
+        answer = await self._complete(messages, "chat")
+        if embedding is not None:
+            get_answer_cache().store(message, embedding, answer, version)
+        return answer
+
+    async def _generate_answer_stream(
+        self, message: str, embedding=None, conversation: Optional[ConversationState] = None
+    ):
+        """RAG 检索 + 流式对话补全，正常结束后把完整回答写入语义缓存"""
+        messages, version = await self._build_messages(message, conversation)
+        pieces = []
+        async for content in self._complete_stream(messages):
+            pieces.append(content)
+            yield content
+        
+        # 只缓存正常结束的完整回答，客户端中途断开或出错时不写入
+        if embedding is not None:
+            get_answer_cache().store(message, embedding, "".join(pieces), version)
+
+    async def check_session(self, session_id: Optional[str], user_id: Optional[int]) -> None:
+        """流式响应开始前确认会话可由该用户访问，属于其他用户时抛出 SessionForbidden"""
+        await self._conversation(session_id, user_id)
+
+    async def _conversation(self, session_id: Optional[str], user_id: Optional[int]) -> Optional[ConversationState]:
+        """读取会话；未启用会话、未提供 session_id 或读取失败时按无状态对话处理"""
+        if not session_id or not settings.AI_SESSION_ENABLED:
+            return None
+        try:
+            return await self.sessions.get(session_id, user_id)
+        except SessionForbidden:
+            raise
+        except Exception as e:
+            logger.error(f"读取会话 {session_id} 失败，按无状态对话处理: {str(e)}")
+            return None
+
+    async def _summarize_turns(self, summary: str, turns: List[Turn]) -> str:
+        """把滚出最近窗口的对话合并进会话摘要，在后台执行，排在交互请求之后"""
+        prompt = get_template("summarize").render(
+            summary=summary or "无",
+            turns="\n\n".join(format_turn(turn) for turn in turns)
+        )
+        async with get_admission_controller().slot(settings.OPENAI_MODEL, PRIORITY_BULK):
+            response = await self.client.chat.completions.create(
+                model=settings.OPENAI_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.3,
+                max_tokens=settings.AI_SESSION_SUMMARY_MAX_TOKENS
+            )
+        return response.choices[0].message.content or summary
+
+    def _personalized_messages(self, prompt: str) -> List[Dict]:
+        """
+        个性化咨询的消息：HealthAgent 已完成检索并在 AI_AGENT_PROMPT_MAX_TOKENS 预算内组装好提示词（含系统提示词），
+        这里不再检索，也不把带有用户健康数据的提示词发给 embedding 接口
+        """
+        return [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": prompt},
+        ]
+
+    async def get_personalized_response(self, prompt: str) -> str:
+        """
+        个性化咨询的补全：提示词中带有用户的健康数据，
+        不读写语义回答缓存，也不与其他请求合并，避免把一个用户的建议返回给另一个用户
+        """
+        return await self._complete(self._personalized_messages(prompt), "agent")
+
+    async def get_personalized_response_stream(self, prompt: str):
+        """个性化咨询的流式补全，同样不检索、不经过回答缓存和请求合并"""
+        async for content in self._complete_stream(self._personalized_messages(prompt)):
+            yield content
+
+    async def get_response(
+        self, message: str, user_data: Optional[Dict] = None, user_id: Optional[int] = None,
+        session_id: Optional[str] = None
+    ) -> str:
+        """
+        获取 AI 回答，如果提供了用户数据或用户ID，则使用 HealthAgent 处理
+        提供 session_id 时带上该会话的摘要和最近几轮对话，回答后记入会话
+        """
+        try:
+            conversation = await self._conversation(session_id, user_id)
+            answer = await self._answer(message, user_data, user_id, conversation)
+            if conversation is not None:
+                self.sessions.append(conversation, message, answer)
+            return answer
             
-            logger.info(f"流式响应完成，共处理 {chunk_count} 个块")
+        except (AdmissionRejected, SessionForbidden):
+            raise
+        except Exception as e:
+            logger.error(f"AI 服务调用失败: {str(e)}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"AI 服务调用失败: {str(e)}"
+            )
+
+    async def _answer(
+        self, message: str, user_data: Optional[Dict], user_id: Optional[int],
+        conversation: Optional[ConversationState]
+    ) -> str:
+        # 如果有用户数据，使用 HealthAgent 处理
+        if user_data is not None or user_id is not None:
+            return await self.health_agent.process_request(message, user_data or {}, user_id, conversation)
+
+        # 回答依赖此前的对话时不走回答缓存，也不与其他请求合并
+        if conversation is not None and conversation.has_history():
+            return await self._generate_answer(message, conversation=conversation)
+
+        # 相似问题已有回答时直接返回
+        cached, embedding = await self._lookup_cached_answer(message)
+        if cached is not None:
+            logger.info(f"命中回答缓存，相似度 {cached['similarity']:.3f}: {cached['question'][:50]}")
+            return cached["answer"]
+
+        # 否则使用普通的 RAG 处理，相同问题的并发请求共用一次检索和补全
+        if settings.AI_COALESCE_REQUESTS:
+            return await self._flight.do(
+                normalize_query(message), lambda: self._generate_answer(message, embedding)
+            )
+        return await self._generate_answer(message, embedding)
+
+    async def get_response_stream(
+        self, message: str, user_data: Optional[Dict] = None, user_id: Optional[int] = None,
+        session_id: Optional[str] = None
+    ):
+        """
+        获取流式 AI 回答，正常结束后把完整回答记入会话
+        """
+        try:
+            logger.info(f"开始流式响应处理，消息: {message[:50]}...")
+            conversation = await self._conversation(session_id, user_id)
+            pieces = []
+            async for content in self._answer_stream(message, user_data, user_id, conversation):
+                pieces.append(content)
+                yield content
+            if conversation is not None:
+                self.sessions.append(conversation, message, "".join(pieces))
             
         except Exception as e:
             logger.error(f"AI 流式服务调用失败: {str(e)}", exc_info=True)
             # 返回错误信息而不是抛出异常
             yield f"抱歉，AI服务暂时不可用: {str(e)}"
 
+    async def _answer_stream(
+        self, message: str, user_data: Optional[Dict], user_id: Optional[int],
+        conversation: Optional[ConversationState]
+    ):
+        # 如果有用户数据，使用 HealthAgent 处理
+        if user_data is not None or user_id is not None:
+            logger.info("使用 HealthAgent 处理用户数据")
+            async for chunk in self.health_agent.process_request_stream(
+                message, user_data or {}, user_id, conversation
+            ):
+                yield chunk
+            return
+
+        # 回答依赖此前的对话时不走回答缓存，也不与其他请求合并
+        if conversation is not None and conversation.has_history():
+            async for content in self._generate_answer_stream(message, conversation=conversation):
+                yield content
+            return
+
+        # 相似问题已有回答时按流式分块回放
+        cached, embedding = await self._lookup_cached_answer(message)
+        if cached is not None:
+            logger.info(f"命中回答缓存，相似度 {cached['similarity']:.3f}: {cached['question'][:50]}")
+            for piece in replay_chunks(cached["answer"]):
+                yield piece
+            return
+
+        # 否则使用普通的 RAG 处理，相同问题的并发请求共用一个上游流
+        if settings.AI_COALESCE_REQUESTS:
+            stream = self._flight.stream(
+                normalize_query(message), lambda: self._generate_answer_stream(message, embedding)
+            )
+        else:
+            stream = self._generate_answer_stream(message, embedding)
+        async for content in stream:
+            yield content
+
+    def get_stats(self) -> Dict:
+        """语义回答缓存、并发请求合并、上游准入控制、健康档案缓存、提示词 token 用量与对话会话的统计"""
+        return {
+            "answer_cache": get_answer_cache().stats(),
+            "coalescing": self._flight.stats(),
+            "admission": get_admission_controller().stats(),
+            "health_profile_cache": get_profile_cache().stats(),
+            "prompt_tokens": prompt_usage_stats(),
+            "sessions": self.sessions.stats(),
+        }
+
     async def add_health_knowledge(self, content: str, source: str = None) -> bool:
         """添加新的健康知识到向量库"""
         try:
             success = await self.rag.store_vector(content, source)
             if success:
                 logger.info(f"成功添加新知识: {content[:50]}...")
+                get_answer_cache().invalidate()
             return success
         except Exception as e:
             logger.error(f"添加知识失败: {str(e)}")
@@ -0,0 +1,169 @@
+"""
+语义回答缓存
+缓存通用对话（不带 user_data）的最终回答，以问题的 embedding 为键：
+新问题与已缓存问题的余弦相似度达到阈值即视为同一问题，直接返回缓存的回答，
+省去 RAG 检索和一次完整的对话补全
+
+条目按条数（LRU）和 TTL 限制；知识库版本变化（新增、删除知识）时整体失效
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.vector_matrix import normalize_vector
+
+# 流式回放时每个分块的字符数
+REPLAY_CHUNK_CHARS = 16
+
+
+def replay_chunks(answer: str, size: int = REPLAY_CHUNK_CHARS) -> Iterator[str]:
+    """将缓存的完整回答切成小块，按流式接口的格式逐块输出"""
+    for start in range(0, len(answer), size):
+        yield answer[start:start + size]
+
+
+class SemanticAnswerCache:
+    """按 embedding 余弦相似度命中的回答缓存，查询时对全部条目做一次矩阵-向量乘法"""
+
+    def __init__(self, max_size: int = 1000, ttl: Optional[float] = 3600, threshold: float = 0.95):
+        self.max_size = max(int(max_size), 0)
+        self.ttl = ttl if ttl and ttl > 0 else None
+        self.threshold = threshold
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()
+        self._next_id = 0
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_ids: Tuple[int, ...] = ()
+        self._version: Optional[int] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _check_version(self, version: Optional[int]) -> bool:
+        """知识库版本升高时清空全部条目；传入的版本比缓存的旧时返回 False"""
+        if version is None:
+            return True
+        if self._version is not None and version < self._version:
+            return False
+        if version != self._version:
+            if self._entries:
+                self._clear()
+                self.invalidations += 1
+            self._version = version
+        return True
+
+    def _clear(self) -> None:
+        self._entries.clear()
+        self._matrix = None
+        self._matrix_ids = ()
+
+    def _expire(self) -> None:
+        if self.ttl is None:
+            return
+        now = time.monotonic()
+        expired = [entry_id for entry_id, entry in self._entries.items() if now - entry["stored_at"] > self.ttl]
+        for entry_id in expired:
+            del self._entries[entry_id]
+        if expired:
+            self.expirations += len(expired)
+            self._matrix = None
+
+    def _ensure_matrix(self) -> None:
+        """条目变化后重新堆叠 embedding 矩阵，条数有上限，重建成本很小"""
+        if self._matrix is None:
+            self._matrix_ids = tuple(self._entries)
+            self._matrix = (
+                np.stack([self._entries[entry_id]["embedding"] for entry_id in self._matrix_ids])
+                if self._matrix_ids else None
+            )
+
+    def lookup(self, embedding, version: Optional[int] = None) -> Optional[Dict]:
+        """
+        查找相似问题的回答，命中时返回 {"answer", "question", "similarity"}
+        version 为当前知识库版本（单调递增），比缓存时高则先整体失效
+        """
+        query = normalize_vector(embedding)
+        with self._lock:
+            current = self._check_version(version)
+            self._expire()
+            self._ensure_matrix()
+            if not current or self._matrix is None or self._matrix.shape[1] != query.shape[0]:
+                self.misses += 1
+                return None
+            scores = self._matrix @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            entry_id = self._matrix_ids[best]
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            entry = self._entries[entry_id]
+            return {"answer": entry["answer"], "question": entry["question"], "similarity": float(scores[best])}
+
+    def store(self, question: str, embedding, answer: str, version: Optional[int] = None) -> None:
+        """缓存回答，version 为检索参考信息时的知识库版本，已有更新的版本时不写入"""
+        if self.max_size == 0 or not answer:
+            return
+        with self._lock:
+            if not self._check_version(version):
+                return
+            self._entries[self._next_id] = {
+                "question": question,
+                "embedding": normalize_vector(embedding),
+                "answer": answer,
+                "stored_at": time.monotonic(),
+            }
+            self._next_id += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._matrix = None
+
+    def invalidate(self) -> None:
+        """新增知识后清空缓存"""
+        with self._lock:
+            if self._entries:
+                self._clear()
+                self.invalidations += 1
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+# 全局回答缓存实例
+_answer_cache = None
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    """获取回答缓存单例，知识入库接口也通过它失效缓存"""
+    global _answer_cache
+    if _answer_cache is None:
+        _answer_cache = SemanticAnswerCache(
+            max_size=settings.AI_ANSWER_CACHE_SIZE,
+            ttl=settings.AI_ANSWER_CACHE_TTL,
+            threshold=settings.AI_ANSWER_CACHE_THRESHOLD
+        )
+    return _answer_cache
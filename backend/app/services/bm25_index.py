@@ -0,0 +1,134 @@
+"""
+BM25 词法索引与混合排序
+中文按字符二元组切分，英文和数字按整词切分；索引支持按文档增量增删，
+检索结果与向量、关键词排序通过加权倒数排名融合（RRF）合并
+"""
+
+import math
+import re
+import threading
+from typing import Dict, List, Mapping, Optional, Sequence, Set, Tuple
+
+from app.services.embedding_cache import normalize_query
+
+_CJK_RUN = re.compile(r"[㐀-䶿一-鿿豈-﫿]+")
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """中文连续片段切成字符二元组（单字片段保留单字），英文和数字按整词切分"""
+    text = normalize_query(text)
+    tokens: List[str] = []
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    tokens.extend(_WORD.findall(_CJK_RUN.sub(" ", text)))
+    return tokens
+
+
+class BM25Index:
+    """增量维护的 BM25 倒排索引"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._doc_terms: Dict[int, Dict[str, int]] = {}
+        self._doc_length: Dict[int, int] = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    @property
+    def vocabulary_size(self) -> int:
+        return len(self._postings)
+
+    def add(self, doc_id: int, text: str) -> None:
+        """添加或替换一个文档"""
+        counts: Dict[str, int] = {}
+        for token in tokenize(text):
+            counts[token] = counts.get(token, 0) + 1
+        with self._lock:
+            self._remove(doc_id)
+            self._doc_terms[doc_id] = counts
+            self._doc_length[doc_id] = sum(counts.values())
+            self._total_length += self._doc_length[doc_id]
+            for term, tf in counts.items():
+                self._postings.setdefault(term, {})[doc_id] = tf
+
+    def remove(self, doc_id: int) -> None:
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id: int) -> None:
+        counts = self._doc_terms.pop(doc_id, None)
+        if counts is None:
+            return
+        self._total_length -= self._doc_length.pop(doc_id)
+        for term in counts:
+            postings = self._postings[term]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+
+    def _idf(self, term: str) -> float:
+        df = len(self._postings.get(term, ()))
+        n = len(self._doc_terms)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int, allowed: Optional[Set[int]] = None) -> List[Tuple[int, float, float]]:
+        """
+        返回 [(doc_id, bm25 分数, 覆盖率)]，按分数降序；给定 allowed 时只对其中的文档打分
+        覆盖率为文档命中的查询词 idf 之和占索引中出现过的查询词 idf 之和的比例，
+        用于判断词法结果是否足够可信、可以跳过向量检索
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            n = len(self._doc_terms)
+            if n == 0:
+                return []
+            avg_length = self._total_length / n
+            idf = {term: self._idf(term) for term in terms if term in self._postings}
+            known_weight = sum(idf.values())
+
+            scores: Dict[int, float] = {}
+            matched: Dict[int, float] = {}
+            for term, weight in idf.items():
+                for doc_id, tf in self._postings[term].items():
+                    if allowed is not None and doc_id not in allowed:
+                        continue
+                    length = self._doc_length[doc_id]
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + weight * tf * (self.k1 + 1) / norm
+                    matched[doc_id] = matched.get(doc_id, 0.0) + weight
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+        return [
+            (doc_id, score, matched[doc_id] / known_weight if known_weight else 0.0)
+            for doc_id, score in ranked
+        ]
+
+
+def reciprocal_rank_fusion(
+    rankings: Mapping[str, Sequence[int]],
+    weights: Optional[Mapping[str, float]] = None,
+    rrf_k: int = 60,
+) -> List[Tuple[int, float]]:
+    """
+    加权倒数排名融合：score(d) = Σ weight_r / (rrf_k + rank_r(d))，rank 从 1 开始
+    只依赖名次，不同量纲的分数（BM25、余弦相似度、关键词分）可以直接合并
+    """
+    weights = weights or {}
+    fused: Dict[int, float] = {}
+    for name, ids in rankings.items():
+        weight = weights.get(name, 1.0)
+        if weight <= 0:
+            continue
+        for rank, doc_id in enumerate(ids, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + weight / (rrf_k + rank)
+    return sorted(fused.items(), key=lambda item: (-item[1], item[0]))
+
@@ -0,0 +1,399 @@
+"""
+服务端对话会话
+    - 每个会话在内存中保留最近 AI_SESSION_MAX_TURNS 轮问答（环形缓冲），会话按 LRU 存放，读取为 O(1)
+    - 滚出窗口的轮次攒够 AI_SESSION_SUMMARY_BATCH 轮后，在后台与已有摘要合并为新的滚动摘要，
+      提示词只带摘要和最近几轮，长度不随对话增长
+    - 问答与摘要由后台写入任务批量持久化到 chat_sessions / chat_turns，不阻塞请求；每个会话单独提交，
+      轮次号与数据库冲突（多个 worker 写同一会话）时按已有的最大轮次号顺延；
+      内存中被淘汰或进程重启后的会话在下次访问时从数据库加载
+    - 会话第一次带用户ID访问时归属该用户，之后其他用户（或不带用户ID）访问时拒绝
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import engine
+from app.models.chat_session import ChatSession, ChatTurn
+from app.services.prompt_templates import get_template
+from app.services.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# 摘要连续失败时最多保留的待摘要轮数（摘要批次的倍数），超出后丢弃最早的轮次
+MAX_PENDING_BATCHES = 4
+# 后台写入任务每批最多处理的写入数
+WRITE_BATCH_SIZE = 100
+
+# (轮次, 用户问题, AI 回答)
+Turn = Tuple[int, str, str]
+# 摘要函数：(已有摘要, 待合并的轮次) -> 新摘要
+Summarizer = Callable[[str, List[Turn]], Awaitable[str]]
+
+
+class SessionForbidden(Exception):
+    """会话属于其他用户，接口层返回 403"""
+
+
+def format_turn(turn: Turn) -> str:
+    return f"用户：{turn[1]}\n助手：{turn[2]}"
+
+
+def conversation_skeleton() -> str:
+    """会话段落模板本身占用的文本，计入固定预算"""
+    return get_template("conversation").render(summary="", history="")
+
+
+def render_conversation(summary: str, history: str) -> str:
+    """按预算裁剪后的摘要和最近对话渲染为提示词开头的一段，都为空时返回空字符串"""
+    if not summary and not history:
+        return ""
+    return get_template("conversation").render(summary=summary or "无", history=history or "无") + "\n\n"
+
+
+@dataclass
+class ConversationState:
+    """一个会话的内存状态"""
+    session_id: str
+    user_id: Optional[int] = None
+    summary: str = ""
+    summarized_turns: int = 0
+    last_turn: int = 0
+    turns: Deque[Turn] = field(default_factory=deque)
+    pending: List[Turn] = field(default_factory=list)
+    summarizing: bool = False
+    accessed_at: float = field(default_factory=time.monotonic)
+
+    def recent_turns(self) -> List[str]:
+        """最近几轮，按时间顺序"""
+        return [format_turn(turn) for turn in self.turns]
+
+    def has_history(self) -> bool:
+        return bool(self.summary or self.turns)
+
+    def prompt_sections(self) -> Dict:
+        """参与 token 预算分配的部分，最近对话需配合 keep_latest=("conversation",) 使用"""
+        return {"summary": self.summary, "conversation": self.recent_turns()}
+
+
+class ChatSessionStore:
+    """会话 LRU + 后台持久化 + 滚动摘要"""
+
+    def __init__(
+        self,
+        max_sessions: int = 10000,
+        idle_ttl: Optional[float] = 1800,
+        max_turns: int = 6,
+        summary_batch: int = 4,
+        summarizer: Optional[Summarizer] = None,
+        persist: bool = True,
+    ):
+        self.max_sessions = max(int(max_sessions), 1)
+        self.idle_ttl = idle_ttl if idle_ttl and idle_ttl > 0 else None
+        self.max_turns = max(int(max_turns), 1)
+        self.summary_batch = max(int(summary_batch), 1)
+        self.summarizer = summarizer
+        self.persist = persist
+        self._sessions: "OrderedDict[str, ConversationState]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loads = SingleFlight("chat-session")
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._loop = None
+        self._tasks = set()
+        # 会话ID -> 尚未写完的写入数，以及等待这些写入完成的 Event
+        self._unwritten: Dict[str, int] = {}
+        self._written: Dict[str, asyncio.Event] = {}
+        self.hits = 0
+        self.loads = 0
+        self.summaries = 0
+        self.summary_failures = 0
+        self.writes = 0
+        self.write_failures = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _cached(self, session_id: str) -> Optional[ConversationState]:
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None:
+                return None
+            if self.idle_ttl is not None and time.monotonic() - state.accessed_at > self.idle_ttl:
+                del self._sessions[session_id]
+                return None
+            state.accessed_at = time.monotonic()
+            self._sessions.move_to_end(session_id)
+            return state
+
+    def _remember(self, state: ConversationState) -> ConversationState:
+        with self._lock:
+            # 并发加载时以先放入的为准，避免两个副本各自追加
+            existing = self._sessions.get(state.session_id)
+            if existing is not None:
+                return existing
+            self._sessions[state.session_id] = state
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return state
+
+    async def get(self, session_id: str, user_id: Optional[int] = None) -> ConversationState:
+        """读取会话，内存中没有时从数据库加载，数据库中也没有时创建空会话"""
+        state = self._cached(session_id)
+        if state is not None:
+            self.hits += 1
+        else:
+            state = await self._loads.do(session_id, lambda: self._load(session_id))
+        self._check_owner(state, user_id)
+        if state.user_id is None and user_id is not None:
+            state.user_id = user_id
+        return state
+
+    async def find(self, session_id: str, user_id: Optional[int] = None) -> Optional[ConversationState]:
+        """只读查找会话，内存和数据库中都没有时返回 None，不创建也不放入内存"""
+        state = self._cached(session_id)
+        if state is None and self.persist:
+            state = ConversationState(session_id=session_id, turns=deque(maxlen=self.max_turns))
+            await self._wait_written(session_id)
+            if not await asyncio.to_thread(self._load_from_db, state):
+                return None
+        if state is not None:
+            self._check_owner(state, user_id)
+        return state
+
+    @staticmethod
+    def _check_owner(state: ConversationState, user_id: Optional[int]) -> None:
+        if state.user_id is not None and state.user_id != user_id:
+            raise SessionForbidden(f"会话 {state.session_id} 属于其他用户")
+
+    async def _load(self, session_id: str) -> ConversationState:
+        self.loads += 1
+        state = ConversationState(session_id=session_id, turns=deque(maxlen=self.max_turns))
+        if self.persist:
+            try:
+                # 淘汰前的会话可能还有未写完的轮次，只等这个会话的写入完成，避免加载到旧的轮次号
+                await self._wait_written(session_id)
+                await asyncio.to_thread(self._load_from_db, state)
+            except Exception as e:
+                logger.error(f"加载会话 {session_id} 失败，按新会话处理: {str(e)}")
+        return self._remember(state)
+
+    def _load_from_db(self, state: ConversationState) -> bool:
+        """读取摘要和摘要之后的轮次（最多最近窗口加上未完成摘要的部分），数据库中没有该会话时返回 False"""
+        with Session(engine) as db:
+            row = db.get(ChatSession, state.session_id)
+            if row is None:
+                return False
+            state.user_id = row.user_id
+            state.summary = row.summary or ""
+            state.summarized_turns = row.summarized_turns or 0
+            limit = self.max_turns + self.summary_batch * MAX_PENDING_BATCHES
+            turns = db.query(ChatTurn.turn, ChatTurn.question, ChatTurn.answer).filter(
+                ChatTurn.session_id == state.session_id,
+                ChatTurn.turn > state.summarized_turns
+            ).order_by(ChatTurn.turn.desc()).limit(limit).all()
+            last_turn = db.query(ChatTurn.turn).filter(
+                ChatTurn.session_id == state.session_id
+            ).order_by(ChatTurn.turn.desc()).limit(1).scalar()
+        turns = [tuple(turn) for turn in reversed(turns)]
+        state.last_turn = last_turn or state.summarized_turns
+        state.pending = turns[:-self.max_turns] if len(turns) > self.max_turns else []
+        state.turns.extend(turns[-self.max_turns:])
+        return True
+
+    def append(self, state: ConversationState, question: str, answer: str) -> None:
+        """记录一轮问答；滚出窗口的轮次等待合并进摘要，写入在后台完成"""
+        state.last_turn += 1
+        turn = (state.last_turn, question, answer)
+        if len(state.turns) == state.turns.maxlen:
+            state.pending.append(state.turns[0])
+        state.turns.append(turn)
+        self._enqueue(("turn", state.session_id, state.user_id, turn))
+
+        if len(state.pending) >= self.summary_batch and not state.summarizing:
+            state.summarizing = True
+            self._spawn(self._summarize(state))
+
+    async def _summarize(self, state: ConversationState) -> None:
+        batch = list(state.pending)
+        try:
+            if self.summarizer is None:
+                raise RuntimeError("未配置摘要函数")
+            summary = await self.summarizer(state.summary, batch)
+            state.summary = summary.strip()
+            state.summarized_turns = batch[-1][0]
+            del state.pending[:len(batch)]
+            self.summaries += 1
+            self._enqueue(("summary", state.session_id, state.user_id, (state.summary, state.summarized_turns)))
+        except Exception as e:
+            self.summary_failures += 1
+            logger.warning(f"会话 {state.session_id} 生成摘要失败，下次继续: {str(e)}")
+            overflow = len(state.pending) - self.summary_batch * MAX_PENDING_BATCHES
+            if overflow > 0:
+                del state.pending[:overflow]
+        finally:
+            state.summarizing = False
+
+    def _spawn(self, coroutine) -> None:
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _enqueue(self, item) -> None:
+        if not self.persist:
+            return
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._writer = loop.create_task(self._write_loop(self._queue))
+            self._unwritten.clear()
+            self._written.clear()
+        session_id = item[1]
+        self._unwritten[session_id] = self._unwritten.get(session_id, 0) + 1
+        self._queue.put_nowait(item)
+
+    async def _write_loop(self, queue: asyncio.Queue) -> None:
+        """后台写入任务：一次取出队列中已有的写入，在工作线程中按会话分别提交"""
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < WRITE_BATCH_SIZE and not queue.empty():
+                batch.append(queue.get_nowait())
+            try:
+                failed = await asyncio.to_thread(self._write_batch, batch)
+                self.writes += len(batch) - failed
+                self.write_failures += failed
+            except Exception as e:
+                self.write_failures += len(batch)
+                logger.error(f"保存 {len(batch)} 条会话记录失败: {str(e)}")
+            finally:
+                for item in batch:
+                    self._mark_written(item[1])
+                    queue.task_done()
+
+    def _mark_written(self, session_id: str) -> None:
+        left = self._unwritten.get(session_id, 0) - 1
+        if left > 0:
+            self._unwritten[session_id] = left
+            return
+        self._unwritten.pop(session_id, None)
+        event = self._written.pop(session_id, None)
+        if event is not None:
+            event.set()
+
+    async def _wait_written(self, session_id: str) -> None:
+        """等待某个会话已排队的写入完成，不等待其他会话"""
+        if not self._unwritten.get(session_id) or self._loop is not asyncio.get_running_loop():
+            return
+        event = self._written.setdefault(session_id, asyncio.Event())
+        await event.wait()
+
+    @classmethod
+    def _write_batch(cls, batch: List) -> int:
+        """每个会话一个事务，一个会话写入失败不影响同批的其他会话；返回失败的写入数"""
+        groups: Dict[str, List] = {}
+        for item in batch:
+            groups.setdefault(item[1], []).append(item)
+        failed = 0
+        for session_id, items in groups.items():
+            try:
+                try:
+                    cls._write_session(session_id, items)
+                except IntegrityError:
+                    # 其他 worker 已写入相同的轮次号或先创建了会话：按数据库中的最大轮次号顺延后重试一次
+                    logger.warning(f"会话 {session_id} 的轮次号冲突，按数据库中的最大轮次号顺延后重试")
+                    cls._write_session(session_id, items, renumber=True)
+            except Exception as e:
+                failed += len(items)
+                logger.error(f"保存会话 {session_id} 的 {len(items)} 条记录失败: {str(e)}")
+        return failed
+
+    @staticmethod
+    def _write_session(session_id: str, items: List, renumber: bool = False) -> None:
+        with Session(engine) as db:
+            row = db.get(ChatSession, session_id)
+            if row is None:
+                row = ChatSession(session_id=session_id, user_id=items[0][2], summarized_turns=0)
+                db.add(row)
+            existing = set()
+            next_turn = last = 0
+            if renumber:
+                existing = {turn for turn, in db.query(ChatTurn.turn).filter(ChatTurn.session_id == session_id)}
+                next_turn = max(existing | {item[3][0] for item in items if item[0] == "turn"})
+            for kind, _, user_id, payload in items:
+                if row.user_id is None and user_id is not None:
+                    row.user_id = user_id
+                if kind == "turn":
+                    turn, question, answer = payload
+                    # 顺延冲突的轮次及其后的轮次，保持本批轮次的先后顺序
+                    if turn in existing or (renumber and turn <= last):
+                        next_turn += 1
+                        turn = next_turn
+                    last = turn
+                    db.add(ChatTurn(session_id=session_id, turn=turn, question=question, answer=answer))
+                else:
+                    row.summary, row.summarized_turns = payload
+            db.commit()
+
+    async def _drain_writes(self) -> None:
+        if self._queue is not None and self._loop is asyncio.get_running_loop():
+            await self._queue.join()
+
+    async def flush(self) -> None:
+        """等待进行中的摘要和已排队的写入完成（测试与停机时使用）"""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+        await self._drain_writes()
+
+    async def delete(self, session_id: str) -> None:
+        """删除会话及其全部记录"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        if self.persist:
+            await self._wait_written(session_id)
+            await asyncio.to_thread(self._delete_from_db, session_id)
+
+    @staticmethod
+    def _delete_from_db(session_id: str) -> None:
+        with Session(engine) as db:
+            db.query(ChatTurn).filter(ChatTurn.session_id == session_id).delete(synchronize_session=False)
+            db.query(ChatSession).filter(ChatSession.session_id == session_id).delete(synchronize_session=False)
+            db.commit()
+
+    def stats(self) -> Dict:
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "hits": self.hits,
+            "loads": self.loads,
+            "summaries": self.summaries,
+            "summary_failures": self.summary_failures,
+            "pending_writes": self._queue.qsize() if self._queue is not None else 0,
+            "writes": self.writes,
+            "write_failures": self.write_failures,
+        }
+
+
+# 全局会话存储
+_session_store = None
+
+
+def get_session_store() -> ChatSessionStore:
+    """获取会话存储单例，摘要函数由 AIAssistant 注册"""
+    global _session_store
+    if _session_store is None:
+        _session_store = ChatSessionStore(
+            max_sessions=settings.AI_SESSION_CACHE_SIZE,
+            idle_ttl=settings.AI_SESSION_IDLE_TTL,
+            max_turns=settings.AI_SESSION_MAX_TURNS,
+            summary_batch=settings.AI_SESSION_SUMMARY_BATCH,
+        )
+    return _session_store
@@ -0,0 +1,117 @@
+"""
+Embedding 缓存
+按条数和字节数双重限制的 LRU 缓存，支持可选的过期时间，并统计命中、未命中与淘汰次数
+"""
+
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """规范化查询文本：全角转半角、去除首尾空白、合并连续空白、统一小写"""
+    text = unicodedata.normalize("NFKC", text or "")
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+
+def embedding_cache_key(text: str, model: str) -> str:
+    """由 embedding 模型名和规范化后的查询文本生成缓存键"""
+    return hashlib.sha256(f"{model}\n{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """有界 LRU/TTL 缓存，值为 numpy 数组"""
+
+    def __init__(self, max_size: int, ttl: Optional[float] = None, max_bytes: Optional[int] = None):
+        self.max_size = max(int(max_size), 0)
+        self.ttl = ttl if ttl and ttl > 0 else None
+        self.max_bytes = max_bytes if max_bytes and max_bytes > 0 else None
+        self._items: "OrderedDict[str, Tuple[np.ndarray, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, count=False) is not None
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl is not None and time.monotonic() - stored_at > self.ttl
+
+    def _remove(self, key: str) -> None:
+        value, _ = self._items.pop(key)
+        self._bytes -= value.nbytes
+
+    def get(self, key: str, count: bool = True) -> Optional[np.ndarray]:
+        """读取缓存，命中时移动到最近使用端"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and self._expired(item[1]):
+                self._remove(key)
+                self.expirations += 1
+                item = None
+            if item is None:
+                if count:
+                    self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            if count:
+                self.hits += 1
+            return item[0]
+
+    def set(self, key: str, value) -> None:
+        """写入缓存，超出条数或字节上限时淘汰最久未使用的条目"""
+        if self.max_size == 0:
+            return
+        value = np.asarray(value, dtype=np.float32)
+        if self.max_bytes is not None and value.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                self._remove(key)
+            self._items[key] = (value, time.monotonic())
+            self._bytes += value.nbytes
+            while self._items and (
+                len(self._items) > self.max_size
+                or (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                oldest = next(iter(self._items))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._items),
+            "max_size": self.max_size,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
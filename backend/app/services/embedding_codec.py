@@ -0,0 +1,68 @@
+"""
+向量二进制编解码
+vector_store.embedding_bin 保存小端 float32（可选 float16）字节，
+读取时用 np.frombuffer 零拷贝解码；旧的 JSON 文本列仅作为过渡期的读取兜底
+"""
+
+import json
+from typing import Dict, Optional
+
+import numpy as np
+from sqlalchemy import case
+
+from app.core.config import settings
+from app.models.vector_store import VectorStore
+
+EMBEDDING_DTYPES = {
+    "float32": np.dtype("<f4"),
+    "float16": np.dtype("<f2"),
+}
+
+
+def encode_embedding(vector, dtype: Optional[str] = None) -> bytes:
+    """将向量编码为小端字节"""
+    dtype = dtype or settings.RAG_EMBEDDING_STORAGE_DTYPE
+    if dtype not in EMBEDDING_DTYPES:
+        raise ValueError(f"不支持的向量存储类型: {dtype}")
+    return np.asarray(vector, dtype=EMBEDDING_DTYPES[dtype]).tobytes()
+
+
+def decode_embedding(data: bytes, dtype: Optional[str] = "float32") -> np.ndarray:
+    """
+    解码二进制向量
+    float32 直接返回 frombuffer 的只读视图，不复制数据；float16 需要转换为 float32
+    """
+    vector = np.frombuffer(data, dtype=EMBEDDING_DTYPES[dtype or "float32"])
+    if vector.dtype != np.float32:
+        vector = vector.astype(np.float32)
+    return vector
+
+
+def load_embedding(
+    embedding_bin: Optional[bytes],
+    embedding_dtype: Optional[str],
+    embedding_json: Optional[str] = None,
+) -> np.ndarray:
+    """优先读取二进制列，未回填的旧数据回退到 JSON 列"""
+    if embedding_bin is not None:
+        return decode_embedding(embedding_bin, embedding_dtype)
+    if embedding_json is None:
+        raise ValueError("向量数据为空")
+    return np.asarray(json.loads(embedding_json), dtype=np.float32)
+
+
+def embedding_columns(vector, dtype: Optional[str] = None) -> Dict:
+    """生成写入 VectorStore 时的向量列"""
+    dtype = dtype or settings.RAG_EMBEDDING_STORAGE_DTYPE
+    return {
+        "embedding_bin": encode_embedding(vector, dtype),
+        "embedding_dtype": dtype,
+    }
+
+
+def json_fallback_column():
+    """只在二进制列为空时才读取 JSON 列，避免传输已回填行的大文本"""
+    return case(
+        (VectorStore.embedding_bin.is_(None), VectorStore.embedding),
+        else_=None
+    ).label("embedding")
@@ -0,0 +1,110 @@
+"""
+Embedding 提供方
+统一使用 langchain 的 Embeddings 接口（embed_query / embed_documents 及其异步版本），
+由 Settings.RAG_EMBEDDING_PROVIDER 选择：
+    openai  - OpenAIEmbeddings，需要网络与 API Key
+    hashing - 本地字符 n-gram 哈希向量化，纯 CPU、确定性、维度固定，用于测试、压测和离线部署
+"""
+
+import asyncio
+import hashlib
+import logging
+import re
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+
+from app.core.config import settings
+from app.services.embedding_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_PROVIDERS = ("openai", "hashing")
+# 文档数超过该值时在工作线程中计算，避免阻塞事件循环
+HASHING_THREAD_THRESHOLD = 16
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    字符 n-gram 哈希向量化
+    规范化后的文本取 1..ngram 个字符的 n-gram（中文无需分词）以及英文/数字整词，
+    经 blake2b 哈希到固定维度的桶中，另一个哈希位决定符号以抵消碰撞；
+    词频取 log(1 + tf) 后做 L2 归一化。同一文本在任何进程、任何机器上得到相同的向量
+    """
+
+    def __init__(self, dimension: int = 512, ngram: int = 3):
+        self.dimension = dimension
+        self.ngram = ngram
+
+    @property
+    def model_name(self) -> str:
+        return f"hashing-ngram{self.ngram}-{self.dimension}"
+
+    def _features(self, text: str) -> List[str]:
+        text = normalize_query(text)
+        features = _WORD_PATTERN.findall(text)
+        compact = text.replace(" ", "")
+        for n in range(1, self.ngram + 1):
+            features.extend(compact[i:i + n] for i in range(len(compact) - n + 1))
+        return features
+
+    def _vector(self, text: str) -> List[float]:
+        features = self._features(text)
+        if not features:
+            return [0.0] * self.dimension
+        digests = [hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest() for feature in features]
+        hashes = np.frombuffer(b"".join(digests), dtype="<u8")
+        buckets = (hashes % self.dimension).astype(np.int64)
+        signs = np.where((hashes >> np.uint64(63)) == 1, -1.0, 1.0)
+        counts = np.bincount(buckets, weights=signs, minlength=self.dimension)
+        vector = np.sign(counts) * np.log1p(np.abs(counts))
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+        return vector.astype(np.float32).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vector(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        if len(texts) > HASHING_THREAD_THRESHOLD:
+            return await asyncio.to_thread(self.embed_documents, texts)
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return self._vector(text)
+
+
+def embedding_model_name() -> str:
+    """当前提供方的模型标识，用于缓存键，切换提供方或维度后旧缓存自然失效"""
+    if settings.RAG_EMBEDDING_PROVIDER == "hashing":
+        return HashingEmbeddings(settings.RAG_HASHING_DIMENSION, settings.RAG_HASHING_NGRAM).model_name
+    return settings.RAG_EMBEDDING_MODEL
+
+
+def create_embeddings() -> Embeddings:
+    """按配置创建 embedding 提供方"""
+    provider = settings.RAG_EMBEDDING_PROVIDER
+    if provider == "hashing":
+        logger.info(f"使用本地哈希 embedding，维度 {settings.RAG_HASHING_DIMENSION}")
+        return HashingEmbeddings(settings.RAG_HASHING_DIMENSION, settings.RAG_HASHING_NGRAM)
+    if provider != "openai":
+        raise ValueError(f"不支持的 embedding 提供方: {provider}，仅支持 {', '.join(EMBEDDING_PROVIDERS)}")
+
+    # 修复 API URL
+    base_url = settings.OPENAI_BASE_URL.rstrip('/')
+    if not base_url.endswith('/v1'):
+        base_url = f"{base_url}/v1"
+    logger.info(f"使用 OpenAI embedding，API URL: {base_url}")
+    return OpenAIEmbeddings(
+        openai_api_key=settings.OPENAI_API_KEY,
+        openai_api_base=base_url,
+        model=settings.RAG_EMBEDDING_MODEL
+    )
@@ -4,6 +4,7 @@ from typing import List, Optional
 
 from app.models.exercise_log import ExerciseLog
 from app.schemas.exercise_log import ExerciseLogCreate
+from app.services.health_profile import invalidate_health_profile
 
 class ExerciseLogService:
     
@@ -22,6 +23,7 @@ class ExerciseLogService:
         db.add(db_exercise_log)
         db.commit()
         db.refresh(db_exercise_log)
+        invalidate_health_profile(db_exercise_log.user_id)
         return db_exercise_log
     
     @staticmethod
@@ -48,5 +50,6 @@ class ExerciseLogService:
         if db_exercise_log:
             db.delete(db_exercise_log)
             db.commit()
+            invalidate_health_profile(db_exercise_log.user_id)
             return True
         return False 
\ No newline at end of file
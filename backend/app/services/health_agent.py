@@ -1,246 +1,183 @@
-from typing import Dict, List
+from typing import Dict, List, Optional
+from app.core.config import settings
 from app.services.base import AIBase
 from app.services.rag_factory import get_rag_service
+from app.services.llm_admission import AdmissionRejected
+from app.services.health_profile import get_health_profile, profile_user_data
+from app.services.user_context import calculate_bmi, format_recent_records, merge_user_data
+from app.services.prompt_budget import PromptAssembler, TokenCounter, get_prompt_usage
+from app.services.prompt_templates import PromptTemplate, get_template
+from app.services.chat_session import ConversationState, conversation_skeleton, render_conversation
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 各任务类型检索知识库时的默认过滤条件；过滤后没有结果时退回不过滤的检索
+TASK_FILTERS = {
+    "饮食分析": {"topic": ["营养与饮食"]},
+    "运动规划": {"topic": ["运动健身"]},
+    "睡眠建议": {"topic": ["睡眠质量"]},
+}
+
+# 任务类型 -> 提示词模板，流式与非流式共用；未识别的任务使用 general 模板
+TASK_TEMPLATES = {
+    "饮食分析": "diet",
+    "运动规划": "exercise",
+    "睡眠建议": "sleep",
+    "健康知识": "knowledge",
+}
+
+# 受 token 预算约束的模板字段 -> 预算分配中的部分名
+BUDGETED_FIELDS = {
+    "context": "passages",
+    "recent_records": "profile",
+    "diet_records": "history",
+}
+
 class HealthAgent:
     def __init__(self, ai_service: AIBase):
         self.ai_service = ai_service
         self.rag = get_rag_service()
-        
-        # 定义任务类型和对应的处理方法
-        self.tasks = {
-            "饮食分析": self._analyze_diet,
-            "运动规划": self._plan_exercise,
-            "睡眠建议": self._sleep_advice,
-            "健康知识": self._query_knowledge
-        }
+        self.token_counter = TokenCounter(settings.OPENAI_MODEL)
 
-    async def process_request(self, message: str, user_data: Dict = None) -> str:
-        """处理用户请求"""
+    async def process_request(
+        self, message: str, user_data: Dict = None, user_id: Optional[int] = None,
+        conversation: Optional[ConversationState] = None
+    ) -> str:
+        """处理用户请求，conversation 为所在会话（带摘要和最近几轮对话）"""
         try:
-            # 1. 识别任务类型
-            task_type = self._identify_task(message)
-            
-            # 2. 获取相关知识库内容
-            relevant_docs = await self.rag.search_similar(message, k=2)
-            context = "\n".join([doc['content'] for doc in relevant_docs])
-            
-            # 3. 根据任务类型处理请求
-            if task_type in self.tasks:
-                return await self.tasks[task_type](message, user_data, context)
-            
-            # 4. 处理通用查询
-            return await self._handle_general_query(message, context)
+            prompt = await self._build_prompt(message, user_data, user_id, conversation)
+            return await self.ai_service.get_personalized_response(prompt)
             
+        except AdmissionRejected:
+            raise
         except Exception as e:
             logger.error(f"处理请求失败: {str(e)}")
             return "抱歉，我现在无法处理您的请求。请稍后再试。"
 
-    async def process_request_stream(self, message: str, user_data: Dict = None):
+    async def process_request_stream(
+        self, message: str, user_data: Dict = None, user_id: Optional[int] = None,
+        conversation: Optional[ConversationState] = None
+    ):
         """流式处理用户请求"""
         try:
-            # 1. 识别任务类型
-            task_type = self._identify_task(message)
-            
-            # 2. 获取相关知识库内容
-            relevant_docs = await self.rag.search_similar(message, k=2)
-            context = "\n".join([doc['content'] for doc in relevant_docs])
-            
-            # 3. 根据任务类型处理请求
-            if task_type == "饮食分析":
-                async for chunk in self._analyze_diet_stream(message, user_data, context):
-                    yield chunk
-            elif task_type == "运动规划":
-                async for chunk in self._plan_exercise_stream(message, user_data, context):
-                    yield chunk
-            elif task_type == "睡眠建议":
-                async for chunk in self._sleep_advice_stream(message, user_data, context):
-                    yield chunk
-            elif task_type == "健康知识":
-                async for chunk in self._query_knowledge_stream(message, user_data, context):
-                    yield chunk
-            else:
-                # 4. 处理通用查询
-                async for chunk in self._handle_general_query_stream(message, context):
-                    yield chunk
+            prompt = await self._build_prompt(message, user_data, user_id, conversation)
+            async for chunk in self.ai_service.get_personalized_response_stream(prompt):
+                yield chunk
             
         except Exception as e:
             logger.error(f"流式处理请求失败: {str(e)}")
             yield "抱歉，我现在无法处理您的请求。请稍后再试。"
 
-    async def _analyze_diet(self, message: str, user_data: Dict, context: str) -> str:
-        """分析饮食情况并给出建议"""
-        analysis_prompt = f"""
-        参考知识：
-        {context}
-        
-        用户信息：
-        - 年龄：{user_data.get('age')}
-        - 身高：{user_data.get('height')}
-        - 体重：{user_data.get('weight')}
-        - BMI：{self._calculate_bmi(user_data)}
-        
-        饮食记录：
-        {user_data.get('diet_records', [])}
-        
-        用户问题：{message}
-        
-        请基于以上信息进行分析并给出个性化的饮食建议。
-        """
-        return await self.ai_service.get_response(analysis_prompt)
-
-    async def _plan_exercise(self, message: str, user_data: Dict, context: str) -> str:
-        """制定个性化运动计划"""
-        plan_prompt = f"""
-        参考知识：
-        {context}
-        
-        用户基础信息：
-        - 年龄：{user_data.get('age')}
-        - 身高：{user_data.get('height')}
-        - 体重：{user_data.get('weight')}
-        - BMI：{self._calculate_bmi(user_data)}
-        - 运动目标：{message}
-        - 运动禁忌：{user_data.get('exercise_contraindications', '无')}
-        
-        请基于以上信息制定安全、科学、个性化的运动计划。
+    async def _build_prompt(
+        self, message: str, user_data: Optional[Dict], user_id: Optional[int],
+        conversation: Optional[ConversationState] = None
+    ) -> str:
+        """识别任务类型，并发获取知识库内容和用户近期记录，按任务模板渲染提示词"""
+        task_type = self._identify_task(message)
+        passages, user_data = await self._assemble_context(message, task_type, user_data, user_id)
+        template = get_template(TASK_TEMPLATES.get(task_type, "general"))
+        return self._render(template, message, passages, user_data, conversation)
+
+    async def _assemble_context(self, message: str, task_type: str, user_data: Optional[Dict], user_id: Optional[int]):
         """
-        return await self.ai_service.get_response(plan_prompt)
-
-    async def _sleep_advice(self, message: str, user_data: Dict, context: str) -> str:
-        """提供睡眠建议"""
-        sleep_prompt = f"""
-        参考知识：
-        {context}
-        
-        用户睡眠情况：
-        - 平均睡眠时间：{user_data.get('avg_sleep_hours')}
-        - 入睡困难：{user_data.get('sleep_issues', [])}
-        - 作息时间：{user_data.get('sleep_schedule', {})}
-        
-        用户问题：{message}
-        
-        请基于以上信息提供个性化的睡眠改善建议。
+        知识检索与用户健康档案并发获取，每一步有独立的超时，
+        超时或失败的一步直接丢弃，不拖慢首个 token；返回 (参考知识段落, 合并后的用户数据)
+        档案命中缓存时无需访问数据库；超时的档案构建在后台继续完成并写入缓存
         """
-        return await self.ai_service.get_response(sleep_prompt)
-
-    async def _query_knowledge(self, message: str, user_data: Dict, context: str) -> str:
-        """查询健康知识"""
-        knowledge_prompt = f"""
-        参考知识：
-        {context}
-        
-        用户问题：{message}
-        
-        请基于参考知识和专业见解回答用户问题。如果信息不足，可以补充其他相关的专业知识。
+        steps = [self._bounded(
+            "知识检索", self._retrieve_context(message, task_type), settings.AI_CONTEXT_RETRIEVAL_TIMEOUT, []
+        )]
+        if user_id is not None:
+            steps.append(self._bounded(
+                "读取健康档案", get_health_profile(user_id), settings.AI_CONTEXT_RECORDS_TIMEOUT, {}
+            ))
+        passages, *profiles = await asyncio.gather(*steps)
+        
+        stats = profile_user_data(profiles[0]) if profiles else {}
+        return passages, merge_user_data(user_data, stats)
+
+    def _render(
+        self, template: PromptTemplate, message: str, passages: List[str], user_data: Dict,
+        conversation: Optional[ConversationState] = None
+    ) -> str:
         """
-        return await self.ai_service.get_response(knowledge_prompt)
-
-    async def _handle_general_query(self, message: str, context: str) -> str:
-        """处理通用健康查询"""
-        general_prompt = f"""
-        参考知识：
-        {context}
-        
-        用户问题：{message}
-        
-        请提供专业、准确的回答。注意：
-        1. 不要给出医疗诊断
-        2. 对于需要就医的情况，建议用户及时就医
-        3. 保持答复的科学性和可操作性
+        模板骨架和用户基础字段完整保留，参考知识、健康档案摘要、饮食记录按 token 预算放入：
+        参考知识按检索排名整条放入，放不下的截断或丢弃；档案摘要与饮食记录超出份额时截断
+        只有模板用到的部分参与预算分配；有会话记录时，摘要和最近对话（优先保留较新的轮次）放在提示词开头
         """
-        return await self.ai_service.get_response(general_prompt)
-
-    async def _analyze_diet_stream(self, message: str, user_data: Dict, context: str):
-        """流式分析饮食情况并给出建议"""
-        analysis_prompt = f"""
-        参考知识：
-        {context}
-        
-        用户信息：
-        - 年龄：{user_data.get('age')}
-        - 身高：{user_data.get('height')}
-        - 体重：{user_data.get('weight')}
-        - BMI：{self._calculate_bmi(user_data)}
-        
-        饮食记录：
-        {user_data.get('diet_records', [])}
-        
-        用户问题：{message}
-        
-        请基于以上信息进行分析并给出个性化的饮食建议。
-        """
-        async for chunk in self.ai_service.get_response_stream(analysis_prompt):
-            yield chunk
-
-    async def _plan_exercise_stream(self, message: str, user_data: Dict, context: str):
-        """流式制定个性化运动计划"""
-        plan_prompt = f"""
-        参考知识：
-        {context}
-        
-        用户基础信息：
-        - 年龄：{user_data.get('age')}
-        - 身高：{user_data.get('height')}
-        - 体重：{user_data.get('weight')}
-        - BMI：{self._calculate_bmi(user_data)}
-        - 运动目标：{message}
-        - 运动禁忌：{user_data.get('exercise_contraindications', '无')}
-        
-        请基于以上信息制定安全、科学、个性化的运动计划。
-        """
-        async for chunk in self.ai_service.get_response_stream(plan_prompt):
-            yield chunk
-
-    async def _sleep_advice_stream(self, message: str, user_data: Dict, context: str):
-        """流式提供睡眠建议"""
-        sleep_prompt = f"""
-        参考知识：
-        {context}
-        
-        用户睡眠情况：
-        - 平均睡眠时间：{user_data.get('avg_sleep_hours')}
-        - 入睡困难：{user_data.get('sleep_issues', [])}
-        - 作息时间：{user_data.get('sleep_schedule', {})}
-        
-        用户问题：{message}
-        
-        请基于以上信息提供个性化的睡眠改善建议。
-        """
-        async for chunk in self.ai_service.get_response_stream(sleep_prompt):
-            yield chunk
-
-    async def _query_knowledge_stream(self, message: str, user_data: Dict, context: str):
-        """流式查询健康知识"""
-        knowledge_prompt = f"""
-        参考知识：
-        {context}
-        
-        用户问题：{message}
-        
-        请基于参考知识和专业见解回答用户问题。如果信息不足，可以补充其他相关的专业知识。
-        """
-        async for chunk in self.ai_service.get_response_stream(knowledge_prompt):
-            yield chunk
-
-    async def _handle_general_query_stream(self, message: str, context: str):
-        """流式处理通用健康查询"""
-        general_prompt = f"""
-        参考知识：
-        {context}
-        
-        用户问题：{message}
-        
-        请提供专业、准确的回答。注意：
-        1. 不要给出医疗诊断
-        2. 对于需要就医的情况，建议用户及时就医
-        3. 保持答复的科学性和可操作性
-        """
-        async for chunk in self.ai_service.get_response_stream(general_prompt):
-            yield chunk
+        diet_records = user_data.get("diet_records") or []
+        if not isinstance(diet_records, list):
+            diet_records = [diet_records]
+        sections = {
+            "context": passages,
+            "recent_records": format_recent_records(user_data),
+            "diet_records": [str(record) for record in diet_records],
+        }
+        values = {
+            "age": user_data.get("age"),
+            "height": user_data.get("height"),
+            "weight": user_data.get("weight"),
+            "bmi": calculate_bmi(user_data.get("height"), user_data.get("weight")) or "未知",
+            "avg_sleep_hours": user_data.get("avg_sleep_hours"),
+            "sleep_issues": user_data.get("sleep_issues", []),
+            "sleep_schedule": user_data.get("sleep_schedule", {}),
+            "exercise_contraindications": user_data.get("exercise_contraindications", "无"),
+        }
+        skeleton = template.render(message="", **values, **{field: "" for field in BUDGETED_FIELDS})
+        flexible = {
+            BUDGETED_FIELDS[field]: sections[field]
+            for field in BUDGETED_FIELDS if field in template.fields
+        }
+        # 系统提示词随提示词一起发送，计入同一预算
+        fixed = {"system": get_template("system").text, "template": skeleton}
+        if conversation is not None and conversation.has_history():
+            fixed["conversation_template"] = conversation_skeleton()
+            flexible.update(conversation.prompt_sections())
+
+        prompt = PromptAssembler(
+            max_tokens=settings.AI_AGENT_PROMPT_MAX_TOKENS,
+            counter=self.token_counter
+        ).assemble(
+            fixed=fixed,
+            required={"question": message},
+            flexible=flexible,
+            keep_latest=("conversation",),
+        )
+        get_prompt_usage("agent").record(prompt)
+        if prompt.truncated or prompt.dropped:
+            logger.info(
+                f"个性化咨询上下文超出预算，截断 {prompt.truncated}，丢弃 {prompt.dropped}"
+            )
+        return render_conversation(
+            prompt.sections.get("summary", ""), prompt.sections.get("conversation", "")
+        ) + template.render(
+            message=prompt.sections["question"],
+            context=prompt.sections.get("passages", ""),
+            recent_records=prompt.sections.get("profile") or "无",
+            diet_records=prompt.sections.get("history") or "无",
+            **values
+        )
+
+    @staticmethod
+    async def _bounded(name: str, awaitable, timeout: float, default):
+        """在超时预算内等待一步上下文构建，超时或出错时返回默认值"""
+        try:
+            return await asyncio.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"{name}超时（{timeout}秒），本次回答不使用该数据")
+        except Exception as e:
+            logger.error(f"{name}失败: {str(e)}")
+        return default
+
+    async def _retrieve_context(self, message: str, task_type: str) -> List[str]:
+        """按任务类型的默认过滤条件检索知识库，返回按相关性排序的段落"""
+        filters = TASK_FILTERS.get(task_type)
+        relevant_docs = await self.rag.search_similar(message, k=2, filters=filters)
+        if not relevant_docs and filters:
+            relevant_docs = await self.rag.search_similar(message, k=2)
+        return [doc['content'] for doc in relevant_docs]
 
     def _identify_task(self, message: str) -> str:
         """识别用户请求的任务类型"""
@@ -255,14 +192,3 @@ class HealthAgent:
             if any(word in message for word in words):
                 return task
         return "general"
-
-    def _calculate_bmi(self, user_data: Dict) -> float:
-        """计算 BMI 指数"""
-        try:
-            height = float(user_data.get('height', 0)) / 100  # 转换为米
-            weight = float(user_data.get('weight', 0))
-            if height > 0 and weight > 0:
-                return round(weight / (height * height), 2)
-            return 0
-        except:
-            return 0
\ No newline at end of file
@@ -6,6 +6,7 @@ import logging
 
 from app.models.health_data import HealthData
 from app.schemas.health_data import HealthDataCreate
+from app.services.health_profile import invalidate_health_profile
 
 logger = logging.getLogger(__name__)
 
@@ -33,6 +34,7 @@ class HealthDataService:
             db.add(db_health_data)
             db.commit()
             db.refresh(db_health_data)
+            invalidate_health_profile(db_health_data.user_id)
             return db_health_data
         except SQLAlchemyError as e:
             logger.error(f"创建健康数据时数据库错误: {str(e)}")
@@ -133,6 +135,7 @@ class HealthDataService:
                 db_health_data.updated_at = datetime.utcnow()
                 db.commit()
                 db.refresh(db_health_data)
+                invalidate_health_profile(db_health_data.user_id)
             return db_health_data
         except SQLAlchemyError as e:
             logger.error(f"更新健康数据时数据库错误: {str(e)}")
@@ -154,6 +157,7 @@ class HealthDataService:
             if db_health_data:
                 db.delete(db_health_data)
                 db.commit()
+                invalidate_health_profile(db_health_data.user_id)
                 return True
             return False
         except SQLAlchemyError as e:
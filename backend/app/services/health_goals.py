@@ -4,6 +4,7 @@ from typing import List, Optional
 
 from app.models.health_goals import HealthGoal
 from app.schemas.health_goals import HealthGoalsCreate
+from app.services.health_profile import invalidate_health_profile
 
 class HealthGoalsService:
     
@@ -28,6 +29,7 @@ class HealthGoalsService:
         db.add(db_health_goal)
         db.commit()
         db.refresh(db_health_goal)
+        invalidate_health_profile(db_health_goal.user_id)
         return db_health_goal
     
     @staticmethod
@@ -61,6 +63,7 @@ class HealthGoalsService:
             db_health_goal.updated_at = datetime.utcnow()
             db.commit()
             db.refresh(db_health_goal)
+            invalidate_health_profile(db_health_goal.user_id)
         return db_health_goal
     
     @staticmethod
@@ -70,5 +73,6 @@ class HealthGoalsService:
         if db_health_goal:
             db.delete(db_health_goal)
             db.commit()
+            invalidate_health_profile(db_health_goal.user_id)
             return True
         return False 
\ No newline at end of file
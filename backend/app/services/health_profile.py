@@ -0,0 +1,260 @@
+"""
+用户健康档案快照
+个性化咨询需要的服务端数据（最新体征、近 7 / 30 天睡眠与运动统计、进行中的健康目标）
+按用户汇总成一个档案，缓存在进程内 LRU 中：
+    - 未命中时各数据源在工作线程中并发读取，同一用户的并发构建只执行一次
+    - 健康数据、睡眠、运动、目标的增删改通过 invalidate_health_profile 直写失效
+    - TTL 兜底统计窗口随日期滑动以及绕过服务层的写入
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import engine
+from app.models.exercise_log import ExerciseLog
+from app.models.health_data import HealthData
+from app.models.health_goals import GoalStatus, HealthGoal
+from app.models.sleep_record import SleepRecord
+from app.services.single_flight import SingleFlight
+from app.services.user_context import derive_exercise_stats, derive_health_stats, derive_sleep_stats
+
+logger = logging.getLogger(__name__)
+
+# 读取的最近健康数据条数
+HEALTH_DATA_LIMIT = 30
+# 统计窗口（天）
+PROFILE_WINDOWS = (7, 30)
+
+
+def _rows(query) -> List[Dict]:
+    return [dict(row._mapping) for row in query]
+
+
+def load_vitals(user_id: int) -> Dict:
+    """最新体征与 BMI 趋势"""
+    with Session(engine) as session:
+        rows = _rows(session.query(
+            HealthData.record_date,
+            HealthData.height,
+            HealthData.weight,
+            HealthData.systolic_pressure,
+            HealthData.diastolic_pressure
+        ).filter(
+            HealthData.user_id == user_id
+        ).order_by(HealthData.record_date.desc()).limit(HEALTH_DATA_LIMIT))
+    return derive_health_stats(rows)
+
+
+def load_sleep(user_id: int, today: Optional[date] = None) -> Dict:
+    """各统计窗口内的睡眠时长与质量"""
+    today = today or date.today()
+    with Session(engine) as session:
+        rows = _rows(session.query(
+            SleepRecord.sleep_date,
+            SleepRecord.sleep_duration,
+            SleepRecord.sleep_quality
+        ).filter(
+            SleepRecord.user_id == user_id,
+            SleepRecord.sleep_date >= today - timedelta(days=max(PROFILE_WINDOWS))
+        ))
+    return {
+        f"{days}d": derive_sleep_stats([row for row in rows if row["sleep_date"] >= today - timedelta(days=days)])
+        for days in PROFILE_WINDOWS
+    }
+
+
+def load_exercise(user_id: int, today: Optional[date] = None) -> Dict:
+    """各统计窗口内折算的每周运动量"""
+    today = today or date.today()
+    with Session(engine) as session:
+        rows = _rows(session.query(
+            ExerciseLog.log_date,
+            ExerciseLog.exercise_type,
+            ExerciseLog.duration_minutes
+        ).filter(
+            ExerciseLog.user_id == user_id,
+            ExerciseLog.log_date >= today - timedelta(days=max(PROFILE_WINDOWS))
+        ))
+    return {
+        f"{days}d": derive_exercise_stats(
+            [row for row in rows if row["log_date"] >= today - timedelta(days=days)], days
+        )
+        for days in PROFILE_WINDOWS
+    }
+
+
+def load_goals(user_id: int) -> List[Dict]:
+    """进行中的健康目标"""
+    with Session(engine) as session:
+        goals = session.query(HealthGoal).filter(
+            HealthGoal.user_id == user_id,
+            HealthGoal.status == GoalStatus.ACTIVE
+        ).order_by(HealthGoal.target_date).all()
+        return [
+            {
+                "title": goal.title,
+                "goal_type": goal.goal_type.value,
+                "target_value": float(goal.target_value) if goal.target_value is not None else None,
+                "current_value": float(goal.current_value) if goal.current_value is not None else None,
+                "unit": goal.unit,
+                "target_date": goal.target_date.isoformat() if goal.target_date else None,
+            }
+            for goal in goals
+        ]
+
+
+# 档案字段 -> 读取函数（同步，在工作线程中执行）
+PROFILE_SECTIONS = {
+    "vitals": load_vitals,
+    "sleep": load_sleep,
+    "exercise": load_exercise,
+    "goals": load_goals,
+}
+
+
+def profile_user_data(profile: Dict) -> Dict:
+    """
+    把档案展开为提示词使用的用户数据字段：
+    睡眠和运动优先取近 7 天，没有记录时取 30 天，另附 30 天数值用于对比
+    """
+    data = dict(profile.get("vitals") or {})
+    for section in ("sleep", "exercise"):
+        windows = profile.get(section) or {}
+        recent, month = windows.get("7d") or {}, windows.get("30d") or {}
+        data.update(recent or month)
+        if recent and month:
+            data.update({f"{key}_30d": value for key, value in month.items() if key in (
+                "avg_sleep_hours", "weekly_exercise_minutes"
+            )})
+    if profile.get("goals"):
+        data["health_goals"] = profile["goals"]
+    return data
+
+
+class HealthProfileCache:
+    """按用户ID缓存档案的 LRU；每个用户维护一个失效代数，构建期间被失效的档案不写入"""
+
+    def __init__(self, max_size: int = 1000, ttl: Optional[float] = 3600):
+        self.max_size = max(int(max_size), 0)
+        self.ttl = ttl if ttl and ttl > 0 else None
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()
+        self._generations: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_id: int) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry["stored_at"] > self.ttl:
+                del self._entries[user_id]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry["profile"]
+
+    def generation(self, user_id: int) -> int:
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def put(self, user_id: int, profile: Dict, generation: int) -> bool:
+        """写入档案；构建开始后该用户的数据已变化时放弃写入"""
+        if self.max_size == 0:
+            return False
+        with self._lock:
+            if self._generations.get(user_id, 0) != generation:
+                return False
+            self._entries[user_id] = {"profile": profile, "stored_at": time.monotonic()}
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                evicted, _ = self._entries.popitem(last=False)
+                self._generations.pop(evicted, None)
+            return True
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            if self._entries.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+# 全局档案缓存与构建合并
+_profile_cache = None
+_profile_flight = SingleFlight("health-profile")
+
+
+def get_profile_cache() -> HealthProfileCache:
+    """获取档案缓存单例"""
+    global _profile_cache
+    if _profile_cache is None:
+        _profile_cache = HealthProfileCache(
+            max_size=settings.AI_PROFILE_CACHE_SIZE,
+            ttl=settings.AI_PROFILE_CACHE_TTL
+        )
+    return _profile_cache
+
+
+def invalidate_health_profile(user_id: Optional[int]) -> None:
+    """用户的健康数据、睡眠、运动或目标变化后调用"""
+    if user_id is not None:
+        get_profile_cache().invalidate(user_id)
+
+
+async def build_health_profile(user_id: int) -> Dict:
+    """各数据源并发读取；有数据源失败时返回部分档案，但不写入缓存"""
+    cache = get_profile_cache()
+    generation = cache.generation(user_id)
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(asyncio.to_thread(load, user_id) for load in PROFILE_SECTIONS.values()),
+        return_exceptions=True
+    )
+    profile, complete = {"user_id": user_id}, True
+    for name, result in zip(PROFILE_SECTIONS, results):
+        if isinstance(result, Exception):
+            logger.error(f"读取用户 {user_id} 的 {name} 失败: {str(result)}")
+            complete = False
+            continue
+        profile[name] = result
+    profile["built_at"] = time.time()
+    if complete:
+        cache.put(user_id, profile, generation)
+    logger.info(f"构建用户 {user_id} 健康档案耗时 {(time.perf_counter() - start) * 1000:.1f}ms")
+    return profile
+
+
+async def get_health_profile(user_id: int) -> Dict:
+    """读取用户健康档案，未命中时构建，同一用户的并发请求共用一次构建"""
+    profile = get_profile_cache().get(user_id)
+    if profile is not None:
+        return profile
+    # 键带上失效代数，数据变化后到达的请求不会复用变化前开始的构建
+    key = (user_id, get_profile_cache().generation(user_id))
+    return await _profile_flight.do(key, lambda: build_health_profile(user_id))
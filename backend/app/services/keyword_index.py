@@ -0,0 +1,197 @@
+"""
+关键词检索索引
+所有文档的关键词编译成一个 Aho-Corasick 多模式自动机，查询文本只需扫描一遍即可找出全部命中的关键词，
+再通过倒排表把分数累加到对应文档上；对中文不依赖空格分词
+"""
+
+import json
+import re
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from app.services.embedding_cache import normalize_query
+
+# 关键词命中的权重高于英文单词命中，与原先的打分规则一致
+KEYWORD_WEIGHT = 2
+TERM_WEIGHT = 1
+# 内容中的英文/数字词，长度不超过 2 的词不参与打分
+_TERM_PATTERN = re.compile(r"[a-z0-9]{3,}")
+
+
+def parse_keywords(meta_info: Optional[str]) -> List[str]:
+    """从 VectorStore.meta_info 的 JSON 中取出 keywords 列表"""
+    if not meta_info:
+        return []
+    try:
+        meta = json.loads(meta_info)
+    except (TypeError, ValueError):
+        return []
+    keywords = meta.get("keywords") if isinstance(meta, dict) else None
+    if not isinstance(keywords, list):
+        return []
+    return [str(keyword) for keyword in keywords if keyword]
+
+
+class AhoCorasick:
+    """Aho-Corasick 多模式匹配自动机"""
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: List[str] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+
+        for pattern in patterns:
+            if pattern:
+                self._insert(pattern)
+        self._build_failure_links()
+
+    def _insert(self, pattern: str) -> None:
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append(len(self.patterns))
+        self.patterns.append(pattern)
+
+    def _build_failure_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                # 合并失败链上的输出，匹配时无需再沿失败链回溯
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find_all(self, text: str) -> Set[int]:
+        """扫描一遍文本，返回命中的模式下标集合"""
+        matched: Set[int] = set()
+        state = 0
+        for char in text:
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            if self._output[state]:
+                matched.update(self._output[state])
+        return matched
+
+
+class KeywordIndex:
+    """关键词倒排索引，支持按文档增量增删，自动机在关键词集合变化后惰性重建"""
+
+    def __init__(self):
+        self._docs: Dict[int, Dict] = {}
+        self._keyword_postings: Dict[str, Set[int]] = {}
+        self._term_postings: Dict[str, Set[int]] = {}
+        self._automaton: Optional[AhoCorasick] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    @property
+    def keyword_count(self) -> int:
+        return len(self._keyword_postings)
+
+    def add(self, doc_id: int, content: str, source: Optional[str], keywords: Iterable[str]) -> None:
+        """添加或替换一个文档"""
+        keywords = {normalize_query(keyword) for keyword in keywords} - {""}
+        terms = set(_TERM_PATTERN.findall(normalize_query(content)))
+        with self._lock:
+            self._remove(doc_id)
+            self._docs[doc_id] = {"content": content, "source": source, "keywords": keywords, "terms": terms}
+            for keyword in keywords:
+                if keyword not in self._keyword_postings:
+                    self._keyword_postings[keyword] = set()
+                    self._automaton = None
+                self._keyword_postings[keyword].add(doc_id)
+            for term in terms:
+                self._term_postings.setdefault(term, set()).add(doc_id)
+
+    def remove(self, doc_id: int) -> None:
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id: int) -> None:
+        doc = self._docs.pop(doc_id, None)
+        if doc is None:
+            return
+        for keyword in doc["keywords"]:
+            postings = self._keyword_postings[keyword]
+            postings.discard(doc_id)
+            if not postings:
+                del self._keyword_postings[keyword]
+                self._automaton = None
+        for term in doc["terms"]:
+            postings = self._term_postings[term]
+            postings.discard(doc_id)
+            if not postings:
+                del self._term_postings[term]
+
+    def search_ids(self, query: str, k: int = 3, allowed: Optional[Set[int]] = None) -> List[Tuple[int, int]]:
+        """
+        关键词检索，返回 [(doc_id, 分数)]，给定 allowed 时只返回其中的文档
+        自动机找出查询中出现的关键词，每个关键词为包含它的文档加 2 分；
+        查询中的英文词与内容词完全匹配时加 1 分
+        """
+        scores, _ = self._score(query, allowed)
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+
+    def _score(self, query: str, allowed: Optional[Set[int]] = None) -> Tuple[Dict[int, int], int]:
+        """返回 (doc_id -> 分数, 本次查询可能得到的最高分)"""
+        text = normalize_query(query)
+        with self._lock:
+            if self._automaton is None:
+                self._automaton = AhoCorasick(self._keyword_postings.keys())
+            automaton = self._automaton
+
+            scores: Dict[int, int] = {}
+            best = 0
+            for pattern_id in automaton.find_all(text):
+                best += KEYWORD_WEIGHT
+                for doc_id in self._keyword_postings.get(automaton.patterns[pattern_id], ()):
+                    scores[doc_id] = scores.get(doc_id, 0) + KEYWORD_WEIGHT
+            for term in set(_TERM_PATTERN.findall(text)):
+                postings = self._term_postings.get(term, ())
+                if postings:
+                    best += TERM_WEIGHT
+                for doc_id in postings:
+                    scores[doc_id] = scores.get(doc_id, 0) + TERM_WEIGHT
+
+        if allowed is not None:
+            scores = {doc_id: score for doc_id, score in scores.items() if doc_id in allowed}
+        return scores, best
+
+    def document(self, doc_id: int, score) -> Optional[Dict]:
+        """构造与向量检索一致的结果字典"""
+        doc = self._docs.get(doc_id)
+        if doc is None:
+            return None
+        return {"id": doc_id, "content": doc["content"], "similarity": score, "source": doc["source"]}
+
+    def search(self, query: str, k: int = 3, allowed: Optional[Set[int]] = None) -> List[Dict]:
+        """
+        关键词检索，返回结果字典
+        similarity 为命中分数占本次查询最高可能分数的比例（[0, 1]，与余弦相似度同一量纲），
+        原始命中分数放在 scores["keyword"] 中
+        """
+        scores, best = self._score(query, allowed)
+        results = []
+        for doc_id, score in sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]:
+            result = self.document(doc_id, score / best)
+            if result is not None:
+                result["scores"] = {"keyword": float(score)}
+                results.append(result)
+        return results
@@ -0,0 +1,248 @@
+"""
+知识库批量导入
+读取 JSON / JSONL / Markdown 文件，按内容哈希跳过已存储的条目，
+通过 embed_documents 分批生成向量（限制并发数），再用多行 INSERT 写入 vector_store
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import engine
+from app.models.vector_store import VectorStore
+from app.services.embedding_codec import embedding_columns
+from app.services.llm_admission import PRIORITY_BULK, embedding_slot
+from app.services.text_chunking import chunk_document
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_FORMATS = ("json", "jsonl", "md")
+# 查询已存在哈希时每条 IN 语句的参数数量
+HASH_LOOKUP_BATCH = 500
+
+ProgressCallback = Callable[[int, int], None]
+
+
+def content_hash(content: str) -> str:
+    """合并空白后的内容 SHA-256，作为去重键"""
+    return hashlib.sha256(re.sub(r"\s+", " ", content or "").strip().encode("utf-8")).hexdigest()
+
+
+def detect_format(filename: str) -> str:
+    """根据扩展名判断文件格式"""
+    ext = os.path.splitext(filename)[1].lower().lstrip(".")
+    if ext == "markdown":
+        ext = "md"
+    if ext not in SUPPORTED_FORMATS:
+        raise ValueError(f"不支持的文件格式: {filename}，仅支持 {', '.join(SUPPORTED_FORMATS)}")
+    return ext
+
+
+def _normalize_item(item, default_source: Optional[str]) -> Optional[Dict]:
+    """统一条目结构为 {content, source, meta_info}"""
+    if isinstance(item, str):
+        item = {"content": item}
+    if not isinstance(item, dict):
+        return None
+    content = str(item.get("content") or "").strip()
+    if not content:
+        return None
+    meta_info = dict(item.get("meta_info") or {})
+    if item.get("keywords"):
+        meta_info["keywords"] = list(item["keywords"])
+    if item.get("tags"):
+        meta_info["tags"] = list(item["tags"])
+    return {
+        "content": content,
+        "source": item.get("source") or item.get("topic") or default_source,
+        "meta_info": meta_info or None,
+    }
+
+
+def _parse_markdown(text: str) -> List[Dict]:
+    """二级标题作为来源，"- " 开头的列表项（可跨多行）作为一条知识"""
+    items, source, current = [], None, None
+    for line in text.splitlines():
+        if line.startswith("## "):
+            source, current = line[3:].strip(), None
+        elif line.startswith("# "):
+            source, current = None, None
+        elif line.startswith("- "):
+            current = {"content": line[2:], "source": source}
+            items.append(current)
+        elif line.strip() and current is not None:
+            current["content"] += "\n" + line
+    return items
+
+
+def parse_documents(text: str, fmt: str, default_source: Optional[str] = None) -> List[Dict]:
+    """
+    解析文件内容
+    json 支持条目列表或 {"knowledge": [...]}（generate 脚本的输出格式）；jsonl 每行一个条目
+    """
+    if fmt == "json":
+        data = json.loads(text)
+        raw = data.get("knowledge", []) if isinstance(data, dict) else data
+    elif fmt == "jsonl":
+        raw = [json.loads(line) for line in text.splitlines() if line.strip()]
+    elif fmt == "md":
+        raw = _parse_markdown(text)
+    else:
+        raise ValueError(f"不支持的文件格式: {fmt}")
+
+    documents = (_normalize_item(item, default_source) for item in raw)
+    return [doc for doc in documents if doc is not None]
+
+
+def load_documents(path: str, default_source: Optional[str] = None) -> List[Dict]:
+    """读取并解析知识文件"""
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_documents(f.read(), detect_format(path), default_source)
+
+
+def prepare_documents(documents: Iterable[Dict], chunk: Optional[bool] = None) -> List[Dict]:
+    """切分长文档，片段的父文档标识为原文的内容哈希"""
+    chunk = settings.RAG_CHUNKING_ENABLED if chunk is None else chunk
+    if not chunk:
+        return list(documents)
+    return [
+        piece
+        for doc in documents
+        for piece in chunk_document(doc, content_hash(doc["content"]))
+    ]
+
+
+class KnowledgeIngestor:
+    """批量导入器：去重、分批生成向量、多行写入"""
+
+    def __init__(
+        self,
+        embeddings,
+        batch_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        insert_batch_size: Optional[int] = None,
+    ):
+        self.embeddings = embeddings
+        self.batch_size = batch_size or settings.RAG_INGEST_BATCH_SIZE
+        self.concurrency = concurrency or settings.RAG_INGEST_CONCURRENCY
+        self.insert_batch_size = insert_batch_size or settings.RAG_INGEST_INSERT_BATCH
+
+    @staticmethod
+    def _existing_hashes(hashes: List[str]) -> set:
+        """查询已存储（未删除）的内容哈希"""
+        existing = set()
+        with Session(engine) as session:
+            for start in range(0, len(hashes), HASH_LOOKUP_BATCH):
+                chunk = hashes[start:start + HASH_LOOKUP_BATCH]
+                rows = session.query(VectorStore.content_hash).filter(
+                    VectorStore.content_hash.in_(chunk),
+                    VectorStore.is_deleted.is_(False)
+                ).all()
+                existing.update(row.content_hash for row in rows)
+        return existing
+
+    def _insert_rows(self, rows: List[Dict]) -> int:
+        """
+        多行 INSERT 写入，每 insert_batch_size 行提交一个事务，事务不随导入规模增长；
+        某个事务失败只回滚这一批，返回成功写入的行数
+        """
+        inserted = 0
+        with Session(engine) as session:
+            for start in range(0, len(rows), self.insert_batch_size):
+                chunk = rows[start:start + self.insert_batch_size]
+                try:
+                    session.execute(insert(VectorStore), chunk)
+                    session.commit()
+                    inserted += len(chunk)
+                except Exception as e:
+                    session.rollback()
+                    logger.error(f"写入 {len(chunk)} 条知识失败: {str(e)}")
+        return inserted
+
+    async def ingest(
+        self,
+        documents: Iterable[Dict],
+        progress: Optional[ProgressCallback] = None,
+        chunk: Optional[bool] = None,
+    ) -> Dict:
+        """
+        导入文档并返回统计信息，长文档先切分为片段，统计按片段计数
+        progress(已处理数, 待处理总数) 在每个批次写入后调用
+        """
+        start_time = time.time()
+        documents = list(documents)
+        source_count = len(documents)
+        documents = prepare_documents(documents, chunk)
+
+        # 1. 文件内去重，再跳过数据库中已存在的内容
+        unique: Dict[str, Dict] = {}
+        for doc in documents:
+            unique.setdefault(content_hash(doc["content"]), doc)
+        existing = await asyncio.to_thread(self._existing_hashes, list(unique))
+        pending = [(h, doc) for h, doc in unique.items() if h not in existing]
+
+        report = {
+            "documents": source_count,
+            "total": len(documents),
+            "duplicates_in_input": len(documents) - len(unique),
+            "skipped_existing": len(existing),
+            "inserted": 0,
+            "failed": 0,
+            "batches": 0,
+        }
+        total = len(pending)
+        if progress:
+            progress(0, total)
+
+        # 2. 分批生成向量，信号量限制同时进行的 API 请求数
+        semaphore = asyncio.Semaphore(self.concurrency)
+        processed = 0
+
+        async def run_batch(batch):
+            nonlocal processed
+            async with semaphore:
+                try:
+                    # 批量导入排在交互请求之后，不参与降级
+                    async with embedding_slot(PRIORITY_BULK, shed=False):
+                        vectors = await self.embeddings.aembed_documents([doc["content"] for _, doc in batch])
+                    rows = [
+                        {
+                            "content": doc["content"],
+                            "content_hash": h,
+                            "source": doc.get("source"),
+                            "meta_info": json.dumps(doc["meta_info"], ensure_ascii=False) if doc.get("meta_info") else None,
+                            **embedding_columns(vector),
+                        }
+                        for (h, doc), vector in zip(batch, vectors)
+                    ]
+                    inserted = await asyncio.to_thread(self._insert_rows, rows)
+                    report["inserted"] += inserted
+                    report["failed"] += len(rows) - inserted
+                except Exception as e:
+                    logger.error(f"批量导入失败（{len(batch)} 条）: {str(e)}")
+                    report["failed"] += len(batch)
+                report["batches"] += 1
+                processed += len(batch)
+                if progress:
+                    progress(processed, total)
+
+        batches = [pending[i:i + self.batch_size] for i in range(0, total, self.batch_size)]
+        await asyncio.gather(*(run_batch(batch) for batch in batches))
+
+        elapsed = time.time() - start_time
+        report["elapsed"] = round(elapsed, 3)
+        report["docs_per_second"] = round(report["inserted"] / elapsed, 2) if elapsed > 0 else 0.0
+        logger.info(
+            f"批量导入完成: 新增 {report['inserted']} 条，跳过已存在 {report['skipped_existing']} 条，"
+            f"失败 {report['failed']} 条，耗时 {elapsed:.2f}s（{report['docs_per_second']} 条/秒）"
+        )
+        return report
@@ -0,0 +1,220 @@
+"""
+上游 LLM / Embedding 请求的准入控制
+    - 全局并发上限：同时进行的上游请求数不超过 AI_MAX_IN_FLIGHT，流式请求在整个流结束前占用名额
+    - 优先级排队：名额不足时按优先级（交互式对话 > 默认 > 批量导入）和到达顺序排队
+    - 按模型的令牌桶限速：每分钟请求数由 AI_RATE_LIMIT_RPM / AI_MODEL_RATE_LIMITS 配置
+    - 快速降级：排队数达到 AI_MAX_QUEUE 或排队超过 AI_QUEUE_TIMEOUT 时抛出 AdmissionRejected，接口层转为 429
+批量导入不参与降级，只会排在交互请求之后等待
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import Counter, deque
+from contextlib import asynccontextmanager, nullcontext
+from typing import Deque, Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.embedding_provider import embedding_model_name
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_DEFAULT = 1
+PRIORITY_BULK = 2
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_DEFAULT: "default",
+    PRIORITY_BULK: "bulk",
+}
+
+# 每个优先级保留最近多少次排队耗时用于计算分位数
+WAIT_SAMPLES = 1000
+
+
+class AdmissionRejected(Exception):
+    """上游请求被准入控制拒绝，接口层返回 429"""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """令牌桶：按 rate（个/秒）补充令牌，最多积攒 capacity 个，取不到令牌时按 FIFO 等待"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, cost: float = 1.0) -> None:
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= cost:
+                    self.tokens -= cost
+                    return
+                await asyncio.sleep((cost - self.tokens) / self.rate)
+
+
+class AdmissionController:
+    """全局并发上限 + 优先级队列 + 按模型限速"""
+
+    def __init__(
+        self,
+        max_in_flight: int = 16,
+        max_queue: int = 64,
+        queue_timeout: Optional[float] = 10.0,
+        default_rpm: float = 0,
+        model_rpm: Optional[Dict[str, float]] = None,
+    ):
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.max_queue = max(0, int(max_queue))
+        self.queue_timeout = queue_timeout if queue_timeout and queue_timeout > 0 else None
+        self.default_rpm = default_rpm
+        self.model_rpm = dict(model_rpm or {})
+        self._in_flight = 0
+        self._waiters: List = []
+        self._seq = itertools.count()
+        self._queued: Counter = Counter()
+        self._buckets: Dict[str, Optional[TokenBucket]] = {}
+        self._waits: Dict[int, Deque[float]] = {p: deque(maxlen=WAIT_SAMPLES) for p in PRIORITY_NAMES}
+        self.admitted: Counter = Counter()
+        self.rejected: Counter = Counter()
+        self.max_queue_depth = 0
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queued(self) -> int:
+        return sum(self._queued.values())
+
+    def _bucket(self, model: str) -> Optional[TokenBucket]:
+        if model not in self._buckets:
+            rpm = self.model_rpm.get(model, self.default_rpm)
+            self._buckets[model] = TokenBucket(rpm / 60.0) if rpm and rpm > 0 else None
+        return self._buckets[model]
+
+    def check_capacity(self) -> None:
+        """没有空闲名额且队列已满时立即拒绝，流式接口在开始响应前调用以便返回 429"""
+        if self._in_flight >= self.max_in_flight and self.queued >= self.max_queue:
+            self.rejected["queue_full"] += 1
+            raise AdmissionRejected(f"AI 服务繁忙，排队请求已达上限 {self.max_queue}")
+
+    @asynccontextmanager
+    async def slot(self, model: str, priority: int = PRIORITY_INTERACTIVE, shed: bool = True):
+        """
+        占用一个上游请求名额，退出时释放
+        shed 为 False 时（批量导入）不受队列上限和排队超时限制
+        """
+        start = time.monotonic()
+        await self._acquire(priority, shed)
+        try:
+            bucket = self._bucket(model)
+            if bucket is not None:
+                await bucket.acquire()
+            self._waits[priority].append(time.monotonic() - start)
+            self.admitted[priority] += 1
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, priority: int, shed: bool) -> None:
+        if self._in_flight < self.max_in_flight and not self.queued:
+            self._in_flight += 1
+            return
+        if shed:
+            self.check_capacity()
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._queued[priority] += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queued)
+        try:
+            if shed and self.queue_timeout:
+                await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+            else:
+                await future
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # 名额已经转交过来，放弃前交还
+                self._release()
+            else:
+                future.cancel()
+                self._queued[priority] -= 1
+            if isinstance(e, asyncio.TimeoutError):
+                self.rejected["queue_timeout"] += 1
+                raise AdmissionRejected(f"AI 服务繁忙，排队超过 {self.queue_timeout} 秒") from None
+            raise
+
+    def _release(self) -> None:
+        """名额直接转交给优先级最高、最早到达的等待者，没有等待者时归还"""
+        while self._waiters:
+            priority, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self._queued[priority] -= 1
+            future.set_result(None)
+            return
+        self._in_flight -= 1
+
+    def stats(self) -> Dict:
+        queue_wait = {}
+        for priority, name in PRIORITY_NAMES.items():
+            waits = np.asarray(self._waits[priority], dtype=np.float64) * 1000
+            queue_wait[name] = {
+                "admitted": self.admitted[priority],
+                "queued": self._queued[priority],
+                "p50_ms": round(float(np.percentile(waits, 50)), 3) if waits.size else None,
+                "p95_ms": round(float(np.percentile(waits, 95)), 3) if waits.size else None,
+                "max_ms": round(float(waits.max()), 3) if waits.size else None,
+            }
+        return {
+            "in_flight": self._in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "max_queue_depth": self.max_queue_depth,
+            "rejected": dict(self.rejected),
+            "rate_limits_rpm": {model: self.model_rpm.get(model, self.default_rpm) for model in self._buckets},
+            "queue_wait": queue_wait,
+        }
+
+
+# 全局准入控制实例
+_admission_controller = None
+
+
+def get_admission_controller() -> AdmissionController:
+    """获取准入控制单例，所有上游对话和 embedding 请求共用"""
+    global _admission_controller
+    if _admission_controller is None:
+        _admission_controller = AdmissionController(
+            max_in_flight=settings.AI_MAX_IN_FLIGHT,
+            max_queue=settings.AI_MAX_QUEUE,
+            queue_timeout=settings.AI_QUEUE_TIMEOUT,
+            default_rpm=settings.AI_RATE_LIMIT_RPM,
+            model_rpm=settings.AI_MODEL_RATE_LIMITS,
+        )
+    return _admission_controller
+
+
+def embedding_slot(priority: int = PRIORITY_INTERACTIVE, shed: bool = True):
+    """embedding 请求的准入；本地哈希 embedding 不访问上游，不占用名额"""
+    if settings.RAG_EMBEDDING_PROVIDER == "hashing":
+        return nullcontext()
+    return get_admission_controller().slot(embedding_model_name(), priority, shed)
@@ -0,0 +1,137 @@
+"""
+元数据过滤
+按 source / topic / tags 维护倒排表，检索时先由过滤条件得到候选集合，再只对候选打分；
+同一字段的多个取值之间为"或"，不同字段之间为"且"
+
+topic 取 meta_info 中的 topic，没有时使用 source（批量导入时条目的 topic 写入 source）；
+tags 取 meta_info 中的 tags 与 keywords
+"""
+
+import json
+import threading
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+FILTER_FIELDS = ("source", "topic", "tags")
+
+Filters = Dict[str, Tuple[str, ...]]
+
+
+def normalize_filters(filters: Optional[Dict]) -> Optional[Filters]:
+    """
+    统一过滤条件为 {字段: (取值, ...)}，取值排序后可直接作为缓存键
+    未知字段抛出 ValueError，没有有效条件时返回 None
+    """
+    if not filters:
+        return None
+    normalized = {}
+    for field, values in filters.items():
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"不支持的过滤字段: {field}，仅支持 {', '.join(FILTER_FIELDS)}")
+        if values is None:
+            continue
+        if isinstance(values, str):
+            values = [values]
+        values = tuple(sorted({str(value) for value in values if value}))
+        if values:
+            normalized[field] = values
+    return normalized or None
+
+
+def filter_key(filters: Filters) -> Tuple:
+    return tuple(sorted(filters.items()))
+
+
+def row_fields(source: Optional[str], meta_info: Optional[str]) -> Dict[str, Set[str]]:
+    """解析一行的可过滤字段"""
+    meta = {}
+    if meta_info:
+        try:
+            meta = json.loads(meta_info)
+        except (TypeError, ValueError):
+            meta = {}
+        if not isinstance(meta, dict):
+            meta = {}
+    topic = meta.get("topic") or source
+    tags = set()
+    for name in ("tags", "keywords"):
+        if isinstance(meta.get(name), list):
+            tags.update(str(tag) for tag in meta[name] if tag)
+    return {
+        "source": {source} if source else set(),
+        "topic": {str(topic)} if topic else set(),
+        "tags": tags,
+    }
+
+
+def matches_filters(source: Optional[str], meta_info: Optional[str], filters: Optional[Filters]) -> bool:
+    """逐行判断是否满足过滤条件，用于没有倒排表的检索路径"""
+    if not filters:
+        return True
+    fields = row_fields(source, meta_info)
+    return all(fields[field] & set(values) for field, values in filters.items())
+
+
+class MetadataFilterIndex:
+    """(字段, 取值) -> id 集合的倒排表，支持按行增量增删"""
+
+    def __init__(self):
+        self._postings: Dict[Tuple[str, str], Set[int]] = {}
+        self._terms_by_id: Dict[int, Tuple[Tuple[str, str], ...]] = {}
+        self._lock = threading.Lock()
+        # 每次变更递增，调用方据此判断缓存的过滤结果是否过期
+        self.generation = 0
+
+    def __len__(self) -> int:
+        return len(self._terms_by_id)
+
+    def add(self, doc_id: int, source: Optional[str], meta_info: Optional[str]) -> None:
+        """添加或替换一行"""
+        terms = tuple(
+            (field, value)
+            for field, values in row_fields(source, meta_info).items()
+            for value in values
+        )
+        with self._lock:
+            self._remove(doc_id)
+            self._terms_by_id[doc_id] = terms
+            for term in terms:
+                self._postings.setdefault(term, set()).add(doc_id)
+            self.generation += 1
+
+    def remove(self, doc_id: int) -> None:
+        with self._lock:
+            if self._remove(doc_id):
+                self.generation += 1
+
+    def _remove(self, doc_id: int) -> bool:
+        terms = self._terms_by_id.pop(doc_id, None)
+        if terms is None:
+            return False
+        for term in terms:
+            postings = self._postings[term]
+            postings.discard(doc_id)
+            if not postings:
+                del self._postings[term]
+        return True
+
+    def candidate_ids(self, filters: Filters) -> Set[int]:
+        """满足过滤条件的 id 集合，从最小的字段集合开始求交集"""
+        with self._lock:
+            groups = []
+            for field, values in filters.items():
+                ids: Set[int] = set()
+                for value in values:
+                    ids |= self._postings.get((field, value), set())
+                groups.append(ids)
+        groups.sort(key=len)
+        result = set(groups[0])
+        for ids in groups[1:]:
+            result &= ids
+            if not result:
+                break
+        return result
+
+    def values(self, field: str) -> Iterable[str]:
+        """某个字段出现过的全部取值"""
+        with self._lock:
+            return sorted(value for name, value in self._postings if name == field)
@@ -0,0 +1,159 @@
+"""
+持久化 Embedding 缓存
+使用 SQLite（WAL 模式）保存查询向量，同一主机上的多个 uvicorn worker 可以并发读取，
+进程重启后也能复用；支持启动预热和按条数压缩
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 访问记录累计到该数量后批量写回，避免每次命中都产生写事务
+TOUCH_FLUSH_SIZE = 64
+# 每写入该数量的条目检查一次是否需要压缩
+COMPACT_CHECK_INTERVAL = 100
+
+
+class PersistentEmbeddingCache:
+    """基于 SQLite 的跨进程 embedding 缓存，键为规范化查询文本的哈希与模型名"""
+
+    def __init__(self, path: str, model: str, max_rows: int = 100000):
+        self.path = path
+        self.model = model
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._pending_touches: Dict[str, float] = {}
+        self._writes_since_check = 0
+        self.hits = 0
+        self.misses = 0
+        self.compactions = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                cache_key TEXT NOT NULL,
+                model TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (cache_key, model)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_embedding_cache_last_access "
+            "ON embedding_cache (model, last_access)"
+        )
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """读取缓存的向量（小端 float32）"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT vector FROM embedding_cache WHERE cache_key = ? AND model = ?",
+                (key, self.model),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._pending_touches[key] = time.time()
+            if len(self._pending_touches) >= TOUCH_FLUSH_SIZE:
+                self._flush_touches()
+        return np.frombuffer(row[0], dtype="<f4")
+
+    def set(self, key: str, vector) -> None:
+        """写入向量，定期检查是否超过容量"""
+        data = np.asarray(vector, dtype="<f4").tobytes()
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO embedding_cache (cache_key, model, vector, hits, created_at, last_access) "
+                "VALUES (?, ?, ?, 0, ?, ?) "
+                "ON CONFLICT (cache_key, model) DO UPDATE SET vector = excluded.vector, "
+                "last_access = excluded.last_access",
+                (key, self.model, data, now, now),
+            )
+            self._writes_since_check += 1
+            if self._writes_since_check >= COMPACT_CHECK_INTERVAL:
+                self._writes_since_check = 0
+                self._compact()
+
+    def warm_load(self, limit: int) -> List[Tuple[str, np.ndarray]]:
+        """按命中次数和最近访问时间取出最常用的条目，用于启动时预热内存缓存"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT cache_key, vector FROM embedding_cache WHERE model = ? "
+                "ORDER BY hits DESC, last_access DESC LIMIT ?",
+                (self.model, limit),
+            ).fetchall()
+        logger.info(f"从持久化缓存预热 {len(rows)} 个 embedding")
+        return [(key, np.frombuffer(vector, dtype="<f4")) for key, vector in rows]
+
+    def _flush_touches(self) -> None:
+        if not self._pending_touches:
+            return
+        self._conn.executemany(
+            "UPDATE embedding_cache SET hits = hits + 1, last_access = ? "
+            "WHERE cache_key = ? AND model = ?",
+            [(ts, key, self.model) for key, ts in self._pending_touches.items()],
+        )
+        self._pending_touches.clear()
+
+    def _compact(self) -> None:
+        """超过容量时删除最久未访问的条目，保留 90%"""
+        self._flush_touches()
+        count = self._conn.execute(
+            "SELECT COUNT(*) FROM embedding_cache WHERE model = ?", (self.model,)
+        ).fetchone()[0]
+        if count <= self.max_rows:
+            return
+        remove = count - int(self.max_rows * 0.9)
+        self._conn.execute(
+            "DELETE FROM embedding_cache WHERE rowid IN ("
+            "SELECT rowid FROM embedding_cache WHERE model = ? ORDER BY last_access LIMIT ?)",
+            (self.model, remove),
+        )
+        self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.compactions += 1
+        logger.info(f"持久化 embedding 缓存压缩完成，删除 {remove} 条")
+
+    def compact(self) -> None:
+        with self._lock:
+            self._compact()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pending_touches.clear()
+            self._conn.execute("DELETE FROM embedding_cache WHERE model = ?", (self.model,))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            count = self._conn.execute(
+                "SELECT COUNT(*) FROM embedding_cache WHERE model = ?", (self.model,)
+            ).fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "model": self.model,
+            "size": count,
+            "max_rows": self.max_rows,
+            "file_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "compactions": self.compactions,
+        }
@@ -0,0 +1,298 @@
+"""
+按 token 预算组装提示词
+    - TokenCounter：优先使用 tiktoken 的模型编码精确计数和截断；编码文件不可用（离线部署）时
+      退回按字符类别估算（中文每字约 1.3 个 token，英文单词约每 4 个字符 1 个 token），估算偏保守
+    - PromptAssembler：系统提示词、模板骨架必须完整保留，用户问题只在单独就超出预算时截断，
+      剩余预算按比例分给参考资料、用户档案、饮食记录、会话摘要与最近对话；某一部分用不完的额度分给其他部分
+      列表类内容（检索到的段落）按排名整条放入，放不下的一条在剩余额度足够时截断，否则丢弃
+    - PromptUsageStats：累计每次请求各部分的 token 数以及截断、丢弃次数
+"""
+
+import logging
+import math
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Union
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 预算不足以放入这么多 token 时不截断段落，直接丢弃
+MIN_TRIM_TOKENS = 48
+# 截断处追加的标记
+TRUNCATION_MARK = "…"
+# 列表内容的分隔符
+PASSAGE_SEPARATOR = "\n\n"
+# 各可伸缩部分分配剩余预算的比例
+DEFAULT_SHARES = {
+    "passages": 0.5,
+    "profile": 0.2,
+    "history": 0.3,
+    "summary": 0.1,
+    "conversation": 0.3,
+}
+
+_CJK_RANGES = "\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef"
+_CJK_PATTERN = re.compile(f"[{_CJK_RANGES}]")
+_WORD_PATTERN = re.compile(r"[A-Za-z0-9_]+")
+_SYMBOL_PATTERN = re.compile(f"[^\\sA-Za-z0-9_{_CJK_RANGES}]")
+
+
+def estimate_tokens(text: str) -> int:
+    """不依赖编码文件的 token 估算"""
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    words = sum(math.ceil(len(word) / 4) for word in _WORD_PATTERN.findall(text))
+    symbols = len(_SYMBOL_PATTERN.findall(text))
+    return math.ceil(cjk * 1.3) + words + symbols
+
+
+class TokenCounter:
+    """按模型计数与截断 token"""
+
+    _encodings: Dict[str, object] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, model: Optional[str] = None):
+        self.model = model or settings.OPENAI_MODEL
+        self.encoding = self._load_encoding(self.model)
+
+    @property
+    def exact(self) -> bool:
+        return self.encoding is not None
+
+    @classmethod
+    def _load_encoding(cls, model: str):
+        """每个模型只尝试加载一次编码，失败（如离线无法下载编码文件）后一直使用估算"""
+        with cls._lock:
+            if model not in cls._encodings:
+                encoding = None
+                if settings.AI_TOKENIZER == "tiktoken":
+                    try:
+                        import tiktoken
+                        try:
+                            encoding = tiktoken.encoding_for_model(model)
+                        except KeyError:
+                            encoding = tiktoken.get_encoding("cl100k_base")
+                    except Exception as e:
+                        logger.warning(f"加载 {model} 的 tiktoken 编码失败，改用估算计数: {str(e)}")
+                cls._encodings[model] = encoding
+            return cls._encodings[model]
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return estimate_tokens(text)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """截断到不超过 max_tokens 个 token（含截断标记）"""
+        if max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+        limit = max_tokens - self.count(TRUNCATION_MARK)
+        if limit <= 0:
+            return ""
+        if self.encoding is not None:
+            tokens = self.encoding.encode(text, disallowed_special=())
+            # 截断处可能落在多字节字符中间，解码时去掉不完整的字符
+            return self.encoding.decode(tokens[:limit]).rstrip("�") + TRUNCATION_MARK
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if estimate_tokens(text[:middle]) <= limit:
+                low = middle
+            else:
+                high = middle - 1
+        return text[:low] + TRUNCATION_MARK
+
+
+@dataclass
+class AssembledPrompt:
+    """组装结果：每部分最终的文本与 token 数"""
+    sections: Dict[str, str]
+    usage: Dict[str, int]
+    budget: int
+    dropped: Dict[str, int] = field(default_factory=dict)
+    truncated: List[str] = field(default_factory=list)
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(self.usage.values())
+
+
+class PromptAssembler:
+    """在 token 预算内组装提示词的各个部分"""
+
+    def __init__(
+        self,
+        max_tokens: Optional[int] = None,
+        counter: Optional[TokenCounter] = None,
+        shares: Optional[Dict[str, float]] = None,
+    ):
+        self.counter = counter or TokenCounter()
+        self.max_tokens = max_tokens or prompt_token_budget()
+        self.shares = shares or DEFAULT_SHARES
+
+    def assemble(
+        self,
+        fixed: Dict[str, str],
+        required: Optional[Dict[str, str]] = None,
+        flexible: Optional[Dict[str, Union[str, Sequence[str]]]] = None,
+        keep_latest: Sequence[str] = (),
+    ) -> AssembledPrompt:
+        """
+        fixed 完整保留；required 按顺序放入，只在超出剩余预算时截断；
+        flexible 按 shares 比例分配剩余预算，值为列表时按条放入，字符串时整体截断；
+        keep_latest 中的列表（如对话轮次）从末尾开始放入，预算不足时丢弃最早的条目
+        """
+        result = AssembledPrompt(sections={}, usage={}, budget=self.max_tokens)
+        remaining = self.max_tokens
+        for name, text in fixed.items():
+            result.sections[name] = text
+            result.usage[name] = self.counter.count(text)
+            remaining -= result.usage[name]
+
+        for name, text in (required or {}).items():
+            tokens = self.counter.count(text)
+            if tokens > max(remaining, 0):
+                text = self.counter.truncate(text, max(remaining, 0))
+                tokens = self.counter.count(text)
+                result.truncated.append(name)
+                logger.warning(f"提示词中的 {name} 超出预算，已截断到 {tokens} 个 token")
+            result.sections[name] = text
+            result.usage[name] = tokens
+            remaining -= tokens
+
+        flexible = {name: value for name, value in (flexible or {}).items() if value}
+        demands = {name: self._demand(value) for name, value in flexible.items()}
+        allocations = self._allocate(demands, max(remaining, 0))
+        for name, value in flexible.items():
+            if isinstance(value, str):
+                text = value
+                if demands[name] > allocations[name]:
+                    text = self.counter.truncate(value, allocations[name])
+                    result.truncated.append(name)
+            else:
+                latest = name in keep_latest
+                kept, dropped, trimmed = self._fit_items(value[::-1] if latest else value, allocations[name])
+                text = PASSAGE_SEPARATOR.join(kept[::-1] if latest else kept)
+                if dropped:
+                    result.dropped[name] = dropped
+                if trimmed:
+                    result.truncated.append(name)
+            result.sections[name] = text
+            result.usage[name] = self.counter.count(text)
+        return result
+
+    def _demand(self, value: Union[str, Sequence[str]]) -> int:
+        if isinstance(value, str):
+            return self.counter.count(value)
+        return self.counter.count(PASSAGE_SEPARATOR.join(value))
+
+    def _allocate(self, demands: Dict[str, int], available: int) -> Dict[str, int]:
+        """按比例分配预算，需求小于份额的部分按需求满足，省下的额度再按比例分给其余部分"""
+        allocations = {}
+        pending = dict(demands)
+        while pending:
+            total_share = sum(self.shares.get(name, 0.1) for name in pending)
+            quota = {name: available * self.shares.get(name, 0.1) / total_share for name in pending}
+            satisfied = [name for name in pending if pending[name] <= quota[name]]
+            if not satisfied:
+                allocations.update({name: int(quota[name]) for name in pending})
+                break
+            for name in satisfied:
+                allocations[name] = pending.pop(name)
+                available -= allocations[name]
+        return allocations
+
+    def _fit_items(self, items: Sequence[str], budget: int):
+        """按顺序整条放入，返回 (保留的条目, 丢弃条数, 是否截断了某一条)"""
+        kept, used, trimmed = [], 0, False
+        separator = self.counter.count(PASSAGE_SEPARATOR)
+        for index, item in enumerate(items):
+            cost = self.counter.count(item) + (separator if kept else 0)
+            if used + cost <= budget:
+                kept.append(item)
+                used += cost
+                continue
+            left = budget - used - (separator if kept else 0)
+            if left >= MIN_TRIM_TOKENS:
+                kept.append(self.counter.truncate(item, left))
+                trimmed = True
+                index += 1
+            return kept, len(items) - index, trimmed
+        return kept, 0, trimmed
+
+
+class PromptUsageStats:
+    """累计提示词 token 使用情况"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.max_prompt_tokens = 0
+        self.section_tokens: Dict[str, int] = {}
+        self.truncated_requests = 0
+        self.dropped_items: Dict[str, int] = {}
+        self.completion_tokens = 0
+        self.completions_reported = 0
+
+    def record(self, prompt: AssembledPrompt) -> None:
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += prompt.total_tokens
+            self.max_prompt_tokens = max(self.max_prompt_tokens, prompt.total_tokens)
+            for name, tokens in prompt.usage.items():
+                self.section_tokens[name] = self.section_tokens.get(name, 0) + tokens
+            self.truncated_requests += bool(prompt.truncated or prompt.dropped)
+            for name, dropped in prompt.dropped.items():
+                self.dropped_items[name] = self.dropped_items.get(name, 0) + dropped
+
+    def record_completion(self, usage) -> None:
+        """记录上游返回的实际用量（response.usage）"""
+        completion = getattr(usage, "completion_tokens", None)
+        if completion is None:
+            return
+        with self._lock:
+            self.completion_tokens += completion
+            self.completions_reported += 1
+
+    def stats(self) -> Dict:
+        requests = self.requests or 1
+        return {
+            "requests": self.requests,
+            "avg_prompt_tokens": round(self.prompt_tokens / requests, 1),
+            "max_prompt_tokens": self.max_prompt_tokens,
+            "avg_section_tokens": {name: round(tokens / requests, 1) for name, tokens in self.section_tokens.items()},
+            "truncated_requests": self.truncated_requests,
+            "dropped_items": dict(self.dropped_items),
+            "avg_completion_tokens": (
+                round(self.completion_tokens / self.completions_reported, 1) if self.completions_reported else None
+            ),
+        }
+
+
+def prompt_token_budget() -> int:
+    """提示词可用的 token 数：上下文窗口扣除回答长度，且不超过 AI_PROMPT_MAX_TOKENS"""
+    return min(settings.AI_PROMPT_MAX_TOKENS, settings.AI_CONTEXT_WINDOW - settings.AI_MAX_COMPLETION_TOKENS)
+
+
+# 按提示词类型（通用对话 chat / 个性化咨询 agent）分别统计用量
+_usage_stats: Dict[str, PromptUsageStats] = {}
+
+
+def get_prompt_usage(kind: str) -> PromptUsageStats:
+    if kind not in _usage_stats:
+        _usage_stats[kind] = PromptUsageStats()
+    return _usage_stats[kind]
+
+
+def prompt_usage_stats() -> Dict:
+    return {kind: usage.stats() for kind, usage in _usage_stats.items()}
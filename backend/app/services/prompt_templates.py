@@ -0,0 +1,162 @@
+"""
+提示词模板注册表
+模板在导入时编译一次：去掉代码缩进和行尾空白（缩进空格同样计入 token），
+并预先拆分为字面量与占位符片段，渲染时直接拼接，不再逐次解析 f-string
+占位符只支持 {name} 形式，不支持格式说明符
+"""
+
+import textwrap
+from string import Formatter
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+
+class PromptTemplate:
+    """编译后的提示词模板"""
+
+    def __init__(self, name: str, text: str):
+        self.name = name
+        lines = textwrap.dedent(text).strip().splitlines()
+        self.text = "\n".join(line.rstrip() for line in lines)
+        self._parts: List[Tuple[str, Optional[str]]] = []
+        for literal, field, spec, conversion in Formatter().parse(self.text):
+            if spec or conversion:
+                raise ValueError(f"模板 {name} 的占位符 {field} 不支持格式说明符")
+            self._parts.append((literal, field))
+        self.fields: FrozenSet[str] = frozenset(field for _, field in self._parts if field)
+
+    def render(self, **values) -> str:
+        missing = self.fields - values.keys()
+        if missing:
+            raise KeyError(f"模板 {self.name} 缺少字段: {sorted(missing)}")
+        return "".join(
+            literal + (str(values[field]) if field else "")
+            for literal, field in self._parts
+        )
+
+
+_templates: Dict[str, PromptTemplate] = {}
+
+
+def register_template(name: str, text: str) -> PromptTemplate:
+    """编译并注册模板，同名模板会被替换"""
+    template = PromptTemplate(name, text)
+    _templates[name] = template
+    return template
+
+
+def get_template(name: str) -> PromptTemplate:
+    return _templates[name]
+
+
+register_template("system", """
+    你是一个专业的健康助手。请基于提供的参考信息来回答用户的问题。
+    如果参考信息不足以完整回答问题，可以补充其他相关的专业知识。
+
+    注意事项：
+    1. 优先使用参考信息中的内容
+    2. 确保回答准确专业
+    3. 使用通俗易懂的语言
+    4. 给出具体、可执行的建议
+    5. 不要提供医疗诊断或治疗建议
+""")
+
+register_template("chat", """
+    参考以下信息：
+
+    {context}
+
+    用户问题：{message}
+
+    请根据以上参考信息和你的专业知识，给出合适的回答。
+""")
+
+register_template("diet", """
+    参考知识：
+    {context}
+
+    用户信息：
+    - 年龄：{age}
+    - 身高：{height}
+    - 体重：{weight}
+    - BMI：{bmi}
+    - 近期记录：{recent_records}
+
+    饮食记录：
+    {diet_records}
+
+    用户问题：{message}
+
+    请基于以上信息进行分析并给出个性化的饮食建议。
+""")
+
+register_template("exercise", """
+    参考知识：
+    {context}
+
+    用户基础信息：
+    - 年龄：{age}
+    - 身高：{height}
+    - 体重：{weight}
+    - BMI：{bmi}
+    - 运动目标：{message}
+    - 运动禁忌：{exercise_contraindications}
+    - 近期记录：{recent_records}
+
+    请基于以上信息制定安全、科学、个性化的运动计划。
+""")
+
+register_template("sleep", """
+    参考知识：
+    {context}
+
+    用户睡眠情况：
+    - 平均睡眠时间：{avg_sleep_hours}
+    - 入睡困难：{sleep_issues}
+    - 作息时间：{sleep_schedule}
+    - 近期记录：{recent_records}
+
+    用户问题：{message}
+
+    请基于以上信息提供个性化的睡眠改善建议。
+""")
+
+register_template("knowledge", """
+    参考知识：
+    {context}
+
+    用户问题：{message}
+
+    请基于参考知识和专业见解回答用户问题。如果信息不足，可以补充其他相关的专业知识。
+""")
+
+register_template("general", """
+    参考知识：
+    {context}
+
+    用户问题：{message}
+
+    请提供专业、准确的回答。注意：
+    1. 不要给出医疗诊断
+    2. 对于需要就医的情况，建议用户及时就医
+    3. 保持答复的科学性和可操作性
+""")
+
+register_template("conversation", """
+    此前对话摘要：
+    {summary}
+
+    最近对话：
+    {history}
+""")
+
+register_template("summarize", """
+    下面是用户与健康助手此前的对话摘要，以及之后新的几轮对话。
+    请把它们合并成一段新的摘要：保留用户提到的健康状况、目标、偏好和限制，以及助手给出的关键建议，
+    省略寒暄和重复内容，不超过 200 字，只输出摘要。
+
+    已有摘要：
+    {summary}
+
+    新的对话：
+    {turns}
+""")
@@ -0,0 +1,290 @@
+"""
+检索基准测试
+索引层：在 1k ~ 1M 的合成向量上比较各索引后端的 recall@k、MRR、构建耗时、内存，以及并发查询下的 p50/p95/p99 延迟；
+服务层：用带主题标注的查询集并发调用 RAGService / OptimizedRAGService，
+recall@k 以同一批 embedding 的精确检索为基准，MRR 按第一个主题匹配结果的排名计算
+所有结果都是可以直接 json.dumps 的字典，便于不同服务、不同索引之间横向比较
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import engine
+from app.services.vector_dedup import load_vectors
+from app.services.vector_index import ExactIndex, create_vector_index
+from app.services.vector_matrix import normalize_rows
+
+logger = logging.getLogger(__name__)
+
+# 带主题标注的查询集，主题与知识库条目的 source / topic 一致
+LABELED_QUERIES = [
+    {"query": "什么是健康饮食？", "topic": "营养与饮食"},
+    {"query": "每天应该吃多少蛋白质", "topic": "营养与饮食"},
+    {"query": "如何保持良好的睡眠？", "topic": "睡眠质量"},
+    {"query": "晚上失眠睡不着怎么办", "topic": "睡眠质量"},
+    {"query": "运动对健康有什么好处？", "topic": "运动健身"},
+    {"query": "每周应该做多少有氧运动", "topic": "运动健身"},
+    {"query": "怎样管理压力？", "topic": "心理健康"},
+    {"query": "焦虑的时候如何放松", "topic": "心理健康"},
+    {"query": "定期体检的重要性", "topic": "疾病预防"},
+    {"query": "怎样预防流感和传染病", "topic": "疾病预防"},
+    {"query": "高血压患者日常要注意什么", "topic": "慢性病管理"},
+    {"query": "糖尿病如何控制血糖", "topic": "慢性病管理"},
+]
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+# 合成向量分块生成，1M 规模时也不会产生多份全量临时数组
+SYNTHETIC_BLOCK_ROWS = 65536
+
+
+def latency_summary(latencies: Sequence[float]) -> Dict:
+    """延迟分位数（毫秒）"""
+    if not latencies:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    values = np.asarray(latencies, dtype=np.float64) * 1000
+    return {
+        "p50": round(float(np.percentile(values, 50)), 3),
+        "p95": round(float(np.percentile(values, 95)), 3),
+        "p99": round(float(np.percentile(values, 99)), 3),
+        "mean": round(float(values.mean()), 3),
+        "max": round(float(values.max()), 3),
+    }
+
+
+def performance_rating(p95_seconds: float) -> str:
+    """按 p95 延迟评级"""
+    if p95_seconds < 0.1:
+        return "excellent"
+    if p95_seconds < 0.5:
+        return "good"
+    return "needs_improvement"
+
+
+def ranking_metrics(found: Sequence[Sequence[int]], expected: Sequence[Sequence[int]], k: int) -> Dict:
+    """
+    recall@k：前 k 个结果与精确检索前 k 个的交集比例；
+    MRR：精确检索第一名在结果中的排名倒数
+    """
+    recalls, reciprocal_ranks = [], []
+    for got, truth in zip(found, expected):
+        truth = list(truth)[:k]
+        if not truth:
+            continue
+        got = [int(vid) for vid in list(got)[:k]]
+        recalls.append(len(set(got) & set(truth)) / len(truth))
+        reciprocal_ranks.append(1.0 / (got.index(truth[0]) + 1) if truth[0] in got else 0.0)
+    return {
+        "recall_at_k": round(float(np.mean(recalls)), 4) if recalls else None,
+        "mrr": round(float(np.mean(reciprocal_ranks)), 4) if reciprocal_ranks else None,
+    }
+
+
+def synthetic_corpus(n: int, dim: int = 128, clusters: Optional[int] = None, seed: int = 0):
+    """生成带簇结构的合成向量 (ids, vectors)，比均匀随机向量更接近真实 embedding 的分布"""
+    rng = np.random.default_rng(seed)
+    clusters = clusters or max(16, int(np.sqrt(n)))
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, SYNTHETIC_BLOCK_ROWS):
+        end = min(n, start + SYNTHETIC_BLOCK_ROWS)
+        labels = rng.integers(0, clusters, end - start)
+        vectors[start:end] = centers[labels] + rng.normal(0, 0.5, (end - start, dim)).astype(np.float32)
+    return np.arange(n, dtype=np.int64), vectors
+
+
+def synthetic_queries(vectors: np.ndarray, count: int, noise: float = 0.1, seed: int = 1) -> np.ndarray:
+    """在语料向量上叠加噪声作为查询"""
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(vectors.shape[0], min(count, vectors.shape[0]), replace=False)
+    return vectors[rows] + rng.normal(0, noise, (len(rows), vectors.shape[1])).astype(np.float32)
+
+
+def run_concurrent(fn: Callable, inputs: Sequence, concurrency: int):
+    """在线程池中并发执行 fn，返回 (结果列表, 每次调用的耗时, 总耗时)"""
+    latencies = [0.0] * len(inputs)
+
+    def timed(i):
+        start = time.perf_counter()
+        result = fn(inputs[i])
+        latencies[i] = time.perf_counter() - start
+        return result
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        results = list(pool.map(timed, range(len(inputs))))
+    return results, latencies, time.perf_counter() - start
+
+
+def benchmark_index(
+    index_type: str,
+    reference: ExactIndex,
+    queries: np.ndarray,
+    expected: List[List[int]],
+    k: int = 10,
+    concurrency: int = 4,
+    params: Optional[Dict] = None,
+) -> Dict:
+    """构建一种索引并统计召回质量、构建耗时、内存与并发延迟"""
+    if index_type == ExactIndex.index_type:
+        index, build_seconds = reference, 0.0
+    else:
+        index = create_vector_index(index_type, dimension=reference.dimension, **(params or {}))
+        start = time.perf_counter()
+        index.build(reference.ids, reference.matrix)
+        build_seconds = time.perf_counter() - start
+
+    found, latencies, wall = run_concurrent(lambda query: index.search(query, k)[0].tolist(), queries, concurrency)
+    return {
+        "index_type": index_type,
+        "size": len(index),
+        "k": k,
+        "queries": len(queries),
+        "concurrency": concurrency,
+        **ranking_metrics(found, expected, k),
+        "latency_ms": latency_summary(latencies),
+        "qps": round(len(queries) / wall, 1) if wall > 0 else None,
+        "build_seconds": round(build_seconds, 3),
+        "bytes": index.nbytes,
+        "bytes_per_vector": round(index.nbytes / len(index), 1) if len(index) else 0.0,
+    }
+
+
+def benchmark_indexes(
+    sizes: Sequence[int] = DEFAULT_SIZES,
+    index_types: Sequence[str] = ("exact", "int8", "pq"),
+    dim: int = 128,
+    query_count: int = 100,
+    k: int = 10,
+    concurrency: int = 4,
+    index_params: Optional[Dict[str, Dict]] = None,
+    seed: int = 0,
+) -> Dict:
+    """在每个语料规模上用同一批查询比较各索引后端"""
+    index_params = index_params or {}
+    runs = []
+    for size in sizes:
+        ids, vectors = synthetic_corpus(size, dim, seed=seed)
+        reference = ExactIndex.from_matrix(ids, normalize_rows(vectors))
+        del vectors
+        queries = synthetic_queries(reference.matrix, query_count, seed=seed + 1)
+        expected = [reference.search(query, k)[0].tolist() for query in queries]
+        for index_type in index_types:
+            try:
+                report = benchmark_index(
+                    index_type, reference, queries, expected, k, concurrency, index_params.get(index_type)
+                )
+            except Exception as e:
+                logger.error(f"索引 {index_type} 基准测试失败（{size} 个向量）: {str(e)}")
+                report = {"index_type": index_type, "size": size, "error": str(e)}
+            runs.append(report)
+            logger.info(f"{index_type} @ {size}: {report}")
+    return {
+        "kind": "index",
+        "dimension": dim,
+        "sizes": list(sizes),
+        "k": k,
+        "concurrency": concurrency,
+        "results": runs,
+    }
+
+
+async def exact_reference(service, queries: Sequence[str], k: int) -> Optional[List[List[int]]]:
+    """用服务自身的 embedding 模型编码查询，在数据库全部向量上做精确检索作为基准"""
+    embeddings = getattr(service, "embeddings", None)
+    if embeddings is None:
+        return None
+
+    def load():
+        with Session(engine) as session:
+            return load_vectors(session)
+
+    ids, vectors, _ = await asyncio.to_thread(load)
+    if not ids:
+        return None
+    reference = ExactIndex.from_matrix(np.asarray(ids, dtype=np.int64), normalize_rows(vectors))
+    query_vectors = await embeddings.aembed_documents(list(queries))
+    return [reference.search(np.asarray(vector), k)[0].tolist() for vector in query_vectors]
+
+
+async def benchmark_service(
+    service,
+    queries: Sequence[Dict] = LABELED_QUERIES,
+    k: int = 5,
+    concurrency: int = 4,
+    with_reference: bool = True,
+) -> Dict:
+    """
+    并发执行标注查询集，统计延迟分位数、吞吐、主题命中率与 MRR，
+    with_reference 时另外统计相对精确向量检索的 recall@k
+    返回结构兼容原 /rag/benchmark 的字段（total_queries / average_time / results / performance_rating）
+    """
+    search = getattr(service, "search_similar_fast", None) or service.search_similar
+    # 预热：首个查询会触发向量缓存加载，不计入延迟
+    warmup_start = time.perf_counter()
+    await search(queries[0]["query"], k)
+    warmup_seconds = time.perf_counter() - warmup_start
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(item):
+        async with semaphore:
+            start = time.perf_counter()
+            results = await search(item["query"], k)
+            return results, time.perf_counter() - start
+
+    wall_start = time.perf_counter()
+    outcomes = await asyncio.gather(*(run(item) for item in queries))
+    wall = time.perf_counter() - wall_start
+
+    details, latencies, reciprocal_ranks, hits = [], [], [], 0
+    for item, (results, duration) in zip(queries, outcomes):
+        latencies.append(duration)
+        topics = [result.get("source") for result in results]
+        rank = topics.index(item["topic"]) + 1 if item.get("topic") in topics else None
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+        hits += rank is not None
+        details.append({
+            "query": item["query"],
+            "topic": item.get("topic"),
+            "duration": duration,
+            "result_count": len(results),
+            "first_relevant_rank": rank,
+            "results": results,
+        })
+
+    recall = None
+    if with_reference:
+        try:
+            expected = await exact_reference(service, [item["query"] for item in queries], k)
+            if expected is not None:
+                found = [[result["id"] for result in detail["results"] if "id" in result] for detail in details]
+                recall = ranking_metrics(found, expected, k)["recall_at_k"]
+        except Exception as e:
+            logger.warning(f"精确检索基准计算失败，跳过 recall@k: {str(e)}")
+
+    summary = latency_summary(latencies)
+    return {
+        "kind": "service",
+        "service_type": type(service).__name__,
+        "vector_index": settings.RAG_VECTOR_INDEX,
+        "k": k,
+        "concurrency": concurrency,
+        "total_queries": len(queries),
+        "total_time": wall,
+        "average_time": float(np.mean(latencies)) if latencies else 0.0,
+        "warmup_seconds": round(warmup_seconds, 3),
+        "latency_ms": summary,
+        "qps": round(len(queries) / wall, 1) if wall > 0 else None,
+        "recall_at_k": recall,
+        "topic_mrr": round(float(np.mean(reciprocal_ranks)), 4) if reciprocal_ranks else None,
+        "topic_hit_rate": round(hits / len(queries), 4) if queries else None,
+        "performance_rating": performance_rating((summary["p95"] or 0) / 1000),
+        "results": details,
+    }
@@ -6,23 +6,59 @@ RAG服务工厂
 from app.core.config import settings
 from app.services.rag_service import RAGService
 from app.services.rag_service_optimized import OptimizedRAGService
+from app.services.vector_index import VectorIndex, META_FILENAME, create_vector_index
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
 class RAGFactory:
     """RAG服务工厂类"""
     
+    @staticmethod
+    def create_vector_index() -> VectorIndex:
+        """根据配置创建向量索引，配置了持久化目录时优先从磁盘加载"""
+        index_path = settings.RAG_INDEX_PATH
+        if index_path and os.path.exists(os.path.join(index_path, META_FILENAME)):
+            try:
+                index = VectorIndex.load(index_path)
+                if index.index_type == settings.RAG_VECTOR_INDEX:
+                    return index
+                logger.info(f"磁盘索引类型 {index.index_type} 与配置不一致，重新构建")
+            except Exception as e:
+                logger.warning(f"加载向量索引失败，重新构建: {str(e)}")
+        
+        params = {
+            "hnsw": {
+                "m": settings.RAG_HNSW_M,
+                "ef_construction": settings.RAG_HNSW_EF_CONSTRUCTION,
+                "ef_search": settings.RAG_HNSW_EF_SEARCH,
+            },
+            "ivfpq": {
+                "nlist": settings.RAG_IVF_NLIST,
+                "nprobe": settings.RAG_IVF_NPROBE,
+                "pq_m": settings.RAG_PQ_M,
+                "pq_nbits": settings.RAG_PQ_NBITS,
+            },
+            "pq": {
+                "pq_m": settings.RAG_PQ_M,
+                "pq_nbits": settings.RAG_PQ_NBITS,
+            },
+        }.get(settings.RAG_VECTOR_INDEX, {})
+        return create_vector_index(settings.RAG_VECTOR_INDEX, **params)
+    
     @staticmethod
     def create_rag_service():
         """创建RAG服务实例"""
+        vector_index = RAGFactory.create_vector_index()
+        logger.info(f"向量索引类型: {vector_index.index_type}")
         
         if settings.RAG_USE_OPTIMIZED:
             logger.info("使用优化的RAG服务")
-            return OptimizedRAGService()
+            return OptimizedRAGService(vector_index=vector_index)
         else:
             logger.info("使用标准RAG服务")
-            return RAGService()
+            return RAGService(vector_index=vector_index)
     
     @staticmethod
     def get_performance_info():
@@ -38,7 +74,8 @@ class RAGFactory:
                 ],
                 "cache_ttl": settings.RAG_CACHE_TTL,
                 "keyword_search": settings.RAG_ENABLE_KEYWORD_SEARCH,
-                "cache_size": settings.RAG_EMBEDDING_CACHE_SIZE
+                "cache_size": settings.RAG_EMBEDDING_CACHE_SIZE,
+                "vector_index": settings.RAG_VECTOR_INDEX
             }
         else:
             return {
@@ -49,7 +86,8 @@ class RAGFactory:
                 ],
                 "cache_ttl": 0,
                 "keyword_search": False,
-                "cache_size": 0
+                "cache_size": 0,
+                "vector_index": settings.RAG_VECTOR_INDEX
             }
 
 # 全局RAG服务实例
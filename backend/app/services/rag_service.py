@@ -1,81 +1,349 @@
-from langchain_openai import OpenAIEmbeddings
 from app.core.config import settings
+from app.services.embedding_provider import create_embeddings
 from app.models.vector_store import VectorStore
 from sqlalchemy.orm import Session
 from app.db.session import engine
+from app.services.knowledge_ingestion import content_hash, prepare_documents
+from app.services.llm_admission import PRIORITY_DEFAULT, embedding_slot
+from app.services.metadata_filter import MetadataFilterIndex, matches_filters, normalize_filters
+from app.services.embedding_codec import embedding_columns, json_fallback_column, load_embedding
+from app.services.vector_index import ExactIndex, VectorIndex, evaluate_index
+from app.services.vector_matrix import COMPACT_RATIO, mmr_rerank, normalize_rows, normalize_vector, top_k_indices
 import numpy as np
 import json
 import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
 
 logger = logging.getLogger(__name__)
 
+# 过滤后允许的 id 不超过召回数的该倍数时直接重排全部允许的行，否则每轮按该倍数放大索引召回数量
+PREFILTER_FACTOR = 4
+
 class RAGService:
-    def __init__(self):
-        # 修复 API URL
-        base_url = settings.OPENAI_BASE_URL.rstrip('/')
-        if not base_url.endswith('/v1'):
-            base_url = f"{base_url}/v1"
-            
-        logger.info(f"初始化 RAG 服务，使用 API URL: {base_url}")
+    def __init__(self, vector_index: Optional[VectorIndex] = None):
+        logger.info(f"初始化RAG 服务，embedding 提供方: {settings.RAG_EMBEDDING_PROVIDER}")
+        self.embeddings = create_embeddings()
         
-        self.embeddings = OpenAIEmbeddings(
-            openai_api_key=settings.OPENAI_API_KEY,
-            openai_api_base=base_url,  # 这里使用已经处理好的 base_url
-            model="text-embedding-ada-002"
-        )
+        # 配置了索引时，首次搜索从数据库构建，之后每个 RAG_CACHE_TTL 只按 updated_at 高水位拉取增量
+        self.vector_index = vector_index
+        self._index_ready = False
+        self._index_checked_at = 0.0
+        self._high_water_mark: Optional[datetime] = None
+        # 已加入索引的 id -> updated_at，用于识别修改过的行
+        self._indexed: Dict[int, Optional[datetime]] = {}
+        # 索引中已删除或已被新版本替换的条目数，过多时整体重建
+        self._index_stale = 0
+        # source / topic / tags 倒排表，随索引同步，过滤检索时先得到允许的 id
+        self._filter_index = MetadataFilterIndex()
+        # 知识库内容版本，存储/删除向量后递增，语义回答缓存据此失效
+        self.knowledge_version = 0
 
-    async def store_vector(self, content: str, source: str = None):
-        """存储向量到数据库"""
+    async def embed_query(self, text: str) -> np.ndarray:
+        """查询文本的 embedding"""
+        async with embedding_slot():
+            return np.array(await self.embeddings.aembed_query(text))
+
+    async def store_vector(self, content: str, source: str = None, meta_info: Optional[Dict] = None):
+        """存储向量到数据库，长文档切分为片段分别存储"""
         try:
+            documents = prepare_documents([{"content": content, "source": source, "meta_info": meta_info}])
+            
             # 生成文本的向量表示
-            embedding = await self.embeddings.aembed_query(content)
+            async with embedding_slot(PRIORITY_DEFAULT):
+                if len(documents) == 1:
+                    embeddings = [await self.embeddings.aembed_query(content)]
+                else:
+                    embeddings = await self.embeddings.aembed_documents([doc["content"] for doc in documents])
             
             # 存储到向量数据库
             with Session(engine) as session:
-                vector_store = VectorStore(
-                    content=content,
-                    embedding=json.dumps(embedding),
-                    source=source
-                )
-                session.add(vector_store)
+                rows = [
+                    VectorStore(
+                        content=doc["content"],
+                        content_hash=content_hash(doc["content"]),
+                        source=source,
+                        meta_info=json.dumps(doc["meta_info"], ensure_ascii=False) if doc["meta_info"] else None,
+                        **embedding_columns(embedding)
+                    )
+                    for doc, embedding in zip(documents, embeddings)
+                ]
+                session.add_all(rows)
                 session.commit()
-                logger.info(f"成功存储向量: {content[:50]}...")
+                logger.info(f"成功存储向量（{len(rows)} 个片段）: {content[:50]}...")
+                
+                if self.vector_index is not None and self._index_ready:
+                    self.vector_index.add([row.id for row in rows], embeddings)
+                    self._indexed.update((row.id, row.updated_at) for row in rows)
+                    for row in rows:
+                        self._filter_index.add(row.id, row.source, row.meta_info)
+                self.knowledge_version += 1
                 return True
                 
         except Exception as e:
             logger.error(f"存储向量失败: {str(e)}")
             return False
 
-    async def search_similar(self, query: str, k: int = 2):
-        """搜索相似内容并返回结果"""
+    async def delete_vector(self, vector_id: int) -> bool:
+        """软删除向量，索引中的旧条目在检索时被过滤"""
+        try:
+            with Session(engine) as session:
+                updated = session.query(VectorStore).filter(
+                    VectorStore.id == vector_id,
+                    VectorStore.is_deleted.is_(False)
+                ).update({VectorStore.is_deleted: True}, synchronize_session=False)
+                session.commit()
+            if updated:
+                self.knowledge_version += 1
+            return bool(updated)
+            
+        except Exception as e:
+            logger.error(f"删除向量失败: {str(e)}")
+            return False
+
+    @staticmethod
+    def _load_all_vectors(session: Session, since: Optional[datetime] = None):
+        """
+        读取数据库中未删除的向量，返回 (ids, embeddings, updated_at, [(source, meta_info)])；
+        给定 since 时只读取之后新增或修改的行
+        """
+        ids, embeddings, updated_at, metadata = [], [], [], []
+        query = session.query(
+            VectorStore.id, VectorStore.updated_at, VectorStore.source, VectorStore.meta_info,
+            VectorStore.embedding_bin, VectorStore.embedding_dtype, json_fallback_column()
+        ).filter(VectorStore.is_deleted.is_(False))
+        if since is not None:
+            query = query.filter(VectorStore.updated_at >= since)
+        for vec in query:
+            try:
+                embeddings.append(load_embedding(vec.embedding_bin, vec.embedding_dtype, vec.embedding))
+            except Exception as e:
+                logger.warning(f"跳过无效向量: {e}")
+                continue
+            ids.append(vec.id)
+            updated_at.append(vec.updated_at)
+            metadata.append((vec.source, vec.meta_info))
+        return ids, embeddings, updated_at, metadata
+
+    def _advance_high_water_mark(self, updated_at: List[Optional[datetime]]):
+        timestamps = [ts for ts in updated_at if ts is not None]
+        if timestamps and (self._high_water_mark is None or max(timestamps) > self._high_water_mark):
+            self._high_water_mark = max(timestamps)
+
+    def _ensure_index(self, session: Session):
+        """首次从数据库构建向量索引，之后每个 RAG_CACHE_TTL 按 updated_at 高水位增量同步"""
+        if self._index_ready and time.time() - self._index_checked_at < settings.RAG_CACHE_TTL:
+            return
+        
+        if not self._index_ready or self._high_water_mark is None:
+            self._build_index(session)
+        else:
+            self._refresh_index(session)
+        self._index_ready = True
+        self._index_checked_at = time.time()
+
+    def _build_index(self, session: Session):
+        """全量加载向量，与已加载（如从磁盘恢复）的索引不一致时重建"""
+        ids, embeddings, updated_at, metadata = self._load_all_vectors(session)
+        if len(self.vector_index) != len(ids) or set(self.vector_index.ids.tolist()) != set(ids):
+            self.vector_index.build(ids, embeddings)
+            logger.info(f"向量索引构建完成: {self.vector_index.index_type}, {len(ids)} 个向量")
+            if settings.RAG_INDEX_PATH:
+                self.vector_index.save(settings.RAG_INDEX_PATH)
+        self._indexed = dict(zip(ids, updated_at))
+        self._index_stale = 0
+        self._filter_index = MetadataFilterIndex()
+        for vid, (source, meta_info) in zip(ids, metadata):
+            self._filter_index.add(vid, source, meta_info)
+        self._high_water_mark = None
+        self._advance_high_water_mark(updated_at)
+
+    def _refresh_index(self, session: Session):
+        """
+        只拉取高水位之后新增或修改的行，以及同一时间窗口内的删除标记，回看一个重叠窗口防止漏掉晚提交的事务；
+        索引不支持删除，旧条目在检索时按数据库过滤，失效条目过多时整体重建
+        """
+        since = self._high_water_mark - timedelta(seconds=settings.RAG_CACHE_DELTA_OVERLAP)
+        ids, embeddings, updated_at, metadata = self._load_all_vectors(session, since)
+        tombstones = session.query(VectorStore.id, VectorStore.updated_at).filter(
+            VectorStore.updated_at >= since,
+            VectorStore.is_deleted.is_(True)
+        ).all()
+        
+        changed = [i for i, vid in enumerate(ids) if vid not in self._indexed or self._indexed[vid] != updated_at[i]]
+        stale = sum(1 for i in changed if ids[i] in self._indexed)
+        deleted = [vid for vid, _ in tombstones if vid in self._indexed]
+        for vid in deleted:
+            del self._indexed[vid]
+            self._filter_index.remove(vid)
+        stale += len(deleted)
+        self._index_stale += stale
+        self._advance_high_water_mark(updated_at + [ts for _, ts in tombstones])
+        if self._index_stale > COMPACT_RATIO * max(len(self.vector_index), 1) or self.vector_index.needs_rebuild():
+            logger.info(f"向量索引失效条目过多或规模已远超训练时的规模，重建 {self.vector_index.index_type} 索引")
+            self.vector_index.reset()
+            self._build_index(session)
+            return
+        if not changed:
+            return
+        self.vector_index.add([ids[i] for i in changed], [embeddings[i] for i in changed])
+        self._indexed.update((ids[i], updated_at[i]) for i in changed)
+        for i in changed:
+            self._filter_index.add(ids[i], *metadata[i])
+        logger.info(f"向量索引增量同步: 新增/更新 {len(changed)} 个，失效 {stale} 个")
+        if settings.RAG_INDEX_PATH:
+            self.vector_index.save(settings.RAG_INDEX_PATH)
+
+    async def search_similar(
+        self,
+        query: str,
+        k: int = 2,
+        filters: Optional[Dict] = None,
+        mmr_lambda: Optional[float] = None
+    ):
+        """
+        搜索相似内容并返回结果，filters 按 source / topic / tags 限制候选；
+        mmr_lambda 不为空（或配置默认开启）时对候选做 MMR 重排并去掉近似重复
+        """
+        filters = normalize_filters(filters)
+        if mmr_lambda is None and settings.RAG_MMR_ENABLED:
+            mmr_lambda = settings.RAG_MMR_LAMBDA
         try:
             # 1. 将输入文本转换为向量
-            query_embedding = np.array(await self.embeddings.aembed_query(query))
+            query_embedding = await self.embed_query(query)
+            
+            if self.vector_index is not None:
+                return self._search_with_index(query_embedding, k, filters, mmr_lambda)
             
             # 2. 在向量库中搜索相似内容
             with Session(engine) as session:
-                vectors = session.query(VectorStore).all()
+                vectors = session.query(VectorStore).filter(VectorStore.is_deleted.is_(False)).all()
                 similarities = []
                 
                 # 3. 计算相似度
                 for vec in vectors:
-                    stored_vector = np.array(json.loads(vec.embedding))
+                    if not matches_filters(vec.source, vec.meta_info, filters):
+                        continue
+                    stored_vector = load_embedding(vec.embedding_bin, vec.embedding_dtype, vec.embedding)
                     similarity = np.dot(query_embedding, stored_vector) / (
                         np.linalg.norm(query_embedding) * np.linalg.norm(stored_vector)
                     )
-                    similarities.append((vec, similarity))
+                    similarities.append((vec, similarity, stored_vector))
                 
                 # 4. 返回最相似的结果
                 similarities.sort(key=lambda x: x[1], reverse=True)
+                if mmr_lambda is not None:
+                    candidates = similarities[:k * settings.RAG_RESCORE_FACTOR]
+                    order = mmr_rerank(
+                        np.array([sim for _, sim, _ in candidates]),
+                        normalize_rows([stored for _, _, stored in candidates]),
+                        k, mmr_lambda, settings.RAG_DUPLICATE_THRESHOLD
+                    ) if candidates else []
+                    similarities = [candidates[i] for i in order]
                 return [
                     {
+                        "id": vec.id,
                         "content": vec.content,
                         "similarity": float(sim),
                         "source": vec.source
                     }
-                    for vec, sim in similarities[:k]
+                    for vec, sim, _ in similarities[:k]
                 ]
                 
         except Exception as e:
             logger.error(f"搜索失败: {str(e)}")
-            return []
\ No newline at end of file
+            return []
+
+    def _search_with_index(
+        self,
+        query_embedding: np.ndarray,
+        k: int,
+        filters: Optional[Dict] = None,
+        mmr_lambda: Optional[float] = None
+    ):
+        """
+        通过向量索引召回候选，再按 id 读取内容和全精度向量重新打分
+        量化索引只负责召回，内存中不需要保留全精度矩阵；过滤条件在召回前缩小候选集合
+        """
+        with Session(engine) as session:
+            self._ensure_index(session)
+            ids = self._recall_ids(query_embedding, k, filters)
+            if not ids:
+                return []
+            
+            rows = session.query(
+                VectorStore.id,
+                VectorStore.content,
+                VectorStore.source,
+                VectorStore.meta_info,
+                VectorStore.embedding_bin,
+                VectorStore.embedding_dtype,
+                json_fallback_column()
+            ).filter(
+                VectorStore.id.in_(ids),
+                VectorStore.is_deleted.is_(False)
+            ).all()
+        rows = [row for row in rows if matches_filters(row.source, row.meta_info, filters)]
+        if not rows:
+            return []
+        
+        query = normalize_vector(query_embedding)
+        matrix = normalize_rows([
+            load_embedding(row.embedding_bin, row.embedding_dtype, row.embedding) for row in rows
+        ])
+        scores = matrix @ query
+        if mmr_lambda is not None:
+            order = mmr_rerank(scores, matrix, k, mmr_lambda, settings.RAG_DUPLICATE_THRESHOLD)
+        else:
+            order = top_k_indices(scores, k)
+        return [
+            {
+                "id": rows[i].id,
+                "content": rows[i].content,
+                "similarity": float(scores[i]),
+                "source": rows[i].source
+            }
+            for i in order
+        ]
+
+    def _recall_ids(self, query_embedding: np.ndarray, k: int, filters: Optional[Dict] = None) -> List[int]:
+        """
+        召回待重排的候选 id，多取 RAG_RESCORE_FACTOR 倍抵消量化误差以及已删除条目被过滤的影响；
+        有过滤条件时先由倒排表得到允许的 id：数量不多时直接全部重排，
+        否则逐轮放大索引召回数量，直到过滤后的候选足够或已取遍索引
+        """
+        target = k * settings.RAG_RESCORE_FACTOR
+        if not filters:
+            ids, _ = self.vector_index.search(query_embedding, target)
+            return ids.tolist()
+        
+        allowed = self._filter_index.candidate_ids(filters)
+        if len(allowed) <= target * PREFILTER_FACTOR:
+            return list(allowed)
+        fetch = target
+        while True:
+            ids, _ = self.vector_index.search(query_embedding, fetch)
+            # 已更新的行在索引中可能有新旧两条，按 id 去重
+            hits = list(dict.fromkeys(vid for vid in ids.tolist() if vid in allowed))
+            if len(hits) >= target or fetch >= len(self.vector_index):
+                return hits[:target]
+            fetch *= PREFILTER_FACTOR
+
+    def get_index_report(self, sample_size: int = 50, k: int = 10) -> Dict:
+        """从数据库加载全部向量作为精确基准，评估当前索引的召回率与延迟"""
+        if self.vector_index is None:
+            return {"index_type": "none", "message": "未配置向量索引，每次查询全表扫描"}
+        
+        with Session(engine) as session:
+            self._ensure_index(session)
+            ids, embeddings, _, _ = self._load_all_vectors(session)
+        if not ids:
+            return {"index_type": self.vector_index.index_type, "size": 0, "message": "向量库为空"}
+        
+        reference = ExactIndex()
+        reference.add(ids, embeddings)
+        rng = np.random.default_rng()
+        rows = rng.choice(len(ids), min(sample_size, len(ids)), replace=False)
+        queries = reference.matrix[rows] + rng.normal(0, 0.01, (len(rows), reference.dimension)).astype(np.float32)
+        return evaluate_index(self.vector_index, reference, queries, k, settings.RAG_RESCORE_FACTOR)
@@ -1,247 +1,861 @@
-from langchain_openai import OpenAIEmbeddings
-from app.core.config import settings
+from app.core.config import BACKEND_DIR, settings
+from app.services.embedding_provider import create_embeddings, embedding_model_name
 from app.models.vector_store import VectorStore
 from sqlalchemy.orm import Session
 from app.db.session import engine
+from app.services.vector_matrix import COMPACT_RATIO, VectorMatrix, mmr_rerank
+from app.services.embedding_cache import EmbeddingCache, embedding_cache_key
+from app.services.persistent_embedding_cache import PersistentEmbeddingCache
+from app.services.keyword_index import KeywordIndex, parse_keywords
+from app.services.metadata_filter import MetadataFilterIndex, filter_key, normalize_filters
+from app.services.bm25_index import BM25Index, reciprocal_rank_fusion
+from app.services.knowledge_ingestion import content_hash, prepare_documents
+from app.services.text_chunking import collapse_chunks, parse_chunk_info
+from app.services.embedding_codec import embedding_columns, json_fallback_column, load_embedding
+from app.services.vector_index import ExactIndex, VectorIndex, compare_indexes, evaluate_index
+from app.services.vector_snapshot import VectorSnapshotStore
+from app.services.single_flight import SingleFlight
+from app.services.llm_admission import PRIORITY_DEFAULT, embedding_slot
 import numpy as np
 import json
 import logging
 import asyncio
 from typing import List, Dict, Optional
+import os
+import tempfile
+import threading
 import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
 from functools import lru_cache
-import hashlib
 
 logger = logging.getLogger(__name__)
 
+# 缓存行号的过滤条件组合数
+FILTER_CACHE_SIZE = 64
+
+# 内置健康知识，仅在数据库中没有带关键词的条目时用于关键词检索
+BUILTIN_HEALTH_KNOWLEDGE = [
+    {
+        "content": "健康饮食应该包含多样化的食物，包括蔬菜、水果、全谷物、瘦肉蛋白和健康脂肪。建议每天摄入5-9份蔬菜和水果，选择全谷物而非精制谷物，限制加工食品和高糖食品的摄入。均衡的营养摄入有助于维持健康体重、增强免疫力、预防慢性疾病。",
+        "source": "营养指南",
+        "topic": "营养与饮食",
+        "keywords": ["饮食", "营养", "蔬菜", "水果", "健康食品", "均衡", "维生素"]
+    },
+    {
+        "content": "规律运动对健康至关重要。成年人每周应进行至少150分钟中等强度有氧运动，或75分钟高强度有氧运动，同时每周进行2次或以上肌肉强化活动。运动可以改善心血管健康、增强免疫力、控制体重、改善心情、增强骨密度。",
+        "source": "运动指南",
+        "topic": "运动健身",
+        "keywords": ["运动", "锻炼", "有氧", "肌肉", "健身", "体重", "心血管", "骨密度"]
+    },
+    {
+        "content": "良好的睡眠对健康不可或缺。成年人每晚需要7-9小时的优质睡眠。保持规律的作息时间、创造舒适的睡眠环境、避免睡前使用电子设备、限制咖啡因摄入都有助于改善睡眠质量。充足的睡眠有助于记忆巩固、免疫系统恢复、情绪调节。",
+        "source": "睡眠指南",
+        "topic": "睡眠质量",
+        "keywords": ["睡眠", "作息", "失眠", "休息", "睡眠质量", "记忆", "免疫", "情绪"]
+    },
+    {
+        "content": "心理健康同样重要。管理压力、保持社交联系、培养兴趣爱好、寻求专业帮助都是维护心理健康的有效方法。冥想、深呼吸、瑜伽等放松技巧可以帮助缓解压力和焦虑。保持积极的心态和良好的人际关系对心理健康至关重要。",
+        "source": "心理健康指南",
+        "topic": "心理健康",
+        "keywords": ["心理", "压力", "焦虑", "冥想", "放松", "情绪", "社交", "人际关系"]
+    },
+    {
+        "content": "定期体检和健康监测有助于早期发现和预防疾病。建议成年人每年进行一次全面体检，包括血压、血糖、胆固醇检查。女性应定期进行乳腺和宫颈癌筛查，男性应关注前列腺健康。预防胜于治疗，早期发现问题可以大大提高治疗效果。",
+        "source": "预防医学指南",
+        "topic": "疾病预防",
+        "keywords": ["体检", "预防", "筛查", "血压", "血糖", "胆固醇", "癌症", "早期发现"]
+    },
+    {
+        "content": "水分摄入对健康至关重要。成年人每天应饮用8-10杯水（约2-2.5升）。充足的水分有助于维持体温、润滑关节、运输营养物质、排除废物。运动时或炎热天气下需要增加水分摄入。避免过量饮用含糖饮料和酒精。",
+        "source": "水分补充指南",
+        "topic": "营养与饮食",
+        "keywords": ["水分", "饮水", "补水", "脱水", "体温", "关节", "营养", "废物"]
+    }
+]
+
 class OptimizedRAGService:
-    def __init__(self):
-        # 修复 API URL
-        base_url = settings.OPENAI_BASE_URL.rstrip('/')
-        if not base_url.endswith('/v1'):
-            base_url = f"{base_url}/v1"
-            
-        logger.info(f"初始化优化 RAG 服务，使用 API URL: {base_url}")
-        
-        self.embeddings = OpenAIEmbeddings(
-            openai_api_key=settings.OPENAI_API_KEY,
-            openai_api_base=base_url,
-            model="text-embedding-ada-002"
-        )
+    def __init__(self, vector_index: Optional[VectorIndex] = None):
+        logger.info(f"初始化优化 RAG 服务，embedding 提供方: {settings.RAG_EMBEDDING_PROVIDER}")
+        self.embeddings = create_embeddings()
         
         # 缓存机制
-        self._embedding_cache = {}
+        self._embedding_cache = EmbeddingCache(
+            max_size=settings.RAG_EMBEDDING_CACHE_SIZE,
+            ttl=settings.RAG_EMBEDDING_CACHE_TTL,
+            max_bytes=settings.RAG_EMBEDDING_CACHE_MAX_BYTES
+        )
+        self._persistent_cache = self._open_persistent_cache()
+        # 合并缓存未命中的相同查询的并发 embedding 请求
+        self._embedding_flight = SingleFlight("embedding")
         self._vector_cache = None
         self._cache_timestamp = 0
         self._cache_ttl = getattr(settings, 'RAG_CACHE_TTL', 300)  # 5分钟缓存
+        self._high_water_mark: Optional[datetime] = None  # 已加载行的最大 updated_at
+        self._full_refresh_timestamp = 0
+        # 知识库内容版本：缓存中的知识变化时递增，语义回答缓存据此失效
+        self._knowledge_version = 0
+        self._knowledge_signature = None
         
-        # 预定义的健康知识库（避免每次查询API）
-        self.health_knowledge_base = [
-            {
-                "content": "健康饮食应该包含多样化的食物，包括蔬菜、水果、全谷物、瘦肉蛋白和健康脂肪。建议每天摄入5-9份蔬菜和水果，选择全谷物而非精制谷物，限制加工食品和高糖食品的摄入。均衡的营养摄入有助于维持健康体重、增强免疫力、预防慢性疾病。",
-                "source": "营养指南",
-                "keywords": ["饮食", "营养", "蔬菜", "水果", "健康食品", "均衡", "维生素"]
-            },
-            {
-                "content": "规律运动对健康至关重要。成年人每周应进行至少150分钟中等强度有氧运动，或75分钟高强度有氧运动，同时每周进行2次或以上肌肉强化活动。运动可以改善心血管健康、增强免疫力、控制体重、改善心情、增强骨密度。",
-                "source": "运动指南",
-                "keywords": ["运动", "锻炼", "有氧", "肌肉", "健身", "体重", "心血管", "骨密度"]
-            },
-            {
-                "content": "良好的睡眠对健康不可或缺。成年人每晚需要7-9小时的优质睡眠。保持规律的作息时间、创造舒适的睡眠环境、避免睡前使用电子设备、限制咖啡因摄入都有助于改善睡眠质量。充足的睡眠有助于记忆巩固、免疫系统恢复、情绪调节。",
-                "source": "睡眠指南",
-                "keywords": ["睡眠", "作息", "失眠", "休息", "睡眠质量", "记忆", "免疫", "情绪"]
-            },
-            {
-                "content": "心理健康同样重要。管理压力、保持社交联系、培养兴趣爱好、寻求专业帮助都是维护心理健康的有效方法。冥想、深呼吸、瑜伽等放松技巧可以帮助缓解压力和焦虑。保持积极的心态和良好的人际关系对心理健康至关重要。",
-                "source": "心理健康指南",
-                "keywords": ["心理", "压力", "焦虑", "冥想", "放松", "情绪", "社交", "人际关系"]
-            },
-            {
-                "content": "定期体检和健康监测有助于早期发现和预防疾病。建议成年人每年进行一次全面体检，包括血压、血糖、胆固醇检查。女性应定期进行乳腺和宫颈癌筛查，男性应关注前列腺健康。预防胜于治疗，早期发现问题可以大大提高治疗效果。",
-                "source": "预防医学指南",
-                "keywords": ["体检", "预防", "筛查", "血压", "血糖", "胆固醇", "癌症", "早期发现"]
-            },
-            {
-                "content": "水分摄入对健康至关重要。成年人每天应饮用8-10杯水（约2-2.5升）。充足的水分有助于维持体温、润滑关节、运输营养物质、排除废物。运动时或炎热天气下需要增加水分摄入。避免过量饮用含糖饮料和酒精。",
-                "source": "水分补充指南",
-                "keywords": ["水分", "饮水", "补水", "脱水", "体温", "关节", "营养", "废物"]
-            }
-        ]
+        # 多 worker 共享的内存映射快照：只有持有构建锁的 worker 查询数据库并发布新版本
+        self._snapshot_store = VectorSnapshotStore(settings.RAG_SNAPSHOT_DIR) if settings.RAG_SNAPSHOT_DIR else None
+        self._snapshot_version: Optional[int] = None
+        self._mapped_cache: Optional[VectorMatrix] = None
+        
+        # 近似最近邻索引；精确检索直接使用向量矩阵，无需额外副本
+        self._vector_index = vector_index
+        self._use_ann = vector_index is not None and not isinstance(vector_index, ExactIndex)
+        self._index_stale = 0
+        # 量化索引只在重排时读取少量全精度向量：矩阵写入临时文件并以内存映射访问，不常驻进程内存
+        self._spill_dir = self._rescore_vectors_dir() if self._use_ann and vector_index.quantized else None
+        
+        # 刷新在工作线程中执行：写锁串行化快照替换，索引锁保护 faiss 的增量写入
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._write_lock = threading.Lock()
+        self._index_lock = threading.Lock()
+        
+        # 关键词索引从 VectorStore.meta_info 的 keywords 构建，随向量缓存一起刷新；
+        # 数据库中还没有带关键词的条目时使用内置知识作为兜底
+        self._keyword_index = KeywordIndex()
+        self._bm25_index = self._new_bm25_index()
+        # 片段 id -> (父文档, 起始偏移, 结束偏移)，检索时用于合并同一文档的片段
+        self._chunk_info: Dict[int, tuple] = {}
+        # 带 meta_info 的行，发布共享快照时写出，其他 worker 据此重建关键词和片段信息
+        self._row_meta: Dict[int, str] = {}
+        # source / topic / tags 倒排表；过滤条件对应的行号按快照缓存，快照或倒排表变化后重新计算
+        self._filter_index = MetadataFilterIndex()
+        self._filter_rows: OrderedDict = OrderedDict()
+        self._builtin_keyword_index = KeywordIndex()
+        self._builtin_filter_index = MetadataFilterIndex()
+        for i, item in enumerate(BUILTIN_HEALTH_KNOWLEDGE):
+            self._builtin_keyword_index.add(-(i + 1), item["content"], item["source"], item["keywords"])
+            self._builtin_filter_index.add(-(i + 1), item["source"], json.dumps({"topic": item["topic"]}))
+
+    @staticmethod
+    def _rescore_vectors_dir() -> str:
+        directory = settings.RAG_RESCORE_VECTORS_DIR or tempfile.gettempdir()
+        os.makedirs(directory, exist_ok=True)
+        return directory
+
+    def _new_bm25_index(self) -> BM25Index:
+        return BM25Index(k1=settings.RAG_BM25_K1, b=settings.RAG_BM25_B)
+
+    def _open_persistent_cache(self) -> Optional[PersistentEmbeddingCache]:
+        """打开持久化embedding缓存并预热内存缓存，失败时只使用内存缓存"""
+        path = settings.RAG_PERSISTENT_CACHE_PATH
+        if not path:
+            return None
+        if not os.path.isabs(path):
+            path = os.path.join(BACKEND_DIR, path)
+        try:
+            cache = PersistentEmbeddingCache(
+                path,
+                model=embedding_model_name(),
+                max_rows=settings.RAG_PERSISTENT_CACHE_MAX_ROWS
+            )
+            warm_size = min(settings.RAG_PERSISTENT_CACHE_WARM_SIZE, self._embedding_cache.max_size)
+            for key, embedding in cache.warm_load(warm_size):
+                self._embedding_cache.set(key, embedding)
+            return cache
+        except Exception as e:
+            logger.error(f"打开持久化embedding缓存失败: {str(e)}")
+            return None
 
     def _get_query_hash(self, query: str) -> str:
-        """生成查询的哈希值用于缓存"""
-        return hashlib.md5(query.encode('utf-8')).hexdigest()
+        """生成查询的哈希值用于缓存（规范化文本 + 模型名）"""
+        return embedding_cache_key(query, embedding_model_name())
 
     async def _get_cached_embedding(self, text: str) -> Optional[np.ndarray]:
-        """获取缓存的embedding"""
-        text_hash = self._get_query_hash(text)
-        if text_hash in self._embedding_cache:
+        """获取缓存的embedding，内存未命中时查询持久化缓存并回填内存"""
+        key = self._get_query_hash(text)
+        embedding = self._embedding_cache.get(key)
+        if embedding is None and self._persistent_cache is not None:
+            try:
+                embedding = await asyncio.to_thread(self._persistent_cache.get, key)
+            except Exception as e:
+                logger.error(f"读取持久化embedding缓存失败: {str(e)}")
+                embedding = None
+            if embedding is not None:
+                self._embedding_cache.set(key, embedding)
+        if embedding is not None:
             logger.debug(f"使用缓存的embedding: {text[:30]}...")
-            return self._embedding_cache[text_hash]
-        return None
+        return embedding
 
     async def _cache_embedding(self, text: str, embedding: np.ndarray):
-        """缓存embedding"""
-        text_hash = self._get_query_hash(text)
-        self._embedding_cache[text_hash] = embedding
+        """缓存embedding，同时写入内存和持久化缓存"""
+        key = self._get_query_hash(text)
+        self._embedding_cache.set(key, embedding)
+        if self._persistent_cache is not None:
+            try:
+                await asyncio.to_thread(self._persistent_cache.set, key, embedding)
+            except Exception as e:
+                logger.error(f"写入持久化embedding缓存失败: {str(e)}")
         logger.debug(f"缓存embedding: {text[:30]}...")
 
-    def _keyword_search(self, query: str, k: int = 3) -> List[Dict]:
-        """基于关键词的快速搜索（备用方案）"""
-        query_lower = query.lower()
-        results = []
-        
-        for item in self.health_knowledge_base:
-            score = 0
-            # 检查关键词匹配
-            for keyword in item["keywords"]:
-                if keyword in query_lower:
-                    score += 2  # 关键词匹配权重更高
-            
-            # 检查内容匹配
-            content_words = query_lower.split()
-            for word in content_words:
-                if len(word) > 2 and word in item["content"].lower():
-                    score += 1
-            
-            if score > 0:
-                results.append({
-                    "content": item["content"],
-                    "similarity": score,
-                    "source": item["source"]
-                })
-        
-        # 按分数排序并返回前k个结果
-        results.sort(key=lambda x: x["similarity"], reverse=True)
-        return results[:k]
+    @property
+    def knowledge_version(self) -> int:
+        return self._knowledge_version
+
+    def _note_knowledge_change(self, force: bool = False):
+        """替换快照后按 (向量数, 高水位) 判断内容是否变化，增量变更直接递增版本"""
+        snapshot = self._vector_cache
+        signature = (len(snapshot) if snapshot else 0, self._high_water_mark)
+        if force or signature != self._knowledge_signature:
+            self._knowledge_version += 1
+        self._knowledge_signature = signature
+
+    async def embed_query(self, text: str) -> np.ndarray:
+        """查询文本的 embedding，优先读取缓存；缓存未命中的相同查询并发到达时只请求一次"""
+        embedding = await self._get_cached_embedding(text)
+        if embedding is None:
+            embedding = await self._embedding_flight.do(self._get_query_hash(text), lambda: self._embed_uncached(text))
+        return embedding
+
+    async def _embed_uncached(self, text: str) -> np.ndarray:
+        async with embedding_slot():
+            embedding = np.array(await self.embeddings.aembed_query(text))
+        await self._cache_embedding(text, embedding)
+        return embedding
+
+    def _keyword_search(self, query: str, k: int = 3, filters: Optional[Dict] = None) -> List[Dict]:
+        """基于关键词倒排索引的快速搜索"""
+        if len(self._keyword_index):
+            index, filter_index = self._keyword_index, self._filter_index
+        else:
+            index, filter_index = self._builtin_keyword_index, self._builtin_filter_index
+        allowed = filter_index.candidate_ids(filters) if filters else None
+        return index.search(query, k, allowed)
 
-    async def search_similar_fast(self, query: str, k: int = 2) -> List[Dict]:
-        """快速搜索相似内容（优化版本）"""
+    async def search_similar_fast(
+        self,
+        query: str,
+        k: int = 2,
+        filters: Optional[Dict] = None,
+        mmr_lambda: Optional[float] = None
+    ) -> List[Dict]:
+        """
+        快速搜索相似内容（混合检索）
+        BM25、关键词索引和向量检索各自召回候选，再用加权倒数排名融合；
+        BM25 首条结果已覆盖大部分查询词时直接返回词法结果，不调用 embedding 接口
+        filters 形如 {"topic": ["睡眠质量"], "tags": [...]}，先由倒排表缩小候选集合再打分；
+        mmr_lambda 不为空（或配置默认开启）时用 MMR 重排融合结果并去掉近似重复
+        """
         start_time = time.time()
+        filters = normalize_filters(filters)
+        if mmr_lambda is None and settings.RAG_MMR_ENABLED:
+            mmr_lambda = settings.RAG_MMR_LAMBDA
         
         try:
-            # 1. 首先尝试关键词搜索（最快）
+            # 取一次快照引用，词法索引随向量缓存一起加载
+            snapshot = await self._get_vector_snapshot()
+            candidates = max(k, settings.RAG_HYBRID_CANDIDATES)
+            rankings: Dict[str, List] = {}
+            allowed = self._filter_index.candidate_ids(filters) if filters else None
+            if allowed is not None and not allowed:
+                return self._keyword_search(query, k, filters)
+            
+            # 1. 词法检索（最快）
             if getattr(settings, 'RAG_ENABLE_KEYWORD_SEARCH', True):
-                keyword_results = self._keyword_search(query, k)
-                if keyword_results and keyword_results[0]["similarity"] >= 2:  # 高质量匹配
-                    logger.info(f"关键词搜索完成，耗时: {time.time() - start_time:.3f}s")
-                    return keyword_results
+                lexical = self._bm25_index.search(query, candidates, allowed)
+                rankings["bm25"] = [(doc_id, score) for doc_id, score, _ in lexical]
+                rankings["keyword"] = self._keyword_index.search_ids(query, candidates, allowed)
+                if lexical and lexical[0][2] >= settings.RAG_LEXICAL_MIN_COVERAGE:
+                    logger.info(f"词法检索完成，耗时: {time.time() - start_time:.3f}s")
+                    return self._fuse_results(snapshot, rankings, k, mmr_lambda)
             
-            # 2. 如果关键词搜索无高质量结果，尝试缓存的向量搜索
-            cached_embedding = await self._get_cached_embedding(query)
-            if cached_embedding is not None:
-                vector_results = await self._vector_search_with_embedding(cached_embedding, k)
-                if vector_results:
-                    logger.info(f"缓存向量搜索完成，耗时: {time.time() - start_time:.3f}s")
-                    return vector_results
+            if not snapshot:
+                logger.warning("向量缓存为空，降级到关键词搜索")
+                return self._keyword_search(query, k, filters)
             
-            # 3. 最后才调用API生成新的embedding
-            logger.info("生成新的embedding...")
-            query_embedding = np.array(await self.embeddings.aembed_query(query))
-            await self._cache_embedding(query, query_embedding)
+            # 2. 向量检索：优先使用缓存的embedding，最后才调用API
+            query_embedding = await self.embed_query(query)
             
-            vector_results = await self._vector_search_with_embedding(query_embedding, k)
-            if vector_results:
-                logger.info(f"新向量搜索完成，总耗时: {time.time() - start_time:.3f}s")
-                return vector_results
+            if allowed is not None:
+                rows = snapshot.top_rows(query_embedding, candidates, self._filtered_rows(snapshot, filters, allowed))
+            else:
+                rows = self._vector_rows(snapshot, query_embedding, candidates)
+            rankings["vector"] = [(int(snapshot.ids[row]), score) for row, score in rows]
+            results = self._fuse_results(snapshot, rankings, k, mmr_lambda)
+            if results:
+                logger.info(f"混合检索完成，总耗时: {time.time() - start_time:.3f}s")
+                return results
             
-            # 4. 如果向量搜索也失败，返回关键词搜索结果
+            # 3. 如果都没有结果，返回关键词搜索结果
             logger.warning("向量搜索失败，降级到关键词搜索")
-            return self._keyword_search(query, k)
+            return self._keyword_search(query, k, filters)
             
         except Exception as e:
             logger.error(f"搜索失败: {str(e)}")
             # 降级到关键词搜索
-            return self._keyword_search(query, k)
+            return self._keyword_search(query, k, filters)
+
+    def _filtered_rows(self, snapshot: VectorMatrix, filters: Dict, allowed) -> np.ndarray:
+        """过滤条件在当前快照中的行号，按 (快照, 倒排表版本) 缓存，过滤后只对这些行打分"""
+        key = filter_key(filters)
+        generation = self._filter_index.generation
+        cached = self._filter_rows.get(key)
+        if cached is not None and cached[0] is snapshot and cached[1] == generation:
+            self._filter_rows.move_to_end(key)
+            return cached[2]
+        
+        rows = snapshot.rows_for_ids(allowed)
+        self._filter_rows[key] = (snapshot, generation, rows)
+        if len(self._filter_rows) > FILTER_CACHE_SIZE:
+            self._filter_rows.popitem(last=False)
+        return rows
+
+    def _fuse_results(
+        self,
+        snapshot: VectorMatrix,
+        rankings: Dict[str, List],
+        k: int,
+        mmr_lambda: Optional[float] = None
+    ) -> List[Dict]:
+        """
+        按配置的权重做倒数排名融合
+        similarity 为融合分数，各路的原始分数放在 scores 中；
+        同一文档的多个片段合并为一条结果
+        """
+        weights = {
+            "bm25": settings.RAG_FUSION_WEIGHT_BM25,
+            "vector": settings.RAG_FUSION_WEIGHT_VECTOR,
+            "keyword": settings.RAG_FUSION_WEIGHT_KEYWORD,
+        }
+        fused = reciprocal_rank_fusion(
+            {name: [doc_id for doc_id, _ in ranked] for name, ranked in rankings.items()},
+            weights,
+            settings.RAG_RRF_K
+        )
+        raw_scores = {name: dict(ranked) for name, ranked in rankings.items()}
+        
+        results = []
+        for doc_id, score in fused:
+            row = snapshot.row_of(doc_id) if snapshot else None
+            if row is not None:
+                result = snapshot.result(row, score)
+            else:
+                result = self._keyword_index.document(doc_id, score)
+                if result is None:
+                    continue
+            result["scores"] = {
+                name: float(scores[doc_id]) for name, scores in raw_scores.items() if doc_id in scores
+            }
+            results.append(result)
+        
+        if mmr_lambda is not None and len(results) > 1:
+            results = self._diversify(snapshot, results, mmr_lambda)
+        if settings.RAG_COLLAPSE_CHUNKS and self._chunk_info:
+            return collapse_chunks(results, self._chunk_info, k)
+        return results[:k]
+
+    @staticmethod
+    def _diversify(snapshot: VectorMatrix, results: List[Dict], mmr_lambda: float) -> List[Dict]:
+        """
+        对融合后的候选做 MMR 重排：相关性为归一化到 [0, 1] 的融合分数，冗余度为候选向量间的余弦相似度；
+        不在向量缓存中的候选（内置知识）按零向量处理
+        """
+        relevance = np.array([result["similarity"] for result in results], dtype=np.float32)
+        spread = relevance.max() - relevance.min()
+        relevance = (relevance - relevance.min()) / spread if spread > 0 else np.ones_like(relevance)
+        
+        dimension = snapshot.dimension if snapshot else 0
+        vectors = np.zeros((len(results), max(dimension, 1)), dtype=np.float32)
+        for i, result in enumerate(results):
+            row = snapshot.row_of(result["id"]) if snapshot else None
+            if row is not None:
+                vectors[i] = snapshot.matrix[row]
+        
+        order = mmr_rerank(relevance, vectors, len(results), mmr_lambda, settings.RAG_DUPLICATE_THRESHOLD)
+        return [results[i] for i in order]
+
+    def _vector_rows(self, snapshot: VectorMatrix, query_embedding: np.ndarray, k: int) -> List:
+        """向量检索，返回 [(行号, 余弦相似度)]"""
+        # 索引正在后台增量更新时，本次查询直接走精确检索，不等待
+        if self._use_ann and self._index_lock.acquire(blocking=False):
+            try:
+                # 多取一些候选，抵消量化误差以及已删除或旧版本条目被过滤的影响，再用全精度向量重排
+                # （量化索引时全精度矩阵为内存映射，只换入候选所在的行）
+                ids, _ = self._vector_index.search(query_embedding, k * settings.RAG_RESCORE_FACTOR)
+            finally:
+                self._index_lock.release()
+            return snapshot.rescore_rows(ids, query_embedding, k)
+        
+        # 单次矩阵-向量乘法计算全部相似度
+        return snapshot.top_rows(query_embedding, k)
 
     async def _vector_search_with_embedding(self, query_embedding: np.ndarray, k: int) -> List[Dict]:
         """使用已有embedding进行向量搜索"""
         try:
-            # 检查缓存是否过期
-            current_time = time.time()
-            if (self._vector_cache is None or 
-                current_time - self._cache_timestamp > self._cache_ttl):
-                await self._refresh_vector_cache()
+            # 取一次快照引用，本次查询全程使用同一快照
+            snapshot = await self._get_vector_snapshot()
             
-            if not self._vector_cache:
+            if not snapshot:
                 logger.warning("向量缓存为空")
                 return []
             
-            similarities = []
-            
-            # 计算相似度
-            for vec_data in self._vector_cache:
-                stored_vector = vec_data["embedding"]
-                similarity = np.dot(query_embedding, stored_vector) / (
-                    np.linalg.norm(query_embedding) * np.linalg.norm(stored_vector)
-                )
-                similarities.append({
-                    "content": vec_data["content"],
-                    "similarity": float(similarity),
-                    "source": vec_data["source"]
-                })
-            
-            # 排序并返回前k个结果
-            similarities.sort(key=lambda x: x["similarity"], reverse=True)
-            return similarities[:k]
+            return [snapshot.result(row, score) for row, score in self._vector_rows(snapshot, query_embedding, k)]
             
         except Exception as e:
             logger.error(f"向量搜索失败: {str(e)}")
             return []
 
+    def get_cache_stats(self) -> Dict:
+        """缓存统计信息"""
+        snapshot = self._vector_cache
+        return {
+            "embedding_cache_size": len(self._embedding_cache),
+            "embedding_cache": self._embedding_cache.stats(),
+            "embedding_coalescing": self._embedding_flight.stats(),
+            "persistent_cache": self._persistent_cache.stats() if self._persistent_cache else None,
+            "vector_cache_size": len(snapshot) if snapshot else 0,
+            "bm25_documents": len(self._bm25_index),
+            "bm25_vocabulary": self._bm25_index.vocabulary_size,
+            "filter_topics": list(self._filter_index.values("topic")),
+            "vector_cache_bytes": snapshot.nbytes if snapshot else 0,
+            "snapshot_version": self._snapshot_version,
+            "snapshot_mapped": bool(snapshot) and snapshot.is_mapped,
+            "vector_cache_spilled": bool(snapshot) and snapshot.is_spilled,
+            "cache_ttl": self._cache_ttl,
+            "last_cache_refresh": self._cache_timestamp
+        }
+
+    def _vector_columns(self):
+        """向量缓存需要读取的列"""
+        return (
+            VectorStore.id,
+            VectorStore.content,
+            VectorStore.source,
+            VectorStore.updated_at,
+            VectorStore.embedding_bin,
+            VectorStore.embedding_dtype,
+            VectorStore.meta_info,
+            json_fallback_column()
+        )
+
+    def _decode_rows(self, vectors, dimension: Optional[int] = None):
+        """解码查询结果，返回 (ids, embeddings, contents, sources, updated_at)"""
+        ids, embeddings, contents, sources, updated_at = [], [], [], [], []
+        for vec in vectors:
+            try:
+                embedding = load_embedding(vec.embedding_bin, vec.embedding_dtype, vec.embedding)
+                expected = dimension or (embeddings[0].shape[0] if embeddings else None)
+                if expected is not None and embedding.shape[0] != expected:
+                    raise ValueError(f"向量维度不一致: {embedding.shape}")
+                embeddings.append(embedding)
+                ids.append(vec.id)
+                contents.append(vec.content)
+                sources.append(vec.source)
+                updated_at.append(vec.updated_at)
+            except Exception as e:
+                logger.warning(f"跳过无效向量: {e}")
+        return ids, embeddings, contents, sources, updated_at
+
+    def _advance_high_water_mark(self, updated_at: List[Optional[datetime]]):
+        timestamps = [ts for ts in updated_at if ts is not None]
+        if timestamps and (self._high_water_mark is None or max(timestamps) > self._high_water_mark):
+            self._high_water_mark = max(timestamps)
+
+    async def _get_vector_snapshot(self) -> VectorMatrix:
+        """
+        返回当前向量快照
+        过期时在后台刷新，期间继续使用旧快照；只有尚未加载过时才等待首次加载
+        """
+        if self._vector_cache is None:
+            await self._schedule_refresh()
+        elif time.time() - self._cache_timestamp > self._cache_ttl:
+            self._schedule_refresh()
+        return self._vector_cache
+
+    def _schedule_refresh(self) -> asyncio.Task:
+        """单飞刷新：同一时刻最多只有一个刷新任务，并发的过期请求共享该任务"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_vector_cache())
+        return self._refresh_task
+
     async def _refresh_vector_cache(self):
-        """刷新向量缓存"""
+        """在工作线程中刷新向量缓存，不阻塞事件循环"""
+        await asyncio.to_thread(self._refresh_vector_cache_sync)
+
+    def _refresh_vector_cache_sync(self):
+        """刷新向量缓存：首次或到达全量周期时全量加载，其余时间只拉取增量"""
         try:
-            logger.info("刷新向量缓存...")
-            with Session(engine) as session:
-                vectors = session.query(VectorStore).all()
-                self._vector_cache = []
-                
-                for vec in vectors:
-                    try:
-                        embedding = np.array(json.loads(vec.embedding))
-                        self._vector_cache.append({
-                            "content": vec.content,
-                            "embedding": embedding,
-                            "source": vec.source
-                        })
-                    except Exception as e:
-                        logger.warning(f"跳过无效向量: {e}")
-                
-                self._cache_timestamp = time.time()
-                logger.info(f"向量缓存刷新完成，共加载 {len(self._vector_cache)} 个向量")
+            if self._snapshot_store is not None:
+                self._refresh_shared_snapshot()
+            else:
+                self._refresh_from_database()
+            self._cache_timestamp = time.time()
                 
         except Exception as e:
             logger.error(f"刷新向量缓存失败: {str(e)}")
-            self._vector_cache = []
+            with self._write_lock:
+                if self._vector_cache is None:
+                    self._vector_cache = VectorMatrix.empty(self._spill_dir)
+
+    def _refresh_from_database(self):
+        """首次或到达全量周期时全量加载，其余时间只拉取增量"""
+        full_reload = (
+            not self._vector_cache
+            or self._high_water_mark is None
+            or time.time() - self._full_refresh_timestamp > settings.RAG_CACHE_FULL_REFRESH_INTERVAL
+        )
+        if full_reload:
+            self._full_refresh_vector_cache()
+        else:
+            self._delta_refresh_vector_cache()
+
+    def _refresh_shared_snapshot(self):
+        """
+        共享快照模式：先映射已发布的新版本；再尝试获取构建锁，
+        拿到锁且清单在一个 TTL 内没有被检查过时才查询数据库，有变化则发布新版本
+        """
+        store = self._snapshot_store
+        manifest = store.current()
+        if manifest and manifest["version"] != self._snapshot_version:
+            self._load_shared_snapshot(manifest)
+        if not store.try_acquire_builder():
+            return
+        try:
+            # 等锁期间可能已有其他 worker 发布
+            manifest = store.current()
+            if manifest and manifest["version"] != self._snapshot_version:
+                self._load_shared_snapshot(manifest)
+            if manifest and time.time() - manifest["checked_at"] < self._cache_ttl:
+                return
+            self._refresh_from_database()
+            if manifest is None or self._vector_cache is not self._mapped_cache:
+                self._publish_shared_snapshot()
+            else:
+                store.touch(manifest)
+        finally:
+            store.release_builder()
+
+    def _load_shared_snapshot(self, manifest: Dict):
+        """映射快照文件并重建本进程的词法索引"""
+        data = self._snapshot_store.load(manifest)
+        snapshot = VectorMatrix.from_normalized(
+            data["ids"], data["matrix"], data["contents"], data["sources"], data["updated_at"], self._spill_dir
+        )
+        ids = [int(vid) for vid in data["ids"]]
+        row_meta = {vid: meta for vid, meta in zip(ids, data["meta_info"]) if meta}
+        indexes = self._build_row_indexes(ids, data["contents"], data["sources"], row_meta)
+        with self._write_lock:
+            self._vector_cache = snapshot
+            self._keyword_index, self._bm25_index, self._chunk_info, self._filter_index = indexes
+            self._row_meta = row_meta
+            self._high_water_mark = data["high_water_mark"]
+            self._note_knowledge_change()
+        self._mapped_cache = snapshot
+        self._snapshot_version = manifest["version"]
+        self._full_refresh_timestamp = manifest["full_refresh_at"]
+        logger.info(f"映射共享向量快照 v{manifest['version']}，共 {len(snapshot)} 个向量")
+        
+        if self._use_ann:
+            self._sync_vector_index()
+
+    def _publish_shared_snapshot(self):
+        """将当前缓存的存活行写成新版本快照，并改为映射该文件，释放进程内的矩阵副本"""
+        cache = self._vector_cache
+        rows = cache.live_rows()
+        ids, matrix = cache.live_vectors()
+        manifest = self._snapshot_store.publish(
+            ids,
+            matrix,
+            [cache.contents[row] for row in rows],
+            [cache.sources[row] for row in rows],
+            [cache.updated_at[row] for row in rows],
+            [self._row_meta.get(int(vid)) for vid in ids],
+            self._high_water_mark,
+            self._full_refresh_timestamp,
+        )
+        self._load_shared_snapshot(manifest)
+
+    def _build_row_indexes(self, ids, contents, sources, row_meta: Dict[int, str]):
+        """为一批行构建 (关键词索引, BM25 索引, 片段信息, 过滤倒排表)"""
+        bm25_index, keyword_index, chunk_info = self._new_bm25_index(), KeywordIndex(), {}
+        filter_index = MetadataFilterIndex()
+        for vid, content, source in zip(ids, contents, sources):
+            bm25_index.add(vid, content)
+            meta_info = row_meta.get(vid)
+            filter_index.add(vid, source, meta_info)
+            keywords = parse_keywords(meta_info)
+            if keywords:
+                keyword_index.add(vid, content, source, keywords)
+            chunk = parse_chunk_info(meta_info)
+            if chunk:
+                chunk_info[vid] = chunk
+        return keyword_index, bm25_index, chunk_info, filter_index
+
+    def _apply_cache_delta(self, *args, **kwargs) -> VectorMatrix:
+        """
+        基于最新快照应用增量并原子替换引用
+        写操作串行执行，读者始终拿到完整的快照
+        """
+        with self._write_lock:
+            previous = self._vector_cache
+            self._vector_cache = previous.apply_delta(*args, **kwargs)
+            if self._vector_cache is not previous:
+                self._note_knowledge_change(force=True)
+            return self._vector_cache
+
+    def _full_refresh_vector_cache(self):
+        """全量加载向量缓存"""
+        logger.info("全量刷新向量缓存...")
+        with Session(engine) as session:
+            vectors = session.query(*self._vector_columns()).filter(
+                VectorStore.is_deleted.is_(False)
+            ).all()
+        
+        ids, embeddings, contents, sources, updated_at = self._decode_rows(vectors)
+        snapshot = VectorMatrix(ids, embeddings, contents, sources, updated_at, spill_dir=self._spill_dir)
+        loaded = set(ids)
+        row_meta = {vec.id: vec.meta_info for vec in vectors if vec.id in loaded and vec.meta_info}
+        indexes = self._build_row_indexes(ids, contents, sources, row_meta)
+        with self._write_lock:
+            self._vector_cache = snapshot
+            self._keyword_index, self._bm25_index, self._chunk_info, self._filter_index = indexes
+            self._row_meta = row_meta
+            self._high_water_mark = None
+            self._advance_high_water_mark(updated_at)
+            self._note_knowledge_change()
+        self._full_refresh_timestamp = time.time()
+        logger.info(f"向量缓存刷新完成，共加载 {len(self._vector_cache)} 个向量")
+        
+        if self._use_ann:
+            self._sync_vector_index()
+
+    def _delta_refresh_vector_cache(self):
+        """
+        只拉取高水位之后新增或修改的行，以及同一时间窗口内的删除标记
+        回看一个重叠窗口，防止较早开始、较晚提交的事务被漏掉；已加载的同版本行会被跳过
+        """
+        since = self._high_water_mark - timedelta(seconds=settings.RAG_CACHE_DELTA_OVERLAP)
+        with Session(engine) as session:
+            vectors = session.query(*self._vector_columns()).filter(
+                VectorStore.updated_at >= since,
+                VectorStore.is_deleted.is_(False)
+            ).order_by(VectorStore.updated_at, VectorStore.id).all()
+            # 墓碑查询：只取被删除行的 id
+            tombstones = session.query(VectorStore.id, VectorStore.updated_at).filter(
+                VectorStore.updated_at >= since,
+                VectorStore.is_deleted.is_(True)
+            ).all()
+        
+        cache = self._vector_cache
+        changed = [vec for vec in vectors if not cache.is_current(vec.id, vec.updated_at)]
+        deleted_ids = [vid for vid, _ in tombstones if cache.row_of(vid) is not None]
+        if not changed and not deleted_ids:
+            return
+        replaced = sum(1 for vec in changed if cache.row_of(vec.id) is not None)
+        
+        ids, embeddings, contents, sources, updated_at = self._decode_rows(changed, cache.dimension or None)
+        self._apply_cache_delta(ids, embeddings, contents, sources, updated_at, deleted_ids=deleted_ids)
+        loaded = set(ids)
+        for vec in changed:
+            if vec.id in loaded:
+                self._index_row_metadata(vec.id, vec.content, vec.source, vec.meta_info)
+        for vid in deleted_ids:
+            self._unindex_row(vid)
+        self._advance_high_water_mark(updated_at + [ts for _, ts in tombstones])
+        logger.info(f"向量缓存增量刷新: 新增/更新 {len(ids)} 个，删除 {len(deleted_ids)} 个")
+        
+        if self._use_ann:
+            self._add_to_vector_index(ids, embeddings, stale=len(deleted_ids) + replaced)
 
-    async def store_vector(self, content: str, source: str = None):
-        """存储向量到数据库"""
+    def _sync_vector_index(self):
+        """全量加载后让近似索引与向量缓存保持一致：新增向量增量添加，出现删除时重建"""
+        ids, matrix = self._vector_cache.live_vectors()
+        cached_ids = set(ids.tolist())
+        indexed_ids = set(self._vector_index.ids.tolist())
+        
+        if indexed_ids - cached_ids:
+            logger.info(f"向量索引存在已删除的向量，重建 {self._vector_index.index_type} 索引")
+            self._rebuild_vector_index(ids, matrix)
+        else:
+            new_rows = [row for row, vid in enumerate(ids.tolist()) if vid not in indexed_ids]
+            if not new_rows:
+                return
+            with self._index_lock:
+                self._vector_index.add(ids[new_rows], matrix[new_rows])
+            logger.info(f"向量索引增量添加 {len(new_rows)} 个向量")
+            if self._vector_index.needs_rebuild():
+                logger.info(f"向量索引规模已远超训练时的规模，重建 {self._vector_index.index_type} 索引")
+                self._rebuild_vector_index(ids, matrix)
+        
+        if settings.RAG_INDEX_PATH:
+            with self._index_lock:
+                self._vector_index.save(settings.RAG_INDEX_PATH)
+
+    def _add_to_vector_index(self, ids, embeddings, stale: int = 0):
+        """
+        增量更新近似索引
+        ANN 索引不支持删除，已删除或已更新的旧条目在检索时由缓存过滤，
+        失效条目过多时再整体重建
+        """
+        self._index_stale += stale
+        if self._index_stale > COMPACT_RATIO * max(len(self._vector_index), 1):
+            logger.info(f"向量索引失效条目过多，重建 {self._vector_index.index_type} 索引")
+            self._rebuild_vector_index(*self._vector_cache.live_vectors())
+        elif ids:
+            with self._index_lock:
+                self._vector_index.add(ids, embeddings)
+            if self._vector_index.needs_rebuild():
+                logger.info(f"向量索引规模已远超训练时的规模，重建 {self._vector_index.index_type} 索引")
+                self._rebuild_vector_index(*self._vector_cache.live_vectors())
+
+    def _rebuild_vector_index(self, ids, matrix):
+        """在旁路构建新索引后整体替换，重建期间查询仍使用旧索引"""
+        index = self._vector_index.clone_empty()
+        index.build(ids, matrix)
+        with self._index_lock:
+            self._vector_index = index
+        self._index_stale = 0
+
+    def get_index_report(self, sample_size: int = 50, k: int = 10) -> Dict:
+        """以精确检索为基准，抽样评估当前索引的召回率与延迟"""
+        matrix = self._vector_cache
+        if not matrix:
+            return {"index_type": "exact", "size": 0, "message": "向量缓存为空"}
+        
+        ids, vectors = matrix.live_vectors()
+        reference = ExactIndex.from_matrix(ids, vectors)
+        index = self._vector_index if self._use_ann else reference
+        rng = np.random.default_rng()
+        rows = rng.choice(len(ids), min(sample_size, len(ids)), replace=False)
+        # 在已有向量上叠加噪声作为查询，避免只测到向量自身
+        queries = vectors[rows] + rng.normal(0, 0.01, (len(rows), matrix.dimension)).astype(np.float32)
+        return evaluate_index(index, reference, queries, k, settings.RAG_RESCORE_FACTOR if self._use_ann else 1)
+
+    def get_quantization_report(self, sample_size: int = 50, k: int = 10) -> Dict:
+        """在当前向量缓存上并排比较精确、int8 与 PQ 表示的内存占用和召回率"""
+        matrix = self._vector_cache
+        if not matrix:
+            return {"message": "向量缓存为空", "indexes": []}
+        
+        ids, vectors = matrix.live_vectors()
+        rng = np.random.default_rng()
+        rows = rng.choice(len(ids), min(sample_size, len(ids)), replace=False)
+        queries = vectors[rows] + rng.normal(0, 0.01, (len(rows), matrix.dimension)).astype(np.float32)
+        return {
+            "current_index": self._vector_index.index_type if self._vector_index is not None else "exact",
+            "vector_cache_bytes": matrix.nbytes,
+            "indexes": compare_indexes(
+                ids, vectors, queries, k, settings.RAG_RESCORE_FACTOR,
+                {
+                    "exact": {},
+                    "int8": {},
+                    "pq": {"pq_m": settings.RAG_PQ_M, "pq_nbits": settings.RAG_PQ_NBITS},
+                }
+            ),
+        }
+
+    async def store_vector(self, content: str, source: str = None, meta_info: Optional[Dict] = None):
+        """存储向量到数据库，长文档切分为片段分别存储；meta_info 中的 keywords 用于关键词检索"""
         try:
+            documents = prepare_documents([{"content": content, "source": source, "meta_info": meta_info}])
+            
             # 生成文本的向量表示
-            embedding = await self.embeddings.aembed_query(content)
+            async with embedding_slot(PRIORITY_DEFAULT):
+                if len(documents) == 1:
+                    embeddings = [await self.embeddings.aembed_query(content)]
+                else:
+                    embeddings = await self.embeddings.aembed_documents([doc["content"] for doc in documents])
             
             # 存储到向量数据库
             with Session(engine) as session:
-                vector_store = VectorStore(
-                    content=content,
-                    embedding=json.dumps(embedding),
-                    source=source
-                )
-                session.add(vector_store)
+                rows = [
+                    VectorStore(
+                        content=doc["content"],
+                        content_hash=content_hash(doc["content"]),
+                        source=source,
+                        meta_info=json.dumps(doc["meta_info"], ensure_ascii=False) if doc["meta_info"] else None,
+                        **embedding_columns(embedding)
+                    )
+                    for doc, embedding in zip(documents, embeddings)
+                ]
+                session.add_all(rows)
                 session.commit()
-                logger.info(f"成功存储向量: {content[:50]}...")
+                logger.info(f"成功存储向量（{len(rows)} 个片段）: {content[:50]}...")
                 
-                # 清除缓存以便下次刷新
-                self._vector_cache = None
-                return True
+                stored = [(row.id, row.updated_at, row.meta_info) for row in rows]
+            
+            # 直接追加到缓存，无需下次查询时全量重载
+            if self._vector_cache:
+                await asyncio.to_thread(self._append_to_cache, stored, embeddings, documents)
+            return True
                 
         except Exception as e:
             logger.error(f"存储向量失败: {str(e)}")
             return False
 
+    def _append_to_cache(self, stored: List, embeddings: List, documents: List[Dict]):
+        """将新写入的向量追加到缓存和索引，stored 为 [(id, updated_at, meta_info)]"""
+        ids = [vector_id for vector_id, _, _ in stored]
+        contents = [doc["content"] for doc in documents]
+        sources = [doc["source"] for doc in documents]
+        self._apply_cache_delta(ids, embeddings, contents, sources, [updated_at for _, updated_at, _ in stored])
+        for (vector_id, _, meta_info), content, source in zip(stored, contents, sources):
+            self._index_row_metadata(vector_id, content, source, meta_info)
+        if self._use_ann:
+            self._add_to_vector_index(ids, embeddings)
+
+    def _index_row_metadata(self, vector_id: int, content: str, source: Optional[str], meta_info: Optional[str]):
+        """更新一行的词法索引、关键词索引和片段信息"""
+        self._bm25_index.add(vector_id, content)
+        self._filter_index.add(vector_id, source, meta_info)
+        keywords = parse_keywords(meta_info)
+        if keywords:
+            self._keyword_index.add(vector_id, content, source, keywords)
+        else:
+            self._keyword_index.remove(vector_id)
+        chunk = parse_chunk_info(meta_info)
+        if chunk:
+            self._chunk_info[vector_id] = chunk
+        else:
+            self._chunk_info.pop(vector_id, None)
+        if meta_info:
+            self._row_meta[vector_id] = meta_info
+        else:
+            self._row_meta.pop(vector_id, None)
+
+    def _unindex_row(self, vector_id: int):
+        self._bm25_index.remove(vector_id)
+        self._keyword_index.remove(vector_id)
+        self._filter_index.remove(vector_id)
+        self._chunk_info.pop(vector_id, None)
+        self._row_meta.pop(vector_id, None)
+
+    def _remove_from_cache(self, vector_id: int):
+        """从缓存中移除已删除的向量，索引中的旧条目计为失效"""
+        self._apply_cache_delta([], [], [], [], deleted_ids=[vector_id])
+        self._unindex_row(vector_id)
+        if self._use_ann:
+            self._add_to_vector_index([], [], stale=1)
+
+    async def delete_vector(self, vector_id: int) -> bool:
+        """软删除向量，其他进程通过墓碑查询在下次增量刷新时移除"""
+        try:
+            with Session(engine) as session:
+                updated = session.query(VectorStore).filter(
+                    VectorStore.id == vector_id,
+                    VectorStore.is_deleted.is_(False)
+                ).update({VectorStore.is_deleted: True}, synchronize_session=False)
+                session.commit()
+            
+            if updated and self._vector_cache:
+                await asyncio.to_thread(self._remove_from_cache, vector_id)
+            return bool(updated)
+            
+        except Exception as e:
+            logger.error(f"删除向量失败: {str(e)}")
+            return False
+
     # 保持向后兼容
-    async def search_similar(self, query: str, k: int = 2):
+    async def search_similar(
+        self,
+        query: str,
+        k: int = 2,
+        filters: Optional[Dict] = None,
+        mmr_lambda: Optional[float] = None
+    ):
         """搜索相似内容（兼容接口）"""
-        return await self.search_similar_fast(query, k)
\ No newline at end of file
+        return await self.search_similar_fast(query, k, filters, mmr_lambda)
\ No newline at end of file
@@ -0,0 +1,123 @@
+"""
+并发请求合并（single-flight）
+相同键的并发调用只向上游发起一次：
+    do()     - 普通协程调用，后到的调用者等待同一个任务的结果
+    stream() - 流式调用，所有调用者从同一个上游流中读取，后加入的调用者先回放已收到的分块
+上游调用结束后键即被移除，之后的调用重新发起请求（结果缓存由各自的缓存层负责）
+"""
+
+import asyncio
+import logging
+from typing import AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Broadcast:
+    """一次上游流式调用的分块缓冲，订阅者按各自的进度读取"""
+
+    def __init__(self):
+        self.chunks: List = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self.changed = asyncio.Event()
+
+    def notify(self) -> None:
+        # 换新 Event 而不是 clear，已取得旧 Event 的订阅者不会错过通知
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class SingleFlight:
+    """按键合并并发的相同调用"""
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self._streams: Dict[Hashable, _Broadcast] = {}
+        self.calls = 0
+        self.shared = 0
+        self.stream_calls = 0
+        self.stream_shared = 0
+
+    def __len__(self) -> int:
+        return len(self._calls) + len(self._streams)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]):
+        """
+        执行 fn() 并返回结果；同一键已有调用在进行中时等待它的结果
+        上游任务不随单个调用者取消，其他等待者仍能拿到结果
+        """
+        task = self._calls.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _, key=key, task=task: self._forget(self._calls, key, task))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    async def stream(self, key: Hashable, factory: Callable[[], AsyncIterator]) -> AsyncIterator:
+        """
+        迭代 factory() 产生的异步流；同一键已有流在进行中时从它的缓冲读取
+        所有订阅者都断开后取消上游流；上游出错时每个订阅者在读完已收到的分块后收到同一个异常
+        """
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            self.stream_calls += 1
+            broadcast = _Broadcast()
+            self._streams[key] = broadcast
+            broadcast.task = asyncio.ensure_future(self._produce(key, broadcast, factory))
+        else:
+            self.stream_shared += 1
+
+        broadcast.subscribers += 1
+        index = 0
+        try:
+            while True:
+                changed = broadcast.changed
+                while index < len(broadcast.chunks):
+                    yield broadcast.chunks[index]
+                    index += 1
+                if broadcast.done:
+                    if broadcast.error is not None:
+                        raise broadcast.error
+                    return
+                await changed.wait()
+        finally:
+            broadcast.subscribers -= 1
+            if broadcast.subscribers == 0 and not broadcast.done:
+                logger.info(f"{self.name or 'single-flight'} 流的订阅者全部断开，取消上游请求")
+                self._forget(self._streams, key, broadcast)
+                broadcast.task.cancel()
+
+    async def _produce(self, key: Hashable, broadcast: _Broadcast, factory: Callable[[], AsyncIterator]) -> None:
+        try:
+            async for chunk in factory():
+                broadcast.chunks.append(chunk)
+                broadcast.notify()
+        except asyncio.CancelledError:
+            broadcast.error = asyncio.CancelledError()
+        except Exception as e:
+            broadcast.error = e
+        finally:
+            broadcast.done = True
+            self._forget(self._streams, key, broadcast)
+            broadcast.notify()
+
+    @staticmethod
+    def _forget(calls: Dict, key: Hashable, value) -> None:
+        if calls.get(key) is value:
+            del calls[key]
+
+    def stats(self) -> Dict:
+        return {
+            "in_flight": len(self),
+            "calls": self.calls,
+            "shared": self.shared,
+            "stream_calls": self.stream_calls,
+            "stream_shared": self.stream_shared,
+        }
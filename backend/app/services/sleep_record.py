@@ -4,6 +4,7 @@ from typing import List, Optional
 
 from app.models.sleep_record import SleepRecord
 from app.schemas.sleep_record import SleepRecordCreate
+from app.services.health_profile import invalidate_health_profile
 
 class SleepRecordService:
     
@@ -26,6 +27,7 @@ class SleepRecordService:
         db.add(db_sleep_record)
         db.commit()
         db.refresh(db_sleep_record)
+        invalidate_health_profile(db_sleep_record.user_id)
         return db_sleep_record
     
     @staticmethod
@@ -52,5 +54,6 @@ class SleepRecordService:
         if db_sleep_record:
             db.delete(db_sleep_record)
             db.commit()
+            invalidate_health_profile(db_sleep_record.user_id)
             return True
         return False 
\ No newline at end of file
@@ -0,0 +1,128 @@
+"""
+文档切分
+长文档按中文标点递归切分为带重叠的片段，每个片段在 meta_info 中记录父文档和字符偏移；
+检索时同一父文档的多个命中片段按偏移合并为一条结果
+"""
+
+import json
+from typing import Dict, List, Optional, Tuple
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.core.config import settings
+
+# 优先在段落、句子处切分，其次是分句和逗号，最后才按字符硬切
+CHINESE_SEPARATORS = ["\n\n", "\n", "。", "！", "？", "；", "!", "?", ";", "，", ",", " ", ""]
+# 不相邻片段合并时的连接符
+GAP_MARKER = "……"
+# 相邻片段之间被切分器去掉的空白不超过该长度，合并时用换行连接
+ADJACENT_GAP = 2
+
+ChunkInfo = Tuple[str, int, int]
+
+
+def create_text_splitter(chunk_size: Optional[int] = None, chunk_overlap: Optional[int] = None):
+    """标点保留在句尾，并记录每个片段在原文中的起始位置"""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size or settings.RAG_CHUNK_SIZE,
+        chunk_overlap=settings.RAG_CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap,
+        separators=CHINESE_SEPARATORS,
+        keep_separator="end",
+        add_start_index=True,
+    )
+
+
+def chunk_document(
+    document: Dict,
+    parent_id: str,
+    chunk_size: Optional[int] = None,
+    chunk_overlap: Optional[int] = None,
+) -> List[Dict]:
+    """
+    切分单个文档 {content, source, meta_info}
+    不超过片段长度的文档原样返回；切分后的片段继承原有 meta_info（如 keywords），
+    并增加 parent / chunk_index / chunk_count / start / end
+    """
+    chunk_size = chunk_size or settings.RAG_CHUNK_SIZE
+    content = document["content"]
+    if len(content) <= chunk_size:
+        return [document]
+
+    pieces = create_text_splitter(chunk_size, chunk_overlap).create_documents([content])
+    chunks = []
+    for index, piece in enumerate(pieces):
+        start = piece.metadata.get("start_index", -1)
+        if start < 0:
+            start = content.find(piece.page_content)
+        meta_info = dict(document.get("meta_info") or {})
+        meta_info.update({
+            "parent": parent_id,
+            "chunk_index": index,
+            "chunk_count": len(pieces),
+            "start": start,
+            "end": start + len(piece.page_content),
+        })
+        chunks.append({
+            "content": piece.page_content,
+            "source": document.get("source"),
+            "meta_info": meta_info,
+        })
+    return chunks
+
+
+def parse_chunk_info(meta_info: Optional[str]) -> Optional[ChunkInfo]:
+    """从 VectorStore.meta_info 中取出 (parent, start, end)，不是片段时返回 None"""
+    if not meta_info:
+        return None
+    try:
+        meta = json.loads(meta_info)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(meta, dict) or "parent" not in meta:
+        return None
+    return str(meta["parent"]), int(meta.get("start", 0)), int(meta.get("end", 0))
+
+
+def merge_passages(passages: List[Tuple[int, int, str]]) -> str:
+    """按偏移合并同一父文档的片段，重叠部分只保留一次，相邻片段换行连接，不相邻的片段之间插入省略号"""
+    passages = sorted(passages)
+    merged, end = passages[0][2], passages[0][1]
+    for start, stop, text in passages[1:]:
+        if stop <= end:
+            continue
+        if start <= end:
+            merged += text[end - start:]
+        elif start - end <= ADJACENT_GAP:
+            merged += "\n" + text
+        else:
+            merged += GAP_MARKER + text
+        end = stop
+    return merged
+
+
+def collapse_chunks(results: List[Dict], chunk_info: Dict[int, ChunkInfo], k: int) -> List[Dict]:
+    """
+    将同一父文档的命中片段合并为一条结果，保留排名最靠前片段的位置和分数
+    results 按分数降序且带有 id；返回最多 k 条
+    """
+    collapsed: List[Dict] = []
+    groups: Dict[str, Tuple[Dict, List[Tuple[int, int, str]]]] = {}
+    for result in results:
+        info = chunk_info.get(result.get("id"))
+        if info is None:
+            if len(collapsed) < k:
+                collapsed.append(result)
+            continue
+        parent, start, end = info
+        if parent in groups:
+            groups[parent][1].append((start, end, result["content"]))
+        elif len(collapsed) < k:
+            passages = [(start, end, result["content"])]
+            groups[parent] = (result, passages)
+            collapsed.append(result)
+
+    for result, passages in groups.values():
+        if len(passages) > 1:
+            result["content"] = merge_passages(passages)
+            result["chunk_count"] = len(passages)
+    return collapsed
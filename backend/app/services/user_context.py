@@ -0,0 +1,101 @@
+"""
+个性化健康咨询的用户上下文
+由用户近期记录计算衍生指标（最新身高体重、BMI 趋势、平均睡眠、每周运动量），
+与客户端传入的 UserHealthData 合并（客户端显式提供的字段优先），并格式化为提示词片段
+记录的读取与缓存见 health_profile
+"""
+
+from collections import Counter
+from typing import Dict, List, Optional
+
+# 提示词中列出的常做运动类型数
+TOP_EXERCISE_TYPES = 3
+
+
+def calculate_bmi(height, weight) -> Optional[float]:
+    """身高(cm)、体重(kg) 计算 BMI，数据缺失时返回 None"""
+    try:
+        height, weight = float(height) / 100, float(weight)
+    except (TypeError, ValueError):
+        return None
+    if height <= 0 or weight <= 0:
+        return None
+    return round(weight / (height * height), 2)
+
+
+def derive_health_stats(rows: List[Dict]) -> Dict:
+    """rows 按记录时间倒序：最新的身高、体重、血压，以及窗口内 BMI 的变化"""
+    stats = {}
+    height = next((row["height"] for row in rows if row["height"] is not None), None)
+    weight = next((row["weight"] for row in rows if row["weight"] is not None), None)
+    if height is not None:
+        stats["height"] = float(height)
+    if weight is not None:
+        stats["weight"] = float(weight)
+
+    bmis = [calculate_bmi(row["height"] or height, row["weight"]) for row in rows if row["weight"] is not None]
+    bmis = [bmi for bmi in bmis if bmi is not None]
+    if bmis:
+        stats["bmi"] = bmis[0]
+    if len(bmis) >= 2:
+        stats["bmi_trend"] = round(bmis[0] - bmis[-1], 2)
+
+    pressure = next((row for row in rows if row["systolic_pressure"] and row["diastolic_pressure"]), None)
+    if pressure is not None:
+        stats["blood_pressure"] = f"{pressure['systolic_pressure']}/{pressure['diastolic_pressure']}"
+    return stats
+
+
+def derive_sleep_stats(rows: List[Dict]) -> Dict:
+    """窗口内的平均睡眠时长与质量"""
+    durations = [float(row["sleep_duration"]) for row in rows if row["sleep_duration"] is not None]
+    qualities = [row["sleep_quality"] for row in rows if row["sleep_quality"] is not None]
+    stats = {}
+    if durations:
+        stats["avg_sleep_hours"] = round(sum(durations) / len(durations), 1)
+        stats["sleep_nights"] = len(durations)
+    if qualities:
+        stats["avg_sleep_quality"] = round(sum(qualities) / len(qualities), 1)
+    return stats
+
+
+def derive_exercise_stats(rows: List[Dict], days: int) -> Dict:
+    """窗口内折算的每周运动分钟数与最常做的运动"""
+    if not rows or days <= 0:
+        return {}
+    minutes = sum(row["duration_minutes"] or 0 for row in rows)
+    types = Counter(row["exercise_type"] for row in rows if row["exercise_type"])
+    return {
+        "weekly_exercise_minutes": round(minutes * 7 / days),
+        "exercise_types": [name for name, _ in types.most_common(TOP_EXERCISE_TYPES)],
+    }
+
+
+def merge_user_data(user_data: Optional[Dict], stats: Dict) -> Dict:
+    """服务端指标补全客户端未提供的字段"""
+    provided = {key: value for key, value in (user_data or {}).items() if value is not None}
+    return {**stats, **provided}
+
+
+def format_recent_records(user_data: Dict) -> str:
+    """把衍生指标格式化为提示词中的一段，没有服务端记录时返回空字符串"""
+    parts = []
+    if user_data.get("bmi_trend") is not None:
+        parts.append(f"BMI 近期变化 {user_data['bmi_trend']:+.2f}")
+    if user_data.get("blood_pressure"):
+        parts.append(f"最近血压 {user_data['blood_pressure']}")
+    if user_data.get("avg_sleep_quality") is not None:
+        parts.append(f"睡眠质量平均 {user_data['avg_sleep_quality']}/10（{user_data.get('sleep_nights', 0)} 晚）")
+    if user_data.get("avg_sleep_hours_30d") is not None:
+        parts.append(f"近 30 天平均睡眠 {user_data['avg_sleep_hours_30d']} 小时")
+    if user_data.get("weekly_exercise_minutes") is not None:
+        types = "、".join(user_data.get("exercise_types") or [])
+        parts.append(f"每周运动约 {user_data['weekly_exercise_minutes']} 分钟" + (f"（{types}）" if types else ""))
+    if user_data.get("weekly_exercise_minutes_30d") is not None:
+        parts.append(f"近 30 天平均每周运动 {user_data['weekly_exercise_minutes_30d']} 分钟")
+    for goal in user_data.get("health_goals") or []:
+        unit = goal.get("unit") or ""
+        parts.append(
+            f"目标「{goal['title']}」{goal.get('current_value')}/{goal.get('target_value')}{unit}，截止 {goal.get('target_date')}"
+        )
+    return "；".join(parts)
@@ -0,0 +1,148 @@
+"""
+近似重复向量清理
+按余弦相似度阈值把 vector_store 中的向量聚成簇：分块计算相似度矩阵的上三角，
+超过阈值的向量对用并查集合并；每个簇保留 id 最小（最早写入）的一条，其余标记或合并后软删除
+"""
+
+import json
+import logging
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.models.vector_store import VectorStore
+from app.services.embedding_codec import json_fallback_column, load_embedding
+from app.services.vector_matrix import normalize_rows
+
+logger = logging.getLogger(__name__)
+
+# 每个相似度块的元素数上限（float32 约 64MB），块的行数随向量总数自动调整
+BLOCK_ELEMENTS = 16 * 1024 * 1024
+DEDUP_ACTIONS = ("report", "mark", "merge")
+# 合并时并入保留条目的列表型元数据
+MERGED_META_FIELDS = ("keywords", "tags")
+
+
+def _find_root(parent: np.ndarray, i: int) -> int:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def find_duplicate_clusters(
+    ids: Sequence[int],
+    vectors,
+    threshold: float,
+    groups: Optional[Sequence] = None,
+) -> List[List[int]]:
+    """
+    返回成员数不少于 2 的簇，每个簇为升序的 id 列表
+    groups 给定时（如每行的来源）只在同一组内比较
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    if len(ids) < 2:
+        return []
+    matrix = normalize_rows(vectors)
+    if groups is None:
+        partitions = [np.arange(len(ids))]
+    else:
+        members = defaultdict(list)
+        for row, group in enumerate(groups):
+            members[group].append(row)
+        partitions = [np.asarray(rows) for rows in members.values() if len(rows) > 1]
+
+    parent = np.arange(len(ids))
+    for rows in partitions:
+        sub = matrix[rows]
+        block_rows = max(1, BLOCK_ELEMENTS // len(rows))
+        for start in range(0, len(rows), block_rows):
+            # 只计算上三角：块内的行与其后的全部行比较
+            scores = sub[start:start + block_rows] @ sub[start:].T
+            left, right = np.nonzero(scores >= threshold)
+            keep = right > left
+            for a, b in zip(rows[left[keep] + start], rows[right[keep] + start]):
+                root_a, root_b = _find_root(parent, a), _find_root(parent, b)
+                if root_a != root_b:
+                    parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    clusters = defaultdict(list)
+    for row in range(len(ids)):
+        clusters[_find_root(parent, row)].append(int(ids[row]))
+    return sorted(
+        (sorted(members) for members in clusters.values() if len(members) > 1),
+        key=lambda members: members[0]
+    )
+
+
+def load_vectors(session: Session):
+    """读取全部未删除的向量，返回 (ids, vectors, sources)"""
+    ids, vectors, sources = [], [], []
+    query = session.query(
+        VectorStore.id, VectorStore.source, VectorStore.embedding_bin, VectorStore.embedding_dtype,
+        json_fallback_column()
+    ).filter(VectorStore.is_deleted.is_(False)).order_by(VectorStore.id)
+    for row in query:
+        try:
+            vectors.append(load_embedding(row.embedding_bin, row.embedding_dtype, row.embedding))
+        except Exception as e:
+            logger.warning(f"跳过无效向量 {row.id}: {e}")
+            continue
+        ids.append(row.id)
+        sources.append(row.source)
+    return ids, vectors, sources
+
+
+def _load_meta(meta_info: Optional[str]) -> Dict:
+    try:
+        meta = json.loads(meta_info) if meta_info else {}
+    except (TypeError, ValueError):
+        meta = {}
+    return meta if isinstance(meta, dict) else {}
+
+
+def apply_dedup(session: Session, clusters: List[List[int]], action: str) -> Dict:
+    """
+    mark：重复条目写入 duplicate_of 后软删除；
+    merge：另外把重复条目的 keywords / tags 并入保留条目
+    软删除会更新 updated_at，各进程的向量缓存通过墓碑增量移除
+    """
+    if action not in DEDUP_ACTIONS:
+        raise ValueError(f"不支持的操作: {action}，仅支持 {', '.join(DEDUP_ACTIONS)}")
+    report = {"clusters": len(clusters), "duplicates": sum(len(c) - 1 for c in clusters), "updated": 0}
+    if action == "report":
+        return report
+
+    for keep_id, *duplicate_ids in clusters:
+        rows = {
+            row.id: row for row in session.query(VectorStore).filter(
+                VectorStore.id.in_([keep_id, *duplicate_ids]),
+                VectorStore.is_deleted.is_(False)
+            )
+        }
+        keep = rows.get(keep_id)
+        if keep is None:
+            continue
+        keep_meta = _load_meta(keep.meta_info)
+        merged = False
+        for duplicate_id in duplicate_ids:
+            row = rows.get(duplicate_id)
+            if row is None:
+                continue
+            meta = _load_meta(row.meta_info)
+            if action == "merge":
+                for field in MERGED_META_FIELDS:
+                    extra = [value for value in meta.get(field) or [] if value not in (keep_meta.get(field) or [])]
+                    if extra:
+                        keep_meta[field] = list(keep_meta.get(field) or []) + extra
+                        merged = True
+            meta["duplicate_of"] = keep_id
+            row.meta_info = json.dumps(meta, ensure_ascii=False)
+            row.is_deleted = True
+            report["updated"] += 1
+        if merged:
+            keep.meta_info = json.dumps(keep_meta, ensure_ascii=False)
+        session.commit()
+    return report
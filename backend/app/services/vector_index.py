@@ -0,0 +1,638 @@
+"""
+向量索引抽象
+提供精确检索、HNSW、IVF-PQ 以及纯 numpy 的 int8 / PQ 量化索引，统一支持构建、增量添加、
+磁盘保存/加载，并可以针对精确检索输出召回率、延迟与内存报告
+"""
+
+import json
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.vector_matrix import normalize_rows, normalize_vector, top_k_indices
+from app.services.vector_quantization import Int8Quantizer, ProductQuantizer
+
+try:
+    import faiss
+except ImportError:  # pragma: no cover - faiss 为可选依赖
+    faiss = None
+
+logger = logging.getLogger(__name__)
+
+META_FILENAME = "meta.json"
+# faiss 训练 IVF 时每个聚类中心至少需要的样本数
+TRAIN_POINTS_PER_CENTROID = 39
+
+
+class VectorIndex(ABC):
+    """向量索引基类，所有实现均使用内积（向量已归一化即为余弦相似度）"""
+
+    index_type = "base"
+    # 索引中只保存量化编码，检索后需要用全精度向量重排
+    quantized = False
+
+    def __init__(self, dimension: Optional[int] = None):
+        self.dimension = dimension
+        self.ids = np.empty(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return int(self.ids.shape[0])
+
+    def build(self, ids: Sequence[int], vectors) -> None:
+        """用全部向量重新构建索引"""
+        self.reset()
+        self.add(ids, vectors)
+
+    @abstractmethod
+    def reset(self) -> None:
+        """清空索引"""
+
+    @abstractmethod
+    def add(self, ids: Sequence[int], vectors) -> None:
+        """增量添加向量"""
+
+    @abstractmethod
+    def search(self, query, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """返回 (ids, scores)，按分数降序排列"""
+
+    @abstractmethod
+    def _save_data(self, directory: str) -> None:
+        """保存索引数据文件"""
+
+    @abstractmethod
+    def _load_data(self, directory: str) -> None:
+        """加载索引数据文件"""
+
+    def params(self) -> Dict:
+        """索引参数，保存时写入元数据"""
+        return {}
+
+    def save(self, directory: str) -> None:
+        """保存索引到目录"""
+        os.makedirs(directory, exist_ok=True)
+        self._save_data(directory)
+        meta = {
+            "index_type": self.index_type,
+            "dimension": self.dimension,
+            "params": self.params(),
+        }
+        np.save(os.path.join(directory, "ids.npy"), self.ids)
+        with open(os.path.join(directory, META_FILENAME), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        logger.info(f"向量索引已保存: {directory} ({self.index_type}, {len(self)} 个向量)")
+
+    @staticmethod
+    def load(directory: str) -> "VectorIndex":
+        """从目录加载索引，根据元数据选择实现"""
+        with open(os.path.join(directory, META_FILENAME), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        index = create_vector_index(meta["index_type"], dimension=meta["dimension"], **meta["params"])
+        index.ids = np.load(os.path.join(directory, "ids.npy"))
+        index._load_data(directory)
+        logger.info(f"向量索引已加载: {directory} ({index.index_type}, {len(index)} 个向量)")
+        return index
+
+    def needs_rebuild(self) -> bool:
+        """索引结构是否已不适合当前规模（如训练时数据过少），需要用全部向量重新构建"""
+        return False
+
+    def clone_empty(self) -> "VectorIndex":
+        """创建同类型、同参数的空索引"""
+        return create_vector_index(self.index_type, dimension=self.dimension, **self.params())
+
+    @property
+    def nbytes(self) -> int:
+        """索引占用的内存字节数（含 id 数组）"""
+        return int(self.ids.nbytes)
+
+    def info(self) -> Dict:
+        return {
+            "index_type": self.index_type,
+            "size": len(self),
+            "dimension": self.dimension,
+            "params": self.params(),
+            "bytes": self.nbytes,
+        }
+
+    def _prepare(self, ids: Sequence[int], vectors) -> Tuple[np.ndarray, np.ndarray]:
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = normalize_rows(vectors)
+        if ids.shape[0] != vectors.shape[0]:
+            raise ValueError("ids 与向量数量不一致")
+        if self.dimension is None:
+            self.dimension = int(vectors.shape[1])
+        elif vectors.shape[1] != self.dimension:
+            raise ValueError(f"向量维度 {vectors.shape[1]} 与索引维度 {self.dimension} 不一致")
+        return ids, vectors
+
+
+class ExactIndex(VectorIndex):
+    """精确检索：numpy 矩阵乘法 + argpartition"""
+
+    index_type = "exact"
+
+    def __init__(self, dimension: Optional[int] = None):
+        super().__init__(dimension)
+        self.matrix = np.zeros((0, dimension or 0), dtype=np.float32)
+
+    @classmethod
+    def from_matrix(cls, ids, matrix) -> "ExactIndex":
+        """直接引用已归一化的矩阵构造索引，不复制数据"""
+        index = cls(int(matrix.shape[1]) if matrix.ndim == 2 else None)
+        index.ids = np.asarray(ids, dtype=np.int64)
+        index.matrix = matrix
+        return index
+
+    def reset(self) -> None:
+        self.ids = np.empty(0, dtype=np.int64)
+        self.matrix = np.zeros((0, self.dimension or 0), dtype=np.float32)
+
+    def add(self, ids: Sequence[int], vectors) -> None:
+        if len(ids) == 0:
+            return
+        ids, vectors = self._prepare(ids, vectors)
+        if len(self) == 0:
+            self.matrix = vectors
+        else:
+            self.matrix = np.vstack([self.matrix, vectors])
+        self.ids = np.concatenate([self.ids, ids])
+
+    def search(self, query, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if len(self) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        scores = self.matrix @ normalize_vector(query)
+        rows = top_k_indices(scores, k)
+        return self.ids[rows], scores[rows]
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.ids.nbytes + self.matrix.nbytes)
+
+    def _save_data(self, directory: str) -> None:
+        np.save(os.path.join(directory, "vectors.npy"), self.matrix)
+
+    def _load_data(self, directory: str) -> None:
+        self.matrix = np.load(os.path.join(directory, "vectors.npy"))
+
+
+class _FaissIndex(VectorIndex):
+    """基于 faiss 的索引公共逻辑"""
+
+    def __init__(self, dimension: Optional[int] = None):
+        if faiss is None:
+            raise ImportError("未安装 faiss-cpu，无法使用近似最近邻索引")
+        super().__init__(dimension)
+        self.index = None
+
+    @abstractmethod
+    def _create(self):
+        """创建空的 faiss 索引"""
+
+    def reset(self) -> None:
+        self.ids = np.empty(0, dtype=np.int64)
+        self.index = None
+
+    def _ensure_index(self):
+        if self.index is None:
+            self.index = self._create()
+        return self.index
+
+    def add(self, ids: Sequence[int], vectors) -> None:
+        if len(ids) == 0:
+            return
+        ids, vectors = self._prepare(ids, vectors)
+        self._ensure_index().add_with_ids(vectors, ids)
+        self.ids = np.concatenate([self.ids, ids])
+
+    @property
+    def nbytes(self) -> int:
+        size = int(self.ids.nbytes)
+        if self.index is not None:
+            size += self._index_bytes()
+        return size
+
+    @abstractmethod
+    def _index_bytes(self) -> int:
+        """按向量数与编码长度估算 faiss 索引的内存占用，不序列化整个索引"""
+
+    def _apply_search_params(self) -> None:
+        pass
+
+    def search(self, query, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if self.index is None or len(self) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        self._apply_search_params()
+        query = normalize_vector(query).reshape(1, -1)
+        scores, ids = self.index.search(query, min(k, len(self)))
+        valid = ids[0] >= 0
+        return ids[0][valid], scores[0][valid]
+
+    def _save_data(self, directory: str) -> None:
+        if self.index is not None:
+            faiss.write_index(self.index, os.path.join(directory, "index.faiss"))
+
+    def _load_data(self, directory: str) -> None:
+        path = os.path.join(directory, "index.faiss")
+        self.index = faiss.read_index(path) if os.path.exists(path) else None
+
+
+class HNSWIndex(_FaissIndex):
+    """HNSW 图索引，检索复杂度近似 O(log n)"""
+
+    index_type = "hnsw"
+
+    def __init__(
+        self,
+        dimension: Optional[int] = None,
+        m: int = 32,
+        ef_construction: int = 200,
+        ef_search: int = 64,
+    ):
+        super().__init__(dimension)
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+
+    def params(self) -> Dict:
+        return {"m": self.m, "ef_construction": self.ef_construction, "ef_search": self.ef_search}
+
+    def _create(self):
+        hnsw = faiss.IndexHNSWFlat(self.dimension, self.m, faiss.METRIC_INNER_PRODUCT)
+        hnsw.hnsw.efConstruction = self.ef_construction
+        return faiss.IndexIDMap2(hnsw)
+
+    def _apply_search_params(self) -> None:
+        faiss.downcast_index(self.index.index).hnsw.efSearch = max(self.ef_search, 1)
+
+    def _index_bytes(self) -> int:
+        # 原始向量 + IDMap2 的 id 映射 + 图的邻居表、层级与偏移数组
+        hnsw = faiss.downcast_index(self.index.index).hnsw
+        n = int(self.index.ntotal)
+        return (
+            n * (self.dimension * 4 + 8)
+            + int(hnsw.neighbors.size()) * 4
+            + int(hnsw.levels.size()) * 4
+            + int(hnsw.offsets.size()) * 8
+        )
+
+
+class IVFPQIndex(_FaissIndex):
+    """
+    IVF-PQ 倒排 + 乘积量化索引，内存占用最小
+    训练数据不足时，新向量先暂存在精确索引中，凑够后再训练
+    """
+
+    index_type = "ivfpq"
+    quantized = True
+
+    def __init__(
+        self,
+        dimension: Optional[int] = None,
+        nlist: int = 1024,
+        nprobe: int = 16,
+        pq_m: int = 64,
+        pq_nbits: int = 8,
+    ):
+        super().__init__(dimension)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.pq_nbits = pq_nbits
+        self._pending = ExactIndex(dimension)
+        # 训练时实际使用的聚类中心数
+        self._trained_nlist = 0
+
+    def params(self) -> Dict:
+        return {"nlist": self.nlist, "nprobe": self.nprobe, "pq_m": self.pq_m, "pq_nbits": self.pq_nbits}
+
+    def reset(self) -> None:
+        super().reset()
+        self._pending = ExactIndex(self.dimension)
+        self._trained_nlist = 0
+
+    def _sub_quantizers(self) -> int:
+        """子量化器数量必须整除维度"""
+        m = min(self.pq_m, self.dimension)
+        while self.dimension % m:
+            m -= 1
+        return m
+
+    def _min_train_size(self) -> int:
+        return max(2 ** self.pq_nbits, TRAIN_POINTS_PER_CENTROID)
+
+    def _target_nlist(self, n: int) -> int:
+        return max(1, min(self.nlist, n // TRAIN_POINTS_PER_CENTROID))
+
+    def _create(self):
+        n = len(self._pending)
+        nlist = self._target_nlist(n)
+        quantizer = faiss.IndexFlatIP(self.dimension)
+        index = faiss.IndexIVFPQ(
+            quantizer, self.dimension, nlist, self._sub_quantizers(), self.pq_nbits,
+            faiss.METRIC_INNER_PRODUCT
+        )
+        train_size = min(n, max(self.nlist, 2 ** self.pq_nbits) * 64)
+        rows = np.random.default_rng(0).choice(n, train_size, replace=False)
+        index.train(self._pending.matrix[np.sort(rows)])
+        logger.info(f"IVF-PQ 索引训练完成: nlist={nlist}, 训练样本={train_size}")
+        self._trained_nlist = nlist
+        return index
+
+    def needs_rebuild(self) -> bool:
+        """
+        训练时数据较少只能使用很少的聚类中心，之后增量添加的向量都挤在这些倒排桶里；
+        规模增长到可用的聚类中心数翻倍后需要重新训练
+        """
+        return self.index is not None and self._target_nlist(len(self)) >= 2 * self._trained_nlist
+
+    def add(self, ids: Sequence[int], vectors) -> None:
+        if len(ids) == 0:
+            return
+        ids, vectors = self._prepare(ids, vectors)
+        if self.index is not None:
+            self.index.add_with_ids(vectors, ids)
+            self.ids = np.concatenate([self.ids, ids])
+            return
+
+        self._pending.add(ids, vectors)
+        self.ids = np.concatenate([self.ids, ids])
+        if len(self._pending) >= self._min_train_size():
+            self.index = self._create()
+            self.index.add_with_ids(self._pending.matrix, self._pending.ids)
+            self._pending.reset()
+
+    def _apply_search_params(self) -> None:
+        self.index.nprobe = max(self.nprobe, 1)
+
+    def _index_bytes(self) -> int:
+        # 倒排表中每个向量的 PQ 编码与 id + 粗聚类中心 + PQ 码本
+        index, pq = self.index, self.index.pq
+        return (
+            int(index.ntotal) * (int(index.code_size) + 8)
+            + int(index.nlist) * self.dimension * 4
+            + int(pq.M) * int(pq.ksub) * int(pq.dsub) * 4
+        )
+
+    def search(self, query, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if self.index is None:
+            return self._pending.search(query, k)
+        return super().search(query, k)
+
+    @property
+    def nbytes(self) -> int:
+        return super().nbytes + self._pending.matrix.nbytes
+
+    def _save_data(self, directory: str) -> None:
+        super()._save_data(directory)
+        self._pending.save(os.path.join(directory, "pending"))
+
+    def _load_data(self, directory: str) -> None:
+        super()._load_data(directory)
+        self._trained_nlist = int(self.index.nlist) if self.index is not None else 0
+        pending_dir = os.path.join(directory, "pending")
+        if os.path.exists(os.path.join(pending_dir, META_FILENAME)):
+            self._pending = VectorIndex.load(pending_dir)
+
+
+class Int8Index(VectorIndex):
+    """逐向量缩放的 int8 标量量化索引，内存约为精确索引的 1/4"""
+
+    index_type = "int8"
+    quantized = True
+
+    def __init__(self, dimension: Optional[int] = None):
+        super().__init__(dimension)
+        self.codes = np.zeros((0, dimension or 0), dtype=np.int8)
+        self.scales = np.empty(0, dtype=np.float32)
+
+    def reset(self) -> None:
+        self.ids = np.empty(0, dtype=np.int64)
+        self.codes = np.zeros((0, self.dimension or 0), dtype=np.int8)
+        self.scales = np.empty(0, dtype=np.float32)
+
+    def add(self, ids: Sequence[int], vectors) -> None:
+        if len(ids) == 0:
+            return
+        ids, vectors = self._prepare(ids, vectors)
+        codes, scales = Int8Quantizer.encode(vectors)
+        self.codes = codes if len(self) == 0 else np.vstack([self.codes, codes])
+        self.scales = np.concatenate([self.scales, scales])
+        self.ids = np.concatenate([self.ids, ids])
+
+    def search(self, query, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if len(self) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        scores = Int8Quantizer.scores(self.codes, self.scales, normalize_vector(query))
+        rows = top_k_indices(scores, k)
+        return self.ids[rows], scores[rows]
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.ids.nbytes + self.codes.nbytes + self.scales.nbytes)
+
+    def _save_data(self, directory: str) -> None:
+        np.save(os.path.join(directory, "codes.npy"), self.codes)
+        np.save(os.path.join(directory, "scales.npy"), self.scales)
+
+    def _load_data(self, directory: str) -> None:
+        self.codes = np.load(os.path.join(directory, "codes.npy"))
+        self.scales = np.load(os.path.join(directory, "scales.npy"))
+
+
+class PQIndex(VectorIndex):
+    """
+    纯 numpy 的乘积量化索引（暴力扫描编码，不分桶），无需 faiss
+    训练数据不足时，新向量先暂存在精确索引中，凑够后再训练
+    """
+
+    index_type = "pq"
+    quantized = True
+
+    def __init__(self, dimension: Optional[int] = None, pq_m: int = 64, pq_nbits: int = 8):
+        super().__init__(dimension)
+        self.pq_m = pq_m
+        self.pq_nbits = pq_nbits
+        self.quantizer: Optional[ProductQuantizer] = None
+        self.codes = np.zeros((0, 0), dtype=np.uint8)
+        self._pending = ExactIndex(dimension)
+
+    def params(self) -> Dict:
+        return {"pq_m": self.pq_m, "pq_nbits": self.pq_nbits}
+
+    def reset(self) -> None:
+        self.ids = np.empty(0, dtype=np.int64)
+        self.quantizer = None
+        self.codes = np.zeros((0, 0), dtype=np.uint8)
+        self._pending = ExactIndex(self.dimension)
+
+    def _min_train_size(self) -> int:
+        return 2 ** self.pq_nbits
+
+    def add(self, ids: Sequence[int], vectors) -> None:
+        if len(ids) == 0:
+            return
+        ids, vectors = self._prepare(ids, vectors)
+        self.ids = np.concatenate([self.ids, ids])
+        if self.quantizer is not None:
+            codes = self.quantizer.encode(vectors)
+            self.codes = codes if len(self.codes) == 0 else np.vstack([self.codes, codes])
+            return
+
+        self._pending.add(ids, vectors)
+        if len(self._pending) >= self._min_train_size():
+            quantizer = ProductQuantizer(self.dimension, self.pq_m, self.pq_nbits)
+            quantizer.train(self._pending.matrix)
+            logger.info(f"PQ 量化器训练完成: m={quantizer.m}, 训练样本={len(self._pending)}")
+            self.quantizer = quantizer
+            self.codes = quantizer.encode(self._pending.matrix)
+            # 编码按 id 顺序与 self.ids 对齐
+            self.ids = self._pending.ids.copy()
+            self._pending.reset()
+
+    def search(self, query, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if self.quantizer is None:
+            return self._pending.search(query, k)
+        scores = self.quantizer.scores(self.codes, normalize_vector(query))
+        rows = top_k_indices(scores, k)
+        return self.ids[rows], scores[rows]
+
+    @property
+    def nbytes(self) -> int:
+        size = int(self.ids.nbytes + self.codes.nbytes + self._pending.matrix.nbytes)
+        return size + (self.quantizer.nbytes if self.quantizer is not None else 0)
+
+    def _save_data(self, directory: str) -> None:
+        if self.quantizer is not None:
+            np.save(os.path.join(directory, "codebooks.npy"), self.quantizer.codebooks)
+            np.save(os.path.join(directory, "codes.npy"), self.codes)
+        self._pending.save(os.path.join(directory, "pending"))
+
+    def _load_data(self, directory: str) -> None:
+        codebooks_path = os.path.join(directory, "codebooks.npy")
+        if os.path.exists(codebooks_path):
+            self.quantizer = ProductQuantizer(self.dimension, self.pq_m, self.pq_nbits)
+            self.quantizer.codebooks = np.load(codebooks_path)
+            self.codes = np.load(os.path.join(directory, "codes.npy"))
+        pending_dir = os.path.join(directory, "pending")
+        if os.path.exists(os.path.join(pending_dir, META_FILENAME)):
+            self._pending = VectorIndex.load(pending_dir)
+
+
+INDEX_TYPES = {
+    ExactIndex.index_type: ExactIndex,
+    HNSWIndex.index_type: HNSWIndex,
+    IVFPQIndex.index_type: IVFPQIndex,
+    Int8Index.index_type: Int8Index,
+    PQIndex.index_type: PQIndex,
+}
+
+
+def create_vector_index(index_type: str, dimension: Optional[int] = None, **params) -> VectorIndex:
+    """根据类型创建索引；faiss 不可用时降级为精确检索"""
+    index_cls = INDEX_TYPES.get(index_type)
+    if index_cls is None:
+        raise ValueError(f"不支持的向量索引类型: {index_type}")
+    if issubclass(index_cls, _FaissIndex) and faiss is None:
+        logger.warning(f"未安装 faiss-cpu，{index_type} 索引降级为精确检索")
+        return ExactIndex(dimension)
+    return index_cls(dimension, **params)
+
+
+def _percentile_ms(latencies: List[float], q: float) -> float:
+    return round(float(np.percentile(latencies, q)) * 1000, 3) if latencies else 0.0
+
+
+def evaluate_index(
+    index: VectorIndex,
+    reference: ExactIndex,
+    queries,
+    k: int = 10,
+    rescore_factor: int = 1,
+) -> Dict:
+    """
+    以精确检索为基准，统计索引的 recall@k、单次查询延迟与内存占用
+    rescore_factor > 1 时同时统计召回 k * rescore_factor 个候选、再用全精度向量重排后的召回率
+    """
+    queries = np.asarray(queries, dtype=np.float32)
+    if queries.ndim == 1:
+        queries = queries.reshape(1, -1)
+    reference_rows = {int(vid): row for row, vid in enumerate(reference.ids.tolist())}
+
+    recalls, rescored_recalls, index_latencies, exact_latencies = [], [], [], []
+    for query in queries:
+        start = time.perf_counter()
+        expected, _ = reference.search(query, k)
+        exact_latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        found, _ = index.search(query, k)
+        index_latencies.append(time.perf_counter() - start)
+
+        if not len(expected):
+            continue
+        expected = set(expected.tolist())
+        recalls.append(len(set(found.tolist()) & expected) / len(expected))
+
+        if rescore_factor > 1:
+            candidates, _ = index.search(query, k * rescore_factor)
+            rows = [reference_rows[int(vid)] for vid in candidates if int(vid) in reference_rows]
+            scores = reference.matrix[rows] @ normalize_vector(query)
+            top = {int(reference.ids[rows[i]]) for i in top_k_indices(scores, k)}
+            rescored_recalls.append(len(top & expected) / len(expected))
+
+    report = {
+        "index_type": index.index_type,
+        "size": len(index),
+        "bytes": index.nbytes,
+        "bytes_per_vector": round(index.nbytes / len(index), 1) if len(index) else 0.0,
+        "queries": int(queries.shape[0]),
+        "k": k,
+        "recall_at_k": round(float(np.mean(recalls)), 4) if recalls else None,
+        "latency_ms": {
+            "p50": _percentile_ms(index_latencies, 50),
+            "p95": _percentile_ms(index_latencies, 95),
+        },
+        "exact_latency_ms": {
+            "p50": _percentile_ms(exact_latencies, 50),
+            "p95": _percentile_ms(exact_latencies, 95),
+        },
+    }
+    if rescore_factor > 1:
+        report["rescore_factor"] = rescore_factor
+        report["rescored_recall_at_k"] = round(float(np.mean(rescored_recalls)), 4) if rescored_recalls else None
+    return report
+
+
+def compare_indexes(
+    ids,
+    vectors,
+    queries,
+    k: int = 10,
+    rescore_factor: int = 4,
+    index_params: Optional[Dict[str, Dict]] = None,
+) -> List[Dict]:
+    """
+    用同一批向量构建多种索引，并排输出内存、压缩比、召回率与延迟，便于按部署选择取舍
+    index_params 为 {索引类型: 参数}，默认比较 exact / int8 / pq
+    """
+    reference = ExactIndex.from_matrix(np.asarray(ids, dtype=np.int64), normalize_rows(vectors))
+    index_params = index_params or {"exact": {}, "int8": {}, "pq": {}}
+    reports = []
+    for index_type, params in index_params.items():
+        if index_type == ExactIndex.index_type:
+            index = reference
+        else:
+            index = create_vector_index(index_type, dimension=reference.dimension, **params)
+            start = time.perf_counter()
+            index.build(reference.ids, reference.matrix)
+            build_seconds = time.perf_counter() - start
+        report = evaluate_index(index, reference, queries, k, 1 if index is reference else rescore_factor)
+        report["compression"] = round(reference.nbytes / index.nbytes, 2) if index.nbytes else None
+        if index is not reference:
+            report["build_seconds"] = round(build_seconds, 3)
+        reports.append(report)
+    return reports
@@ -0,0 +1,438 @@
+"""
+向量矩阵引擎
+将向量缓存保存为一个预归一化的 float32 连续矩阵，
+配合并行的 id / content / source 数组，检索时只需一次矩阵-向量乘法
+
+矩阵底层是一个只在末尾追加的可增长缓冲区，多个快照可以共享同一缓冲区：
+增量刷新只追加新行并生成新的存活掩码，旧快照只读取自己范围内的行，不受影响；
+从共享快照文件映射的矩阵是只读的，第一次追加时复制到进程内的缓冲区；
+指定 spill_dir 时缓冲区写入该目录下的匿名临时文件并以内存映射访问（量化索引只需在重排时读取少量行），
+全精度矩阵不常驻进程内存
+"""
+
+import tempfile
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+MIN_CAPACITY = 1024
+# 新建或压缩缓冲区时在行数之外预留的余量，足够容纳若干次增量刷新
+HEADROOM_RATIO = 1.25
+# 追加时容量不足，按该倍数扩容
+GROWTH_FACTOR = 2
+# 失效行占比超过该值时压缩缓冲区
+COMPACT_RATIO = 0.25
+
+
+def buffer_capacity(rows: int, grow: bool = False) -> int:
+    """缓冲区容量：新建或压缩时为行数加少量余量，只有追加放不下时才按倍数扩容"""
+    return max(MIN_CAPACITY, int(rows * (GROWTH_FACTOR if grow else HEADROOM_RATIO)))
+
+
+def normalize_vector(vector) -> np.ndarray:
+    """将单个向量转换为归一化的 float32 数组"""
+    vec = np.asarray(vector, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(vec)
+    if norm > 0:
+        vec = vec / norm
+    return vec
+
+
+def normalize_rows(matrix) -> np.ndarray:
+    """按行归一化矩阵，零向量保持为零"""
+    mat = np.asarray(matrix, dtype=np.float32)
+    if mat.ndim == 1:
+        mat = mat.reshape(1, -1)
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(mat / norms, dtype=np.float32)
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """使用 argpartition 取分数最高的 k 个下标，并按分数降序排列"""
+    n = scores.shape[0]
+    if n == 0 or k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k >= n:
+        return np.argsort(-scores)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+def mmr_rerank(
+    relevance: np.ndarray,
+    vectors: np.ndarray,
+    k: int,
+    lambda_: float,
+    duplicate_threshold: Optional[float] = None,
+) -> List[int]:
+    """
+    最大边际相关性（MMR）重排，返回选中候选的下标
+    每一步选择 lambda * 相关性 - (1 - lambda) * 与已选结果的最大相似度 最高的候选；
+    vectors 为归一化的候选向量，候选间相似度矩阵只计算一次；
+    与已选结果相似度不低于 duplicate_threshold 的候选视为近似重复，直接丢弃
+    """
+    n = len(relevance)
+    if n == 0 or k <= 0:
+        return []
+    relevance = np.asarray(relevance, dtype=np.float32)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    similarity = vectors @ vectors.T
+    redundancy = np.full(n, -np.inf, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    selected: List[int] = []
+    while len(selected) < k and available.any():
+        penalty = np.where(np.isfinite(redundancy), redundancy, 0.0)
+        scores = np.where(available, lambda_ * relevance - (1 - lambda_) * penalty, -np.inf)
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+        if duplicate_threshold is not None:
+            available &= redundancy < duplicate_threshold
+    return selected
+
+
+class _RowBuffer:
+    """可增长的行缓冲区，由多个快照共享，只允许在末尾追加"""
+
+    def __init__(self, dimension: int, capacity: int, spill_dir: Optional[str] = None):
+        self.spill_dir = spill_dir
+        if spill_dir is not None:
+            # 文件创建后即被删除，映射在缓冲区释放时一并回收
+            with tempfile.TemporaryFile(dir=spill_dir) as handle:
+                self.data = np.memmap(handle, dtype=np.float32, mode="w+", shape=(capacity, dimension))
+        else:
+            self.data = np.empty((capacity, dimension), dtype=np.float32)
+        self.ids = np.empty(capacity, dtype=np.int64)
+        self.contents: List[str] = []
+        self.sources: List[Optional[str]] = []
+        self.updated_at: List[Optional[datetime]] = []
+        # id -> 行号；同一 id 在缓冲区中有多个版本时为升序的行号元组，各快照取自己范围内最新的一行
+        self.row_by_id: Dict[int, Union[int, Tuple[int, ...]]] = {}
+        self.size = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.data.shape[0]
+
+    @property
+    def dimension(self) -> int:
+        return self.data.shape[1]
+
+    def append(self, ids, vectors, contents, sources, updated_at) -> None:
+        n = len(ids)
+        start, end = self.size, self.size + n
+        self.data[start:end] = vectors
+        self.ids[start:end] = ids
+        self.contents.extend(contents)
+        self.sources.extend(sources)
+        self.updated_at.extend(updated_at)
+        for offset, vid in enumerate(ids):
+            vid, row = int(vid), start + offset
+            previous = self.row_by_id.get(vid)
+            if previous is None:
+                self.row_by_id[vid] = row
+            elif isinstance(previous, tuple):
+                self.row_by_id[vid] = previous + (row,)
+            else:
+                self.row_by_id[vid] = (previous, row)
+        self.size = end
+
+    @classmethod
+    def wrap(cls, ids, data: np.ndarray, contents, sources, updated_at) -> "_RowBuffer":
+        """直接使用已归一化的数组（可以是只读内存映射），不复制，容量即为行数"""
+        buffer = cls.__new__(cls)
+        buffer.spill_dir = None
+        buffer.data = data
+        buffer.ids = ids
+        buffer.contents = list(contents)
+        buffer.sources = list(sources)
+        buffer.updated_at = list(updated_at)
+        buffer.row_by_id = {int(vid): row for row, vid in enumerate(ids)}
+        buffer.size = len(ids)
+        return buffer
+
+
+class VectorMatrix:
+    """预归一化的向量矩阵快照及其并行元数据数组"""
+
+    def __init__(
+        self,
+        ids: Sequence[int],
+        embeddings,
+        contents: Sequence[str],
+        sources: Sequence[Optional[str]],
+        updated_at: Optional[Sequence[Optional[datetime]]] = None,
+        spill_dir: Optional[str] = None,
+    ):
+        self._spill_dir = spill_dir
+        self._buffer: Optional[_RowBuffer] = None
+        self._count = 0
+        self._alive = np.ones(0, dtype=bool)
+        self._dead = 0
+        self._id_order: Optional[np.ndarray] = None
+        if len(ids):
+            vectors = normalize_rows(embeddings)
+            self._buffer = _RowBuffer(vectors.shape[1], buffer_capacity(len(ids)), spill_dir)
+            self._buffer.append(
+                ids, vectors, list(contents), list(sources),
+                list(updated_at) if updated_at is not None else [None] * len(ids)
+            )
+            self._count = len(ids)
+            self._alive = np.ones(self._count, dtype=bool)
+
+    @classmethod
+    def empty(cls, spill_dir: Optional[str] = None) -> "VectorMatrix":
+        return cls([], [], [], [], spill_dir=spill_dir)
+
+    @classmethod
+    def from_normalized(
+        cls,
+        ids,
+        matrix: np.ndarray,
+        contents: Sequence[str],
+        sources: Sequence[Optional[str]],
+        updated_at: Sequence[Optional[datetime]],
+        spill_dir: Optional[str] = None,
+    ) -> "VectorMatrix":
+        """由已归一化的矩阵构造快照，矩阵不复制（用于映射共享快照文件）"""
+        snapshot = cls.empty(spill_dir)
+        if len(ids):
+            snapshot._buffer = _RowBuffer.wrap(ids, matrix, contents, sources, updated_at)
+            snapshot._count = len(ids)
+            snapshot._alive = np.ones(snapshot._count, dtype=bool)
+        return snapshot
+
+    def __len__(self) -> int:
+        """存活向量数量"""
+        return self._count - self._dead
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """当前快照范围内的矩阵视图（包含已失效的行）"""
+        if self._buffer is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        return self._buffer.data[:self._count]
+
+    @property
+    def ids(self) -> np.ndarray:
+        if self._buffer is None:
+            return np.empty(0, dtype=np.int64)
+        return self._buffer.ids[:self._count]
+
+    @property
+    def contents(self) -> List[str]:
+        return self._buffer.contents if self._buffer is not None else []
+
+    @property
+    def sources(self) -> List[Optional[str]]:
+        return self._buffer.sources if self._buffer is not None else []
+
+    @property
+    def updated_at(self) -> List[Optional[datetime]]:
+        return self._buffer.updated_at if self._buffer is not None else []
+
+    @property
+    def dimension(self) -> int:
+        return self._buffer.dimension if self._buffer is not None else 0
+
+    @property
+    def is_mapped(self) -> bool:
+        """矩阵是否直接映射自共享快照文件"""
+        return self._buffer is not None and self._buffer.spill_dir is None and isinstance(self._buffer.data, np.memmap)
+
+    @property
+    def is_spilled(self) -> bool:
+        """矩阵是否写入了临时文件（不常驻进程内存）"""
+        return self._buffer is not None and self._buffer.spill_dir is not None
+
+    @property
+    def nbytes(self) -> int:
+        if self._buffer is None:
+            return 0
+        return int(self._buffer.data.nbytes + self._buffer.ids.nbytes + self._alive.nbytes)
+
+    def live_rows(self) -> np.ndarray:
+        """存活行的行号"""
+        if self._dead == 0:
+            return np.arange(self._count)
+        return np.flatnonzero(self._alive)
+
+    def live_vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        """存活行的 (ids, 矩阵)，没有失效行时直接返回视图"""
+        if self._dead == 0:
+            return self.ids, self.matrix
+        rows = self.live_rows()
+        return self.ids[rows], self.matrix[rows]
+
+    def row_of(self, vector_id: int) -> Optional[int]:
+        """id 对应的存活行号，不在当前快照中时返回 None"""
+        if self._buffer is None:
+            return None
+        rows = self._buffer.row_by_id.get(int(vector_id))
+        if rows is None:
+            return None
+        if isinstance(rows, tuple):
+            # 新快照追加的版本在本快照范围之外，取范围内最新的一行
+            rows = next((row for row in reversed(rows) if row < self._count), None)
+            if rows is None:
+                return None
+        if rows >= self._count or not self._alive[rows]:
+            return None
+        return rows
+
+    def rows_for_ids(self, ids: Iterable[int]) -> np.ndarray:
+        """
+        一批 id 对应的存活行号（升序），不在快照中的 id 被忽略
+        按 id 排序的存活行号在快照上只计算一次，之后每次映射只需一次 searchsorted
+        """
+        ids = np.fromiter(ids, dtype=np.int64)
+        if self._buffer is None or ids.size == 0:
+            return np.empty(0, dtype=np.int64)
+        if self._id_order is None:
+            # 只对存活行排序：同一 id 的旧版本行已失效，存活行的 id 唯一
+            live = self.live_rows()
+            self._id_order = live[np.argsort(self.ids[live])]
+        if self._id_order.size == 0:
+            return np.empty(0, dtype=np.int64)
+        sorted_ids = self.ids[self._id_order]
+        positions = np.clip(np.searchsorted(sorted_ids, ids), 0, len(sorted_ids) - 1)
+        return np.sort(self._id_order[positions[sorted_ids[positions] == ids]])
+
+    def result(self, row: int, score: float) -> Dict:
+        """构造与 HealthAgent、/rag/test 一致的结果字典"""
+        return {
+            "id": int(self.ids[row]),
+            "content": self.contents[row],
+            "similarity": float(score),
+            "source": self.sources[row],
+        }
+
+    def _query_vector(self, query_embedding) -> np.ndarray:
+        query = normalize_vector(query_embedding)
+        if query.shape[0] != self.dimension:
+            raise ValueError(f"查询向量维度 {query.shape[0]} 与缓存维度 {self.dimension} 不一致")
+        return query
+
+    def rescore_rows(self, ids: Iterable[int], query_embedding, k: int) -> List[Tuple[int, float]]:
+        """
+        将索引返回的候选 id 用全精度向量重新打分，返回 [(行号, 分数)]
+        同时去掉已删除、已更新（旧版本）和重复的候选
+        """
+        rows, seen = [], set()
+        for vid in ids:
+            row = self.row_of(vid)
+            if row is not None and row not in seen:
+                seen.add(row)
+                rows.append(row)
+        if not rows:
+            return []
+
+        rows = np.asarray(rows)
+        scores = self.matrix[rows] @ self._query_vector(query_embedding)
+        order = top_k_indices(scores, k)
+        return [(int(rows[i]), float(scores[i])) for i in order]
+
+    def top_rows(self, query_embedding, k: int, rows: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """计算余弦相似度并返回前 k 个 [(行号, 分数)]；给定 rows 时只对这些存活行打分"""
+        if len(self) == 0:
+            return []
+        if rows is not None:
+            if len(rows) == 0:
+                return []
+            scores = self.matrix[rows] @ self._query_vector(query_embedding)
+            return [(int(rows[i]), float(scores[i])) for i in top_k_indices(scores, k)]
+
+        scores = self.matrix @ self._query_vector(query_embedding)
+        if self._dead:
+            scores[~self._alive] = -np.inf
+        rows = top_k_indices(scores, min(k, len(self)))
+        return [(int(row), float(scores[row])) for row in rows]
+
+    def results_for_ids(self, ids: Iterable[int], query_embedding, k: int) -> List[Dict]:
+        """候选 id 重新打分后的结果字典"""
+        return [self.result(row, score) for row, score in self.rescore_rows(ids, query_embedding, k)]
+
+    def search(self, query_embedding, k: int) -> List[Dict]:
+        """计算余弦相似度并返回前 k 个结果"""
+        return [self.result(row, score) for row, score in self.top_rows(query_embedding, k)]
+
+    def is_current(self, vector_id: int, updated_at: Optional[datetime]) -> bool:
+        """该 id 的同一版本是否已在快照中"""
+        row = self.row_of(vector_id)
+        return row is not None and updated_at is not None and self._buffer.updated_at[row] == updated_at
+
+    def apply_delta(
+        self,
+        ids: Sequence[int],
+        embeddings,
+        contents: Sequence[str],
+        sources: Sequence[Optional[str]],
+        updated_at: Optional[Sequence[Optional[datetime]]] = None,
+        deleted_ids: Iterable[int] = (),
+    ) -> "VectorMatrix":
+        """
+        应用增量变更并返回新快照，成本与变更量成正比
+        新增和更新的行追加到缓冲区末尾，被更新或删除的旧行在新快照的掩码中标记为失效
+        """
+        deleted_ids = [int(vid) for vid in deleted_ids]
+        if len(ids) == 0 and not deleted_ids:
+            return self
+        if updated_at is None:
+            updated_at = [None] * len(ids)
+
+        vectors = normalize_rows(embeddings) if len(ids) else None
+        if self._buffer is None:
+            if vectors is None:
+                return self
+            return VectorMatrix(ids, vectors, contents, sources, updated_at, spill_dir=self._spill_dir)
+
+        if vectors is not None and vectors.shape[1] != self.dimension:
+            raise ValueError(f"向量维度 {vectors.shape[1]} 与缓存维度 {self.dimension} 不一致")
+
+        alive = self._alive.copy()
+        dead = self._dead
+        for vid in list(ids) + deleted_ids:
+            row = self.row_of(vid)
+            if row is not None and alive[row]:
+                alive[row] = False
+                dead += 1
+
+        snapshot = VectorMatrix.empty(self._spill_dir)
+        buffer = self._buffer
+        new_rows = len(ids)
+        fits = buffer.size + new_rows <= buffer.capacity
+        shared = buffer.size == self._count and fits
+        if shared and dead <= COMPACT_RATIO * (self._count + new_rows):
+            snapshot._buffer = buffer
+            snapshot._count = self._count
+            snapshot._alive = alive
+            snapshot._dead = dead
+        else:
+            snapshot._rebuild_from(self, alive, extra=new_rows, grow=not fits)
+
+        if new_rows:
+            snapshot._buffer.append(ids, vectors, list(contents), list(sources), list(updated_at))
+            snapshot._count += new_rows
+            snapshot._alive = np.concatenate([snapshot._alive, np.ones(new_rows, dtype=bool)])
+        return snapshot
+
+    def _rebuild_from(self, source: "VectorMatrix", alive: np.ndarray, extra: int, grow: bool = False) -> None:
+        """将源快照的存活行压缩复制到新的缓冲区，grow 为真（追加放不下）时按倍数扩容"""
+        rows = np.flatnonzero(alive)
+        capacity = buffer_capacity(len(rows) + extra, grow)
+        buffer = _RowBuffer(source.dimension, capacity, self._spill_dir)
+        old = source._buffer
+        buffer.append(
+            old.ids[rows],
+            old.data[rows],
+            [old.contents[row] for row in rows],
+            [old.sources[row] for row in rows],
+            [old.updated_at[row] for row in rows],
+        )
+        self._buffer = buffer
+        self._count = len(rows)
+        self._alive = np.ones(self._count, dtype=bool)
+        self._dead = 0
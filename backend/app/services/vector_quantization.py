@@ -0,0 +1,124 @@
+"""
+向量量化
+逐向量缩放的 int8 标量量化（内存为 float32 的 1/4），以及乘积量化 PQ
+（每个向量只保存 m 个码字下标，1536 维、m=64 时约为 float32 的 1/96）；
+两者都只用于召回候选，最终分数由全精度向量重新计算
+"""
+
+from typing import Optional
+
+import numpy as np
+
+# int8 打分时每次转换的行数：临时数组小到可以留在 CPU 缓存中，也避免生成与全量矩阵同样大小的副本
+SCORE_BLOCK_ROWS = 1024
+
+
+class Int8Quantizer:
+    """每个向量单独计算缩放系数：scale = max(|v|) / 127"""
+
+    @staticmethod
+    def encode(vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    @staticmethod
+    def decode(codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+        return codes.astype(np.float32) * scales[:, None]
+
+    @staticmethod
+    def scores(codes: np.ndarray, scales: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """近似内积，分块转换为 float32 计算"""
+        out = np.empty(codes.shape[0], dtype=np.float32)
+        for start in range(0, codes.shape[0], SCORE_BLOCK_ROWS):
+            block = codes[start:start + SCORE_BLOCK_ROWS]
+            out[start:start + len(block)] = (block.astype(np.float32) @ query) * scales[start:start + len(block)]
+        return out
+
+
+class ProductQuantizer:
+    """
+    乘积量化
+    向量切成 m 段，每段用 k-means 学习 2^nbits 个中心，向量编码为 m 个中心下标；
+    查询时先计算查询与各段中心的内积查找表，再按编码累加（非对称距离计算）
+    """
+
+    def __init__(self, dimension: int, m: int = 64, nbits: int = 8, iterations: int = 12, seed: int = 0):
+        if nbits > 8:
+            raise ValueError("PQ 编码位数不能超过 8")
+        m = max(1, min(m, dimension))
+        while dimension % m:
+            m -= 1
+        self.dimension = dimension
+        self.m = m
+        self.nbits = nbits
+        self.iterations = iterations
+        self.seed = seed
+        self.codebooks: Optional[np.ndarray] = None  # (m, ksub, dsub)
+
+    @property
+    def dsub(self) -> int:
+        return self.dimension // self.m
+
+    @property
+    def is_trained(self) -> bool:
+        return self.codebooks is not None
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.codebooks.nbytes) if self.codebooks is not None else 0
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        """(n, d) -> (m, n, dsub)"""
+        return np.asarray(vectors, dtype=np.float32).reshape(-1, self.m, self.dsub).transpose(1, 0, 2)
+
+    def train(self, vectors: np.ndarray, max_samples: Optional[int] = None) -> None:
+        """逐段运行 k-means；样本不足 2^nbits 时中心数取样本数"""
+        rng = np.random.default_rng(self.seed)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        ksub = min(2 ** self.nbits, vectors.shape[0])
+        max_samples = max_samples or ksub * 64
+        if vectors.shape[0] > max_samples:
+            vectors = vectors[np.sort(rng.choice(vectors.shape[0], max_samples, replace=False))]
+
+        codebooks = np.empty((self.m, ksub, self.dsub), dtype=np.float32)
+        for j, sub in enumerate(self._split(vectors)):
+            centroids = sub[rng.choice(sub.shape[0], ksub, replace=False)].copy()
+            for _ in range(self.iterations):
+                assign = self._nearest(sub, centroids)
+                counts = np.bincount(assign, minlength=ksub)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assign, sub)
+                filled = counts > 0
+                centroids[filled] = sums[filled] / counts[filled, None]
+                # 空簇重新随机选点
+                if not filled.all():
+                    centroids[~filled] = sub[rng.choice(sub.shape[0], int((~filled).sum()))]
+            codebooks[j] = centroids
+        self.codebooks = codebooks
+
+    @staticmethod
+    def _nearest(points: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        distances = (
+            (points ** 2).sum(axis=1, keepdims=True)
+            - 2 * points @ centroids.T
+            + (centroids ** 2).sum(axis=1)
+        )
+        return distances.argmin(axis=1)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.empty((np.asarray(vectors).shape[0], self.m), dtype=np.uint8)
+        for j, sub in enumerate(self._split(vectors)):
+            codes[:, j] = self._nearest(sub, self.codebooks[j])
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        parts = [self.codebooks[j][codes[:, j]] for j in range(self.m)]
+        return np.concatenate(parts, axis=1)
+
+    def scores(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """非对称距离计算：查找表 (m, ksub) 按编码累加"""
+        table = np.einsum("mkd,md->mk", self.codebooks, query.reshape(self.m, self.dsub))
+        return table[np.arange(self.m), codes].sum(axis=1)
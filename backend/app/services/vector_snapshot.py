@@ -0,0 +1,203 @@
+"""
+多进程共享的向量快照
+由一个 worker 将预归一化的向量矩阵、id、内容偏移写入带版本号的文件，其余元数据写入同版本的 JSON；
+各 worker 以只读方式 np.memmap 矩阵文件，同一主机上由操作系统页缓存共享一份物理内存
+
+发布流程：先写临时文件再 os.replace 为版本文件，最后原子替换 current.json 清单；
+worker 定期读取清单比较版本号，新版本直接映射文件，无需每个进程各自查询数据库。
+构建锁（flock）保证同一时间只有一个 worker 查询数据库并发布新版本
+"""
+
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows 下没有 flock，退化为单进程场景，不加锁
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "current.json"
+LOCK_NAME = "build.lock"
+# 保留最近的版本数，旧版本可能仍被其他 worker 映射
+KEEP_VERSIONS = 2
+
+# 二进制文件布局：矩阵 float32 (n, d) | ids int64 (n) | 内容偏移 int64 (n + 1) | UTF-8 内容
+_FLOAT_BYTES = np.dtype(np.float32).itemsize
+_INT_BYTES = np.dtype(np.int64).itemsize
+
+
+def _to_iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def _from_iso(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+class VectorSnapshotStore:
+    """快照目录：current.json 清单、build.lock 构建锁，以及 snapshot-<版本>.bin / .json"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock_file = None
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _write_atomic(self, name: str, data: bytes) -> None:
+        """写入临时文件并落盘后原子替换，读者只会看到完整的文件"""
+        tmp = self._path(f".{name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._path(name))
+
+    def current(self) -> Optional[Dict]:
+        """读取当前清单，不存在或损坏时返回 None"""
+        try:
+            with open(self._path(MANIFEST_NAME), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取向量快照清单失败: {e}")
+            return None
+
+    def try_acquire_builder(self) -> bool:
+        """非阻塞地获取构建锁，已被其他 worker 持有时返回 False"""
+        if fcntl is None:
+            return True
+        lock_file = open(self._path(LOCK_NAME), "a")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def release_builder(self) -> None:
+        if self._lock_file is not None:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+
+    def touch(self, manifest: Dict) -> None:
+        """数据库没有变化时只更新检查时间，其他 worker 据此跳过数据库查询"""
+        self._write_atomic(MANIFEST_NAME, json.dumps(dict(manifest, checked_at=time.time())).encode("utf-8"))
+
+    def publish(
+        self,
+        ids: np.ndarray,
+        matrix: np.ndarray,
+        contents: List[str],
+        sources: List[Optional[str]],
+        updated_at: List[Optional[datetime]],
+        meta_infos: List[Optional[str]],
+        high_water_mark: Optional[datetime],
+        full_refresh_at: float,
+    ) -> Dict:
+        """写入新版本的快照并切换清单，返回新清单"""
+        previous = self.current()
+        version = max(int(time.time() * 1000), (previous or {}).get("version", 0) + 1)
+        count, dimension = (matrix.shape if len(ids) else (0, 0))
+
+        encoded = [content.encode("utf-8") for content in contents]
+        offsets = np.zeros(count + 1, dtype=np.int64)
+        if count:
+            np.cumsum([len(data) for data in encoded], out=offsets[1:])
+        self._write_atomic(
+            f"snapshot-{version}.bin",
+            b"".join([
+                np.ascontiguousarray(matrix, dtype=np.float32).tobytes(),
+                np.asarray(ids, dtype=np.int64).tobytes(),
+                offsets.tobytes(),
+                *encoded,
+            ])
+        )
+        self._write_atomic(
+            f"snapshot-{version}.json",
+            json.dumps({
+                "sources": list(sources),
+                "updated_at": [_to_iso(value) for value in updated_at],
+                "meta_info": list(meta_infos),
+            }, ensure_ascii=False).encode("utf-8")
+        )
+
+        now = time.time()
+        manifest = {
+            "version": version,
+            "count": int(count),
+            "dimension": int(dimension),
+            "high_water_mark": _to_iso(high_water_mark),
+            "full_refresh_at": full_refresh_at,
+            "created_at": now,
+            "checked_at": now,
+        }
+        self._write_atomic(MANIFEST_NAME, json.dumps(manifest).encode("utf-8"))
+        self._remove_old_versions(version)
+        logger.info(f"发布向量快照 v{version}: {count} 个向量")
+        return manifest
+
+    def load(self, manifest: Dict) -> Dict:
+        """
+        按清单读取快照：矩阵和 id 为只读内存映射，内容按偏移解码，其余元数据来自 JSON
+        返回 {ids, matrix, contents, sources, updated_at, meta_info, high_water_mark}
+        """
+        version, count, dimension = manifest["version"], manifest["count"], manifest["dimension"]
+        with open(self._path(f"snapshot-{version}.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        if count:
+            path = self._path(f"snapshot-{version}.bin")
+            matrix_bytes = count * dimension * _FLOAT_BYTES
+            matrix = np.memmap(path, dtype=np.float32, mode="r", shape=(count, dimension))
+            ids = np.memmap(path, dtype=np.int64, mode="r", offset=matrix_bytes, shape=(count,))
+            text_start = matrix_bytes + count * _INT_BYTES
+            offsets = np.fromfile(path, dtype=np.int64, count=count + 1, offset=text_start)
+            with open(path, "rb") as f:
+                f.seek(text_start + (count + 1) * _INT_BYTES)
+                blob = f.read()
+            contents = [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(count)]
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+            ids = np.empty(0, dtype=np.int64)
+            contents = []
+
+        return {
+            "ids": ids,
+            "matrix": matrix,
+            "contents": contents,
+            "sources": meta["sources"],
+            "updated_at": [_from_iso(value) for value in meta["updated_at"]],
+            "meta_info": meta["meta_info"],
+            "high_water_mark": _from_iso(manifest.get("high_water_mark")),
+        }
+
+    def _remove_old_versions(self, current: int) -> None:
+        """删除较旧的版本；POSIX 下已映射该文件的进程不受影响"""
+        versions = set()
+        for name in os.listdir(self.directory):
+            if name.startswith("snapshot-"):
+                try:
+                    versions.add(int(name.split("-", 1)[1].split(".", 1)[0]))
+                except ValueError:
+                    continue
+        for version in sorted(versions)[:-KEEP_VERSIONS]:
+            if version == current:
+                continue
+            for suffix in (".bin", ".json"):
+                try:
+                    os.remove(self._path(f"snapshot-{version}{suffix}"))
+                except OSError:
+                    pass
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""
+检索基准测试，结果输出为 JSON
+
+用法:
+    # 索引层：合成向量上比较各索引后端（1k ~ 1M）
+    python -m scripts.benchmark_rag index --sizes 1000,10000,100000,1000000 --indexes exact,int8,pq,hnsw
+    # 服务层：用标注查询集比较 RAGService 与 OptimizedRAGService（需要数据库中已有知识）
+    python -m scripts.benchmark_rag service --k 5 --concurrency 8 --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+
+from app.services.rag_benchmark import LABELED_QUERIES, benchmark_indexes, benchmark_service
+from app.services.rag_factory import RAGFactory
+from app.services.rag_service import RAGService
+from app.services.rag_service_optimized import OptimizedRAGService
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def run_services(k: int, concurrency: int):
+    """在同一查询集上依次测试两种服务，索引后端由配置决定"""
+    reports = []
+    for service_class in (RAGService, OptimizedRAGService):
+        service = service_class(vector_index=RAGFactory.create_vector_index())
+        reports.append(await benchmark_service(service, LABELED_QUERIES, k=k, concurrency=concurrency))
+    return {"kind": "service", "results": reports}
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="检索质量与延迟基准测试")
+    parser.add_argument("mode", choices=["index", "service"], help="index 为合成向量上的索引对比；service 为端到端服务对比")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="语料规模，逗号分隔")
+    parser.add_argument("--indexes", default="exact,int8,pq", help="索引类型，逗号分隔")
+    parser.add_argument("--dim", type=int, default=128, help="合成向量维度")
+    parser.add_argument("--queries", type=int, default=100, help="合成查询数量")
+    parser.add_argument("--k", type=int, default=10, help="返回结果数")
+    parser.add_argument("--concurrency", type=int, default=4, help="并发查询数")
+    parser.add_argument("--output", help="结果写入的 JSON 文件，默认输出到标准输出")
+    args = parser.parse_args()
+    
+    if args.mode == "index":
+        report = benchmark_indexes(
+            sizes=[int(size) for size in args.sizes.split(",")],
+            index_types=args.indexes.split(","),
+            dim=args.dim,
+            query_count=args.queries,
+            k=args.k,
+            concurrency=args.concurrency,
+        )
+    else:
+        report = asyncio.run(run_services(args.k, args.concurrency))
+    
+    output = json.dumps(report, ensure_ascii=False, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+        logger.info(f"结果已写入 {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""
+离线清理近似重复的知识条目
+
+用法:
+    python -m scripts.dedup_vectors                          # 只统计，不修改数据
+    python -m scripts.dedup_vectors --threshold 0.97 --same-source --action mark
+    python -m scripts.dedup_vectors --action merge           # 合并 keywords / tags 后软删除重复条目
+"""
+import argparse
+import json
+import logging
+import time
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import engine
+from app.models.vector_store import VectorStore
+from app.services.vector_dedup import DEDUP_ACTIONS, apply_dedup, find_duplicate_clusters, load_vectors
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def dedup(threshold: float, same_source: bool, action: str, examples: int):
+    """聚类并按 action 处理，返回统计信息"""
+    start_time = time.time()
+    with Session(engine) as session:
+        ids, vectors, sources = load_vectors(session)
+        logger.info(f"读取 {len(ids)} 个向量，阈值 {threshold}")
+        clusters = find_duplicate_clusters(ids, vectors, threshold, sources if same_source else None)
+        report = apply_dedup(session, clusters, action)
+        
+        samples = []
+        for members in clusters[:examples]:
+            rows = session.query(VectorStore.id, VectorStore.source, VectorStore.content).filter(
+                VectorStore.id.in_(members)
+            ).order_by(VectorStore.id).all()
+            samples.append({
+                "keep": members[0],
+                "duplicates": members[1:],
+                "source": rows[0].source if rows else None,
+                "contents": [row.content[:60] for row in rows],
+            })
+    
+    report.update({
+        "vectors": len(ids),
+        "threshold": threshold,
+        "action": action,
+        "elapsed": round(time.time() - start_time, 3),
+        "examples": samples,
+    })
+    return report
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="按余弦相似度聚类并清理近似重复的向量")
+    parser.add_argument("--threshold", type=float, default=settings.RAG_DUPLICATE_THRESHOLD, help="视为重复的余弦相似度")
+    parser.add_argument("--same-source", action="store_true", help="只在同一来源内比较")
+    parser.add_argument("--action", choices=DEDUP_ACTIONS, default="report", help="report 只统计；mark 标记并软删除；merge 合并元数据后软删除")
+    parser.add_argument("--examples", type=int, default=5, help="输出的示例簇数量")
+    args = parser.parse_args()
+    
+    report = dedup(args.threshold, args.same_source, args.action, args.examples)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""
+批量导入知识文件到向量库
+
+用法:
+    python -m scripts.ingest_knowledge data/generated_health_knowledge.json
+    python -m scripts.ingest_knowledge data/*.md --source 健康知识 --batch-size 100 --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import logging
+
+from tqdm import tqdm
+
+from app.services.knowledge_ingestion import KnowledgeIngestor, load_documents
+from app.services.rag_service import RAGService
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def ingest_files(paths, source=None, batch_size=None, concurrency=None):
+    """逐个文件导入，返回每个文件的统计信息"""
+    ingestor = KnowledgeIngestor(RAGService().embeddings, batch_size=batch_size, concurrency=concurrency)
+    reports = []
+    for path in paths:
+        documents = load_documents(path, default_source=source)
+        logger.info(f"{path}: 解析出 {len(documents)} 条知识")
+        
+        pbar = tqdm(total=0, desc=f"导入 {path}", unit="条")
+        
+        def progress(done, total):
+            pbar.total = total
+            pbar.n = done
+            pbar.refresh()
+        
+        try:
+            report = await ingestor.ingest(documents, progress=progress)
+        finally:
+            pbar.close()
+        reports.append({"path": path, **report})
+    return reports
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="批量导入 JSON / JSONL / Markdown 知识文件")
+    parser.add_argument("paths", nargs="+", help="知识文件路径")
+    parser.add_argument("--source", help="条目未指定来源时使用的默认来源")
+    parser.add_argument("--batch-size", type=int, help="每次 embedding 请求的文档数")
+    parser.add_argument("--concurrency", type=int, help="并发的 embedding 请求数")
+    args = parser.parse_args()
+    
+    reports = asyncio.run(ingest_files(args.paths, args.source, args.batch_size, args.concurrency))
+    print(json.dumps(reports, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
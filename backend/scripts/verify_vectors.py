@@ -4,6 +4,7 @@ from datetime import datetime
 from openai import AsyncOpenAI
 from app.core.config import settings
 from app.services.rag_service import RAGService
+from app.services.knowledge_ingestion import KnowledgeIngestor
 import logging
 from tqdm import tqdm
 from langchain_openai import OpenAIEmbeddings
@@ -60,6 +61,7 @@ async def generate_health_content(topic: str, count: int = 5):
 
 async def main():
     rag = RAGService()
+    ingestor = KnowledgeIngestor(rag.embeddings)
     
     total_count = 0
     target_count = 1000
@@ -68,35 +70,39 @@ async def main():
     
     try:
         while total_count < target_count:
+            # 每轮各主题生成的内容合并后批量生成向量、批量写入
+            round_items = []
             for topic in HEALTH_TOPICS:
-                batch_size = min(5, target_count - total_count)
+                batch_size = min(5, target_count - total_count - len(round_items))
                 if batch_size <= 0:
                     break
                     
                 contents = await generate_health_content(topic, batch_size)
-                
-                for content in contents:
-                    if total_count >= target_count:
-                        break
-                        
-                    try:
-                        success = await rag.store_vector(
-                            content=content,
-                            source=topic
-                        )
-                        if success:
-                            all_content.append({
-                                "content": content,
-                                "topic": topic,
-                                "timestamp": datetime.now().isoformat()
-                            })
-                            total_count += 1
-                            pbar.update(1)
-                            
-                    except Exception as e:
-                        logger.error(f"存储失败: {str(e)}")
-                        
+                round_items.extend(
+                    {"content": content, "source": topic, "meta_info": None}
+                    for content in contents[:batch_size]
+                )
                 await asyncio.sleep(1)
+            
+            if not round_items:
+                continue
+            
+            try:
+                report = await ingestor.ingest(round_items)
+                if report["failed"]:
+                    logger.error(f"本轮有 {report['failed']} 条写入失败，重新生成")
+                else:
+                    for item in round_items:
+                        all_content.append({
+                            "content": item["content"],
+                            "topic": item["source"],
+                            "timestamp": datetime.now().isoformat()
+                        })
+                    total_count += len(round_items)
+                    pbar.update(len(round_items))
+                    
+            except Exception as e:
+                logger.error(f"存储失败: {str(e)}")
                 
     except Exception as e:
         logger.error(f"程序执行出错: {str(e)}")
@@ -0,0 +1,139 @@
+import time
+
+import numpy as np
+
+from app.services.answer_cache import SemanticAnswerCache, replay_chunks
+
+
+def test_answer_cache_hit_by_similarity() -> None:
+    """
+    测试相似度达到阈值的问题命中缓存，不相似的问题未命中，命中率正确统计
+    """
+    cache = SemanticAnswerCache(max_size=10, ttl=None, threshold=0.95)
+    cache.store("如何改善睡眠", np.array([1.0, 0.0, 0.0]), "规律作息", version=1)
+
+    hit = cache.lookup(np.array([1.0, 0.05, 0.0]), version=1)
+    assert hit["answer"] == "规律作息"
+    assert hit["question"] == "如何改善睡眠"
+    assert hit["similarity"] > 0.95
+    assert cache.lookup(np.array([0.0, 1.0, 0.0]), version=1) is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+
+
+def test_answer_cache_invalidation_and_bounds() -> None:
+    """
+    测试知识库版本变化、手动失效、条数上限和过期时间
+    """
+    cache = SemanticAnswerCache(max_size=2, ttl=None, threshold=0.9)
+    cache.store("问题1", np.array([1.0, 0.0]), "回答1", version=1)
+    assert cache.lookup(np.array([1.0, 0.0]), version=2) is None
+    assert len(cache) == 0
+    # 生成期间知识库版本已变化，旧版本的回答不写入
+    cache.store("问题1", np.array([1.0, 0.0]), "回答1", version=1)
+    assert len(cache) == 0
+
+    cache.store("问题1", np.array([1.0, 0.0]), "回答1", version=2)
+    cache.store("问题2", np.array([0.0, 1.0]), "回答2", version=2)
+    cache.store("问题3", np.array([-1.0, 0.0]), "回答3", version=2)
+    assert len(cache) == 2
+    assert cache.lookup(np.array([1.0, 0.0]), version=2) is None
+    cache.invalidate()
+    assert len(cache) == 0
+
+    cache = SemanticAnswerCache(max_size=10, ttl=0.01, threshold=0.9)
+    cache.store("问题", np.array([1.0, 0.0]), "回答")
+    time.sleep(0.02)
+    assert cache.lookup(np.array([1.0, 0.0])) is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_replay_chunks() -> None:
+    """
+    测试缓存回答按固定字符数分块回放，拼接后与原回答一致
+    """
+    answer = "保持规律作息，睡前避免使用电子设备。" * 3
+    chunks = list(replay_chunks(answer, size=8))
+    assert "".join(chunks) == answer
+    assert all(len(chunk) <= 8 for chunk in chunks)
+
+
+def test_personalized_answers_bypass_cache(monkeypatch) -> None:
+    """
+    测试两个用户几乎相同的个性化咨询各自调用上游，不命中彼此的回答缓存，也不合并为一次请求；
+    上游收到的消息只有系统提示词和 HealthAgent 组装好的提示词，每次请求只检索一次
+    """
+    import asyncio
+    from types import SimpleNamespace
+
+    from app.core.config import settings
+    from app.services.ai_service import AIAssistant
+    from app.services.answer_cache import get_answer_cache
+
+    monkeypatch.setattr(settings, "RAG_EMBEDDING_PROVIDER", "hashing")
+    monkeypatch.setattr(settings, "RAG_PERSISTENT_CACHE_PATH", None)
+    monkeypatch.setattr(settings, "AI_TOKENIZER", "estimate")
+    assistant = AIAssistant()
+
+    searches = []
+
+    async def search_similar(query, k=3, filters=None):
+        searches.append((query, filters))
+        return [{"content": "控制总热量，增加蔬菜和优质蛋白的摄入"}]
+
+    async def embed_query(text):
+        # 所有提示词的 embedding 都相同，相似度必然超过缓存阈值
+        return np.ones(8)
+
+    rag = SimpleNamespace(search_similar=search_similar, embed_query=embed_query, knowledge_version=1)
+    assistant.rag = rag
+    assistant.health_agent.rag = rag
+
+    calls = []
+    prompts = []
+    build_prompt = assistant.health_agent._build_prompt
+
+    async def record_prompt(*args, **kwargs):
+        prompt = await build_prompt(*args, **kwargs)
+        prompts.append(prompt)
+        return prompt
+
+    monkeypatch.setattr(assistant.health_agent, "_build_prompt", record_prompt)
+
+    async def create(model, messages, **kwargs):
+        calls.append(messages)
+        await asyncio.sleep(0.01)
+        weight = "80" if "体重：80" in messages[-1]["content"] else "60"
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=f"体重 {weight}kg 的饮食建议"))],
+            usage=None
+        )
+
+    assistant.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    get_answer_cache().invalidate()
+
+    async def run():
+        return await asyncio.gather(
+            assistant.get_response("我该怎么吃才能减肥？", user_data={"age": 30, "weight": 80}),
+            assistant.get_response("我该怎么吃才能减肥？", user_data={"age": 30, "weight": 60}),
+        )
+
+    first, second = asyncio.run(run())
+    assert first == "体重 80kg 的饮食建议"
+    assert second == "体重 60kg 的饮食建议"
+    assert len(calls) == 2
+    for messages in calls:
+        assert messages == [
+            {"role": "system", "content": assistant.system_prompt},
+            {"role": "user", "content": messages[1]["content"]},
+        ]
+    assert sorted(messages[1]["content"] for messages in calls) == sorted(prompts)
+    # 只按用户问题检索一次，渲染后的提示词（含健康数据）不再被检索
+    assert searches == [("我该怎么吃才能减肥？", {"topic": ["营养与饮食"]})] * 2
+    assert asyncio.run(assistant.get_response("我该怎么吃才能减肥？", user_data={"weight": 60})) == "体重 60kg 的饮食建议"
+    assert len(calls) == 3
+    assert len(searches) == 3
+    assert len(get_answer_cache()) == 0
@@ -0,0 +1,40 @@
+from app.services.bm25_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+
+def test_tokenize_cjk_bigrams_and_words() -> None:
+    """
+    测试中文按二元组切分、英文按整词切分
+    """
+    assert tokenize("睡眠质量 Sleep 8h") == ["睡眠", "眠质", "质量", "sleep", "8h"]
+    assert tokenize("水") == ["水"]
+
+
+def test_bm25_ranking_and_coverage() -> None:
+    """
+    测试 BM25 排序、覆盖率以及增量删除
+    """
+    index = BM25Index()
+    index.add(1, "良好的睡眠对健康不可或缺，成年人每晚需要7-9小时睡眠")
+    index.add(2, "规律运动对健康至关重要")
+    index.add(3, "水分摄入对健康至关重要")
+
+    results = index.search("每晚睡眠多少小时", k=3)
+    assert results[0][0] == 1
+    assert results[0][2] == 1.0
+
+    index.remove(1)
+    assert all(doc_id != 1 for doc_id, _, _ in index.search("睡眠", k=3))
+    assert len(index) == 2
+
+
+def test_reciprocal_rank_fusion_weights() -> None:
+    """
+    测试加权倒数排名融合，权重为 0 的排序不参与
+    """
+    fused = reciprocal_rank_fusion(
+        {"bm25": [1, 2], "vector": [2, 3], "keyword": [3]},
+        {"bm25": 1.0, "vector": 1.0, "keyword": 0.0},
+        rrf_k=60,
+    )
+    assert [doc_id for doc_id, _ in fused] == [2, 1, 3]
+    assert fused[0][1] == 1 / 62 + 1 / 61
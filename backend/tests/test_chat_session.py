@@ -0,0 +1,170 @@
+import asyncio
+
+import pytest
+
+from app.services.chat_session import ChatSessionStore, SessionForbidden
+
+
+def test_chat_session_rolling_summary() -> None:
+    """
+    测试会话只保留最近几轮，滚出窗口的轮次攒够一批后在后台合并进摘要，摘要失败时待摘要轮次有上限
+    """
+    calls = []
+
+    async def summarize(summary, turns):
+        calls.append([turn[0] for turn in turns])
+        return f"{summary}+{len(turns)}"
+
+    async def run():
+        store = ChatSessionStore(max_turns=2, summary_batch=2, summarizer=summarize, persist=False)
+        state = await store.get("s1", user_id=7)
+        assert not state.has_history()
+        for i in range(1, 6):
+            store.append(state, f"问题{i}", f"回答{i}")
+        await store.flush()
+
+        assert [turn[0] for turn in state.turns] == [4, 5]
+        # 摘要任务运行时取走所有已滚出窗口的轮次
+        assert calls == [[1, 2, 3]]
+        assert state.summary == "+3"
+        assert state.summarized_turns == 3
+        assert state.pending == []
+        assert state.recent_turns()[-1] == "用户：问题5\n助手：回答5"
+        assert await store.get("s1", user_id=7) is state
+        assert state.user_id == 7
+
+        async def fail(summary, turns):
+            raise RuntimeError("upstream down")
+
+        store.summarizer = fail
+        for i in range(6, 30):
+            store.append(state, f"问题{i}", f"回答{i}")
+        await store.flush()
+        assert state.summary == "+3"
+        assert len(state.pending) <= store.summary_batch * 4 + 1
+        assert store.stats()["summary_failures"] > 0
+
+    asyncio.run(run())
+
+
+def test_chat_session_load_waits_only_for_own_writes(monkeypatch) -> None:
+    """
+    测试加载会话时只等待该会话排队中的写入，其他会话的慢写入不阻塞加载
+    """
+    import threading
+
+    release = threading.Event()
+    written = []
+
+    def write_batch(batch):
+        if any(item[1] == "slow" for item in batch):
+            release.wait(5)
+        written.extend(item[1] for item in batch)
+
+    monkeypatch.setattr(ChatSessionStore, "_write_batch", staticmethod(write_batch))
+    monkeypatch.setattr(ChatSessionStore, "_load_from_db", lambda self, state: None)
+
+    async def run():
+        store = ChatSessionStore(persist=True)
+        slow = await store.get("slow")
+        store.append(slow, "问题", "回答")
+        await asyncio.sleep(0.05)
+        # slow 的写入卡住时，加载其他会话不受影响
+        await asyncio.wait_for(store.get("other"), timeout=1)
+
+        store._sessions.pop("slow")
+        loading = asyncio.ensure_future(store.get("slow"))
+        await asyncio.sleep(0.05)
+        assert not loading.done()
+        release.set()
+        await asyncio.wait_for(loading, timeout=5)
+        assert written == ["slow"]
+        await store.flush()
+
+    asyncio.run(run())
+
+
+def test_chat_session_write_conflict_isolated(monkeypatch, tmp_path) -> None:
+    """
+    测试同一批写入按会话分别提交：一个会话的轮次号冲突时顺延重试，不丢失其他会话的轮次
+    """
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+
+    import app.services.chat_session as chat_session
+    from app.models.chat_session import ChatSession, ChatTurn
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'chat.sqlite3'}")
+    ChatSession.__table__.create(engine)
+    ChatTurn.__table__.create(engine)
+    monkeypatch.setattr(chat_session, "engine", engine)
+    with Session(engine) as db:
+        # 另一个 worker 已经写入了 a 的第 1 轮
+        db.add(ChatSession(session_id="a", summarized_turns=0))
+        db.add(ChatTurn(session_id="a", turn=1, question="别处", answer="别处"))
+        db.commit()
+
+    failed = ChatSessionStore._write_batch([
+        ("turn", "a", None, (1, "问题a1", "回答a1")),
+        ("turn", "b", 3, (1, "问题b1", "回答b1")),
+        ("turn", "a", None, (2, "问题a2", "回答a2")),
+        ("turn", "b", 3, (2, "问题b2", "回答b2")),
+    ])
+
+    assert failed == 0
+    with Session(engine) as db:
+        rows = db.query(ChatTurn.session_id, ChatTurn.turn, ChatTurn.question).order_by(
+            ChatTurn.session_id, ChatTurn.turn
+        ).all()
+        assert [tuple(row) for row in rows] == [
+            ("a", 1, "别处"), ("a", 3, "问题a1"), ("a", 4, "问题a2"),
+            ("b", 1, "问题b1"), ("b", 2, "问题b2"),
+        ]
+        assert db.get(ChatSession, "b").user_id == 3
+
+
+def test_chat_session_owner_and_read_only_find(monkeypatch, tmp_path) -> None:
+    """
+    测试会话只能由所属用户访问，只读查找不会为不存在的会话创建记录
+    """
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+
+    import app.services.chat_session as chat_session
+    from app.models.chat_session import ChatSession, ChatTurn
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'chat.sqlite3'}")
+    ChatSession.__table__.create(engine)
+    ChatTurn.__table__.create(engine)
+    monkeypatch.setattr(chat_session, "engine", engine)
+    with Session(engine) as db:
+        db.add(ChatSession(session_id="owned", user_id=7, summary="摘要", summarized_turns=0))
+        db.add(ChatTurn(session_id="owned", turn=1, question="问题", answer="回答"))
+        db.commit()
+
+    async def run():
+        store = ChatSessionStore()
+        assert await store.find("missing") is None
+        assert len(store) == 0
+
+        found = await store.find("owned", user_id=7)
+        assert found.summary == "摘要"
+        assert list(found.turns) == [(1, "问题", "回答")]
+        assert len(store) == 0
+        with pytest.raises(SessionForbidden):
+            await store.find("owned", user_id=8)
+
+        # 从数据库加载后归属不变，其他用户或匿名访问被拒绝
+        for user_id in (8, None):
+            with pytest.raises(SessionForbidden):
+                await store.get("owned", user_id)
+        assert (await store.get("owned", 7)).user_id == 7
+
+        # 新会话归属第一个带用户ID访问的用户
+        state = await store.get("new")
+        assert (await store.get("new", 3)) is state
+        with pytest.raises(SessionForbidden):
+            await store.get("new", 4)
+        assert await store.find("new", 3) is state
+
+    asyncio.run(run())
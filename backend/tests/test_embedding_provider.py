@@ -0,0 +1,33 @@
+import asyncio
+
+import numpy as np
+
+from app.services.embedding_provider import HashingEmbeddings
+
+
+def test_hashing_embeddings_deterministic_and_normalized() -> None:
+    """
+    测试本地哈希 embedding 维度固定、结果确定且已归一化
+    """
+    embeddings = HashingEmbeddings(dimension=256)
+    first = embeddings.embed_query("每晚睡眠 7-9 小时")
+    second = HashingEmbeddings(dimension=256).embed_query("每晚睡眠 7-9 小时")
+
+    assert len(first) == 256
+    assert first == second
+    assert abs(np.linalg.norm(first) - 1.0) < 1e-5
+    assert embeddings.embed_query("   ") == [0.0] * 256
+
+
+def test_hashing_embeddings_similarity() -> None:
+    """
+    测试字符 n-gram 相近的文本相似度更高，异步接口与同步一致
+    """
+    embeddings = HashingEmbeddings(dimension=512)
+    query, related, unrelated = asyncio.run(embeddings.aembed_documents([
+        "如何改善睡眠质量",
+        "改善睡眠质量的方法：规律作息",
+        "每周进行150分钟有氧运动",
+    ]))
+    assert np.dot(query, related) > np.dot(query, unrelated)
+    assert asyncio.run(embeddings.aembed_query("如何改善睡眠质量")) == query
@@ -0,0 +1,48 @@
+from app.services.health_profile import HealthProfileCache, profile_user_data
+
+
+def test_profile_cache_invalidation() -> None:
+    """
+    测试档案缓存命中、失效，构建期间数据变化时放弃写入，超出上限按 LRU 淘汰
+    """
+    cache = HealthProfileCache(max_size=2, ttl=None)
+    assert cache.get(1) is None
+
+    generation = cache.generation(1)
+    assert cache.put(1, {"user_id": 1}, generation)
+    assert cache.get(1) == {"user_id": 1}
+
+    generation = cache.generation(1)
+    cache.invalidate(1)
+    assert cache.get(1) is None
+    assert not cache.put(1, {"user_id": 1, "stale": True}, generation)
+    assert cache.put(1, {"user_id": 1}, cache.generation(1))
+
+    cache.put(2, {"user_id": 2}, cache.generation(2))
+    cache.get(1)
+    cache.put(3, {"user_id": 3}, cache.generation(3))
+    assert cache.get(2) is None
+    assert cache.get(1) is not None
+
+    stats = cache.stats()
+    assert stats["size"] == 2
+    assert stats["invalidations"] == 1
+
+
+def test_profile_user_data() -> None:
+    """
+    测试档案展开为提示词字段：优先近 7 天，附带 30 天对比，没有近 7 天记录时退回 30 天
+    """
+    profile = {
+        "vitals": {"weight": 68.0, "bmi": 23.53},
+        "sleep": {"7d": {"avg_sleep_hours": 6.0, "sleep_nights": 5}, "30d": {"avg_sleep_hours": 7.0, "sleep_nights": 20}},
+        "exercise": {"7d": {}, "30d": {"weekly_exercise_minutes": 90, "exercise_types": ["跑步"]}},
+        "goals": [{"title": "减重", "target_value": 65.0, "current_value": 68.0, "unit": "kg", "target_date": "2024-06-01"}],
+    }
+    data = profile_user_data(profile)
+    assert data["avg_sleep_hours"] == 6.0
+    assert data["avg_sleep_hours_30d"] == 7.0
+    assert data["weekly_exercise_minutes"] == 90
+    assert "weekly_exercise_minutes_30d" not in data
+    assert data["health_goals"][0]["title"] == "减重"
+    assert profile_user_data({}) == {}
@@ -0,0 +1,32 @@
+import pytest
+
+from app.services.keyword_index import AhoCorasick, KeywordIndex
+
+
+def test_aho_corasick_finds_overlapping_patterns() -> None:
+    """
+    测试自动机一次扫描找出重叠和嵌套的关键词
+    """
+    automaton = AhoCorasick(["睡眠", "睡眠质量", "质量", "失眠"])
+    matched = {automaton.patterns[i] for i in automaton.find_all("最近失眠，睡眠质量很差")}
+    assert matched == {"睡眠", "睡眠质量", "质量", "失眠"}
+
+
+def test_keyword_index_scores_and_removal() -> None:
+    """
+    测试关键词按文档累加分数，删除文档后不再命中
+    """
+    index = KeywordIndex()
+    index.add(1, "良好的睡眠对健康不可或缺", "睡眠指南", ["睡眠", "失眠"])
+    index.add(2, "规律运动改善睡眠 cardio", "运动指南", ["运动", "睡眠"])
+
+    results = index.search("失眠了，运动能改善睡眠吗 cardio", k=2)
+    assert [r["source"] for r in results] == ["运动指南", "睡眠指南"]
+    # 命中分数按本次查询的最高可能分数（3 个关键词 + 1 个英文词 = 7）归一化
+    assert results[0]["similarity"] == pytest.approx(5 / 7)
+    assert results[1]["similarity"] == pytest.approx(4 / 7)
+    assert results[0]["scores"] == {"keyword": 5}
+
+    index.remove(2)
+    assert [r["source"] for r in index.search("运动 睡眠")] == ["睡眠指南"]
+    assert index.keyword_count == 2
@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from app.services.knowledge_ingestion import content_hash, detect_format, parse_documents
+from app.services.text_chunking import chunk_document, collapse_chunks
+
+
+def test_parse_markdown_and_jsonl() -> None:
+    """
+    测试 Markdown 按二级标题和列表项解析，JSONL 逐行解析
+    """
+    markdown = "# 健康知识库\n\n总条目：2\n\n## 睡眠质量\n\n- 第一条\n续行\n\n- 第二条\n"
+    docs = parse_documents(markdown, "md")
+    assert [(d["source"], d["content"]) for d in docs] == [("睡眠质量", "第一条\n续行"), ("睡眠质量", "第二条")]
+
+    jsonl = "\n".join(json.dumps(item, ensure_ascii=False) for item in [
+        {"content": "多喝水", "topic": "饮水", "keywords": ["水分"]},
+        {"content": "  "},
+    ])
+    docs = parse_documents(jsonl, "jsonl", default_source="默认")
+    assert docs == [{"content": "多喝水", "source": "饮水", "meta_info": {"keywords": ["水分"]}}]
+
+
+def test_content_hash_and_format() -> None:
+    """
+    测试内容哈希忽略空白差异，不支持的扩展名报错
+    """
+    assert content_hash("多喝水 \n 少熬夜") == content_hash("多喝水 少熬夜")
+    assert detect_format("a/b.JSONL") == "jsonl"
+    with pytest.raises(ValueError):
+        detect_format("knowledge.csv")
+
+
+def test_chunking_and_collapse() -> None:
+    """
+    测试长文档切分记录偏移，同一文档的命中片段合并为一条结果
+    """
+    content = "。".join(f"第{i}句健康知识内容" for i in range(40)) + "。"
+    chunks = chunk_document({"content": content, "source": "指南", "meta_info": {"keywords": ["健康"]}},
+                            "parent-1", chunk_size=60, chunk_overlap=10)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        meta = chunk["meta_info"]
+        assert meta["parent"] == "parent-1" and meta["keywords"] == ["健康"]
+        assert content[meta["start"]:meta["end"]] == chunk["content"]
+
+    chunk_info = {i: ("parent-1", c["meta_info"]["start"], c["meta_info"]["end"]) for i, c in enumerate(chunks)}
+    results = [{"id": i, "content": c["content"], "similarity": 1.0 - i / 100} for i, c in enumerate(chunks)]
+    results.append({"id": 99, "content": "其他文档", "similarity": 0.1})
+    collapsed = collapse_chunks(results, chunk_info, k=2)
+    assert [r["id"] for r in collapsed] == [0, 99]
+    assert collapsed[0]["content"] == content
+    assert collapsed[0]["chunk_count"] == len(chunks)
+
+
+def test_insert_rows_commits_per_batch(monkeypatch, tmp_path) -> None:
+    """
+    测试按 insert_batch_size 分事务提交：一批写入失败只回滚这一批，其余批次的行保留
+    """
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+
+    import app.services.knowledge_ingestion as knowledge_ingestion
+    from app.models.vector_store import VectorStore
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'vectors.sqlite3'}")
+    VectorStore.__table__.create(engine)
+    monkeypatch.setattr(knowledge_ingestion, "engine", engine)
+
+    rows = [{"content": f"知识{i}", "content_hash": str(i)} for i in range(5)]
+    rows[3]["content"] = None
+    ingestor = knowledge_ingestion.KnowledgeIngestor(embeddings=None, insert_batch_size=2)
+    assert ingestor._insert_rows(rows) == 3
+    with Session(engine) as db:
+        assert sorted(row.content_hash for row in db.query(VectorStore.content_hash)) == ["0", "1", "4"]
@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+from app.services.llm_admission import (
+    PRIORITY_BULK,
+    PRIORITY_INTERACTIVE,
+    AdmissionController,
+    AdmissionRejected,
+    TokenBucket,
+)
+
+
+def test_admission_priority_order() -> None:
+    """
+    测试名额释放后优先交给交互请求，其次按到达顺序，并发数不超过上限
+    """
+    controller = AdmissionController(max_in_flight=1, max_queue=10, queue_timeout=None)
+    order = []
+
+    async def call(name, priority, delay=0.0):
+        await asyncio.sleep(delay)
+        async with controller.slot("gpt", priority, shed=priority != PRIORITY_BULK):
+            assert controller.in_flight == 1
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(
+            call("first", PRIORITY_INTERACTIVE),
+            call("bulk-1", PRIORITY_BULK, 0.001),
+            call("bulk-2", PRIORITY_BULK, 0.002),
+            call("chat", PRIORITY_INTERACTIVE, 0.003),
+        )
+
+    asyncio.run(main())
+    assert order == ["first", "chat", "bulk-1", "bulk-2"]
+    stats = controller.stats()
+    assert stats["in_flight"] == 0
+    assert stats["queued"] == 0
+    assert stats["queue_wait"]["bulk"]["admitted"] == 2
+
+
+def test_admission_sheds_load() -> None:
+    """
+    测试队列已满立即拒绝、排队超时拒绝，批量请求不受队列上限限制
+    """
+    controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=0.02)
+
+    async def hold(seconds, priority=PRIORITY_INTERACTIVE):
+        async with controller.slot("gpt", priority, shed=priority != PRIORITY_BULK):
+            await asyncio.sleep(seconds)
+
+    async def main():
+        holder = asyncio.ensure_future(hold(0.1))
+        await asyncio.sleep(0)
+        results = await asyncio.gather(hold(0), hold(0), hold(0, PRIORITY_BULK), return_exceptions=True)
+        await holder
+        return results
+
+    timeout, full, bulk = asyncio.run(main())
+    assert isinstance(timeout, AdmissionRejected)
+    assert isinstance(full, AdmissionRejected)
+    assert bulk is None
+    assert controller.stats()["rejected"] == {"queue_timeout": 1, "queue_full": 1}
+
+
+def test_token_bucket_rate() -> None:
+    """
+    测试令牌桶在突发容量用完后按速率放行
+    """
+    bucket = TokenBucket(rate=100.0, capacity=2)
+
+    async def main():
+        start = time.monotonic()
+        for _ in range(4):
+            await bucket.acquire()
+        return time.monotonic() - start
+
+    assert asyncio.run(main()) >= 0.015
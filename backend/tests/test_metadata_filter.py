@@ -0,0 +1,41 @@
+import json
+
+import numpy as np
+
+from app.services.metadata_filter import MetadataFilterIndex, matches_filters, normalize_filters
+from app.services.vector_matrix import VectorMatrix
+
+
+def test_filter_index_candidates() -> None:
+    """
+    测试同一字段取值为"或"、不同字段为"且"，topic 缺省时使用 source
+    """
+    index = MetadataFilterIndex()
+    index.add(1, "睡眠质量", None)
+    index.add(2, "营养与饮食", json.dumps({"keywords": ["蛋白质"]}))
+    index.add(3, "指南", json.dumps({"topic": "睡眠质量", "tags": ["失眠"]}))
+
+    assert index.candidate_ids(normalize_filters({"topic": "睡眠质量"})) == {1, 3}
+    assert index.candidate_ids(normalize_filters({"topic": ["睡眠质量", "营养与饮食"]})) == {1, 2, 3}
+    assert index.candidate_ids(normalize_filters({"topic": "睡眠质量", "tags": ["失眠"]})) == {3}
+    assert index.candidate_ids(normalize_filters({"tags": "蛋白质"})) == {2}
+
+    index.remove(3)
+    assert index.candidate_ids(normalize_filters({"tags": "失眠"})) == set()
+    assert matches_filters("指南", json.dumps({"topic": "睡眠质量"}), normalize_filters({"topic": "睡眠质量"}))
+    assert normalize_filters({"topic": []}) is None
+
+
+def test_filtered_rows_skip_replaced_versions() -> None:
+    """
+    测试 id 映射到存活行：更新后的行替换旧版本，过滤打分只在候选行上进行
+    """
+    vectors = np.eye(4, dtype=np.float32)
+    matrix = VectorMatrix([10, 11, 12, 13], vectors, ["a", "b", "c", "d"], [None] * 4)
+    matrix = matrix.apply_delta([11], vectors[3:4], ["b2"], [None])
+
+    rows = matrix.rows_for_ids({11, 12, 99})
+    assert [matrix.contents[row] for row in rows] == ["c", "b2"]
+    results = matrix.top_rows(vectors[3], 5, rows)
+    assert matrix.contents[results[0][0]] == "b2"
+    assert len(results) == 2
@@ -0,0 +1,58 @@
+from app.core.config import settings
+from app.services.prompt_budget import PromptAssembler, PromptUsageStats, TokenCounter, estimate_tokens
+
+
+def _estimating_counter(monkeypatch) -> TokenCounter:
+    monkeypatch.setattr(settings, "AI_TOKENIZER", "estimate")
+    return TokenCounter("test-estimate-model")
+
+
+def test_token_counter_estimate(monkeypatch) -> None:
+    """
+    测试没有编码文件时按字符类别估算 token，截断结果不超过指定 token 数
+    """
+    counter = _estimating_counter(monkeypatch)
+    assert not counter.exact
+    assert counter.count("") == 0
+    assert counter.count("睡眠") == estimate_tokens("睡眠") == 3
+    assert counter.count("sleep well") == 3
+
+    text = "每天保持规律作息有助于改善睡眠质量。" * 20
+    truncated = counter.truncate(text, 50)
+    assert counter.count(truncated) <= 50
+    assert truncated.endswith("…")
+    assert text.startswith(truncated[:-1])
+    assert counter.truncate("短文本", 50) == "短文本"
+
+
+def test_prompt_assembler_budget(monkeypatch) -> None:
+    """
+    测试固定部分完整保留，参考段落按排名放入、放不下的截断或丢弃，未用完的份额分给其他部分
+    """
+    counter = _estimating_counter(monkeypatch)
+    passages = ["高相关段落" * 30, "次相关段落" * 30, "低相关段落" * 30]
+    assembler = PromptAssembler(max_tokens=300, counter=counter)
+    prompt = assembler.assemble(
+        fixed={"system": "你是健康助手"},
+        required={"question": "如何改善睡眠？"},
+        flexible={"passages": passages, "profile": "每周运动约 90 分钟", "history": []},
+    )
+
+    assert prompt.sections["system"] == "你是健康助手"
+    assert prompt.sections["question"] == "如何改善睡眠？"
+    # 档案摘要很短，完整保留，剩下的预算都给参考段落
+    assert prompt.sections["profile"] == "每周运动约 90 分钟"
+    assert "history" not in prompt.sections
+    # 第一段完整放入，第二段截断到剩余预算，第三段丢弃
+    assert prompt.sections["passages"].startswith(passages[0])
+    assert "passages" in prompt.truncated
+    assert prompt.dropped == {"passages": 1}
+    assert prompt.total_tokens <= 300
+
+    usage = PromptUsageStats()
+    usage.record(prompt)
+    stats = usage.stats()
+    assert stats["requests"] == 1
+    assert stats["dropped_items"] == {"passages": 1}
+    assert stats["truncated_requests"] == 1
+    assert stats["max_prompt_tokens"] == prompt.total_tokens
@@ -0,0 +1,27 @@
+import pytest
+
+from app.services.prompt_templates import PromptTemplate, get_template
+
+
+def test_prompt_template_compile() -> None:
+    """
+    测试模板编译时去掉缩进和行尾空白，渲染时不解析用户内容中的花括号
+    """
+    template = PromptTemplate("test", """
+        参考知识：
+        {context}
+
+        用户问题：{message}
+    """)
+    assert template.text == "参考知识：\n{context}\n\n用户问题：{message}"
+    assert template.fields == {"context", "message"}
+    assert template.render(context="多喝水", message="{age} 怎么办") == "参考知识：\n多喝水\n\n用户问题：{age} 怎么办"
+
+    with pytest.raises(KeyError):
+        template.render(context="")
+    with pytest.raises(ValueError):
+        PromptTemplate("bad", "{bmi:.2f}")
+
+    diet = get_template("diet")
+    assert not any(line.startswith(" ") for line in diet.text.splitlines())
+    assert {"context", "recent_records", "diet_records", "message"} <= diet.fields
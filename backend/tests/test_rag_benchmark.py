@@ -0,0 +1,47 @@
+import asyncio
+import json
+
+from app.services.rag_benchmark import benchmark_indexes, benchmark_service, ranking_metrics
+
+
+def test_ranking_metrics() -> None:
+    """
+    测试 recall@k 与 MRR 的计算
+    """
+    metrics = ranking_metrics([[3, 1, 9], [5, 6, 7]], [[1, 2, 3], [8, 9, 10]], 3)
+    assert metrics == {"recall_at_k": 0.3333, "mrr": 0.25}
+
+
+def test_benchmark_indexes_small_corpus() -> None:
+    """
+    测试索引基准：精确检索的召回率和 MRR 为 1，结果可序列化为 JSON
+    """
+    report = benchmark_indexes(sizes=[2000], index_types=["exact", "int8"], dim=32, query_count=20, k=5)
+    json.dumps(report)
+
+    by_type = {run["index_type"]: run for run in report["results"]}
+    assert by_type["exact"]["recall_at_k"] == 1.0
+    assert by_type["exact"]["mrr"] == 1.0
+    assert by_type["int8"]["recall_at_k"] >= 0.8
+    assert set(by_type["int8"]["latency_ms"]) >= {"p50", "p95", "p99"}
+    assert by_type["int8"]["bytes"] < by_type["exact"]["bytes"]
+
+
+def test_benchmark_service_keeps_legacy_fields() -> None:
+    """
+    测试服务基准的主题 MRR，以及保留原 /rag/benchmark 返回的字段
+    """
+    class StubService:
+        async def search_similar(self, query, k):
+            return [{"id": 1, "content": query, "similarity": 1.0, "source": "其他"},
+                    {"id": 2, "content": query, "similarity": 0.5, "source": "睡眠质量"}]
+
+    queries = [{"query": "失眠怎么办", "topic": "睡眠质量"}, {"query": "多喝水", "topic": "营养与饮食"}]
+    report = asyncio.run(benchmark_service(StubService(), queries, k=2, concurrency=2))
+
+    assert report["topic_mrr"] == 0.25
+    assert report["topic_hit_rate"] == 0.5
+    assert report["recall_at_k"] is None
+    for field in ("total_queries", "total_time", "average_time", "performance_rating"):
+        assert field in report
+    assert {"query", "duration", "result_count"} <= set(report["results"][0])
@@ -0,0 +1,61 @@
+import asyncio
+
+from app.services.single_flight import SingleFlight
+
+
+def test_single_flight_shares_result() -> None:
+    """
+    测试相同键的并发调用只执行一次，不同键各自执行，结束后键被移除
+    """
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return f"结果-{key}"
+
+    async def main():
+        results = await asyncio.gather(
+            *(flight.do("睡眠", lambda: fetch("睡眠")) for _ in range(5)),
+            flight.do("饮食", lambda: fetch("饮食")),
+        )
+        assert len(flight) == 0
+        return results
+
+    results = asyncio.run(main())
+    assert results == ["结果-睡眠"] * 5 + ["结果-饮食"]
+    assert calls == ["睡眠", "饮食"]
+    assert flight.stats()["shared"] == 4
+
+
+def test_single_flight_stream_fanout() -> None:
+    """
+    测试流式调用共用一个上游流，后加入的订阅者回放已收到的分块，上游异常传递给所有订阅者
+    """
+    flight = SingleFlight()
+    started = []
+
+    async def upstream(fail=False):
+        started.append(1)
+        for piece in ["保持", "规律", "作息"]:
+            await asyncio.sleep(0.01)
+            yield piece
+        if fail:
+            raise RuntimeError("上游中断")
+
+    async def collect(key, fail=False, delay=0.0):
+        await asyncio.sleep(delay)
+        return [piece async for piece in flight.stream(key, lambda: upstream(fail))]
+
+    async def main():
+        first, late = await asyncio.gather(collect("q"), collect("q", delay=0.015))
+        assert first == late == ["保持", "规律", "作息"]
+        assert len(started) == 1
+
+        results = await asyncio.gather(collect("e", True), collect("e", True), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert len(started) == 2
+
+    asyncio.run(main())
+    assert flight.stats()["stream_shared"] == 2
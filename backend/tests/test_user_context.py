@@ -0,0 +1,52 @@
+from datetime import datetime
+from decimal import Decimal
+
+from app.services.user_context import (
+    derive_exercise_stats,
+    derive_health_stats,
+    derive_sleep_stats,
+    format_recent_records,
+    merge_user_data,
+)
+
+
+def test_derive_user_stats() -> None:
+    """
+    测试从近期记录计算最新体征、BMI 趋势、平均睡眠和每周运动量
+    """
+    health = [
+        {"record_date": datetime(2024, 3, 1), "height": Decimal("170"), "weight": Decimal("68.0"),
+         "systolic_pressure": None, "diastolic_pressure": None},
+        {"record_date": datetime(2024, 2, 1), "height": None, "weight": Decimal("70.0"),
+         "systolic_pressure": 120, "diastolic_pressure": 80},
+    ]
+    stats = derive_health_stats(health)
+    assert stats["height"] == 170.0
+    assert stats["weight"] == 68.0
+    assert stats["bmi"] == 23.53
+    assert stats["bmi_trend"] == -0.69
+    assert stats["blood_pressure"] == "120/80"
+    assert derive_health_stats([]) == {}
+
+    sleep = derive_sleep_stats([
+        {"sleep_duration": Decimal("7.5"), "sleep_quality": 8},
+        {"sleep_duration": Decimal("6.0"), "sleep_quality": None},
+    ])
+    assert sleep == {"avg_sleep_hours": 6.8, "sleep_nights": 2, "avg_sleep_quality": 8.0}
+
+    exercise = derive_exercise_stats([
+        {"exercise_type": "跑步", "duration_minutes": 30},
+        {"exercise_type": "跑步", "duration_minutes": 30},
+        {"exercise_type": "瑜伽", "duration_minutes": 60},
+    ], days=14)
+    assert exercise == {"weekly_exercise_minutes": 60, "exercise_types": ["跑步", "瑜伽"]}
+
+
+def test_merge_and_format_user_data() -> None:
+    """
+    测试客户端提供的字段优先于服务端指标，衍生指标格式化为提示词片段
+    """
+    merged = merge_user_data({"weight": 65, "age": None}, {"weight": 68.0, "avg_sleep_hours": 7.0, "bmi_trend": 0.5})
+    assert merged == {"weight": 65, "avg_sleep_hours": 7.0, "bmi_trend": 0.5}
+    assert format_recent_records(merged) == "BMI 近期变化 +0.50"
+    assert format_recent_records({}) == ""
@@ -0,0 +1,36 @@
+import numpy as np
+
+from app.services.vector_dedup import find_duplicate_clusters
+from app.services.vector_matrix import mmr_rerank, normalize_rows
+
+
+def _paraphrases() -> np.ndarray:
+    """三组向量，每组内是同一方向加少量噪声（模拟同一知识的改写）"""
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(3, 32))
+    return np.vstack([center + rng.normal(0, 0.01, (3, 32)) for center in centers]).astype(np.float32)
+
+
+def test_find_duplicate_clusters() -> None:
+    """
+    测试按阈值聚类近似重复向量，以及按来源分组比较
+    """
+    vectors = _paraphrases()
+    ids = np.arange(9) + 1
+    assert find_duplicate_clusters(ids, vectors, 0.99) == [[1, 2, 3], [4, 5, 6], [7, 8, 9]]
+
+    sources = ["a", "b", "a"] * 3
+    assert find_duplicate_clusters(ids, vectors, 0.99, sources) == [[1, 3], [4, 6], [7, 9]]
+
+
+def test_mmr_rerank_prefers_diverse_results() -> None:
+    """
+    测试 MMR 重排跳过与已选结果高度相似的候选，lambda 为 1 时退化为按相关性排序
+    """
+    vectors = normalize_rows(_paraphrases())
+    relevance = np.array([0.9, 0.89, 0.88, 0.7, 0.69, 0.68, 0.5, 0.49, 0.48])
+
+    assert mmr_rerank(relevance, vectors, 3, 1.0) == [0, 1, 2]
+    assert mmr_rerank(relevance, vectors, 3, 0.5) == [0, 3, 6]
+    # 近似重复直接丢弃，候选不足 k 个时返回全部剩余
+    assert mmr_rerank(relevance, vectors, 5, 1.0, duplicate_threshold=0.99) == [0, 3, 6]
@@ -0,0 +1,211 @@
+import numpy as np
+import pytest
+
+from app.services.vector_index import (
+    ExactIndex,
+    VectorIndex,
+    create_vector_index,
+    evaluate_index,
+    faiss,
+)
+from app.services.vector_matrix import normalize_rows, normalize_vector
+
+
+def _random_vectors(n: int, dim: int = 32, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+def _sqlite_vector_store(monkeypatch, tmp_path, module, vectors, sources=None):
+    """在 sqlite 中建 vector_store 表并写入向量，替换服务模块使用的数据库连接"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+
+    from app.models.vector_store import VectorStore
+    from app.services.embedding_codec import embedding_columns
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'vectors.sqlite3'}")
+    VectorStore.__table__.create(engine)
+    with Session(engine) as db:
+        for i, vector in enumerate(vectors):
+            source = sources[i] if sources else "指南"
+            db.add(VectorStore(id=i + 1, content=f"知识{i}", source=source, **embedding_columns(vector, "float32")))
+        db.commit()
+    monkeypatch.setattr(module, "engine", engine)
+    return engine
+
+
+def test_exact_index_search() -> None:
+    """
+    测试精确索引返回自身向量且分数降序
+    """
+    vectors = _random_vectors(200)
+    index = ExactIndex()
+    index.build(np.arange(200) + 1000, vectors)
+
+    ids, scores = index.search(vectors[7], 5)
+    assert ids[0] == 1007
+    assert scores[0] == pytest.approx(1.0, abs=1e-5)
+    assert list(scores) == sorted(scores, reverse=True)
+
+
+@pytest.mark.skipif(faiss is None, reason="未安装 faiss-cpu")
+@pytest.mark.parametrize("index_type", ["hnsw", "ivfpq"])
+def test_ann_index_add_save_load(index_type: str, tmp_path) -> None:
+    """
+    测试近似索引的增量添加、保存与加载，以及相对精确检索的召回率
+    """
+    vectors = _random_vectors(1200)
+    params = {"nlist": 8, "nprobe": 8, "pq_m": 8} if index_type == "ivfpq" else {}
+    index = create_vector_index(index_type, **params)
+    index.build(np.arange(1000), vectors[:1000])
+    index.add(np.arange(1000, 1200), vectors[1000:])
+    assert len(index) == 1200
+    # 内存占用按向量数与编码长度估算，与序列化后的大小相差不大
+    serialized = faiss.serialize_index(index.index).nbytes + index.ids.nbytes
+    assert abs(index.nbytes - serialized) < 0.05 * serialized
+
+    ids, _ = index.search(vectors[1100], 5)
+    assert 1100 in ids.tolist()
+
+    index.save(str(tmp_path))
+    loaded = VectorIndex.load(str(tmp_path))
+    assert loaded.index_type == index_type
+    assert len(loaded) == 1200
+
+    reference = ExactIndex()
+    reference.build(np.arange(1200), vectors)
+    report = evaluate_index(loaded, reference, vectors[:20], k=10)
+    assert report["queries"] == 20
+    assert report["recall_at_k"] > 0.3
+
+
+@pytest.mark.parametrize("index_type", ["int8", "pq"])
+def test_quantized_index_rescoring(index_type: str, tmp_path) -> None:
+    """
+    测试量化索引的保存加载、内存压缩比，以及全精度重排后的召回率
+    """
+    vectors = _random_vectors(1200, dim=64)
+    params = {"pq_m": 16} if index_type == "pq" else {}
+    index = create_vector_index(index_type, **params)
+    index.build(np.arange(1000), vectors[:1000])
+    index.add(np.arange(1000, 1200), vectors[1000:])
+    assert len(index) == 1200
+
+    index.save(str(tmp_path))
+    loaded = VectorIndex.load(str(tmp_path))
+    assert loaded.index_type == index_type
+
+    reference = ExactIndex()
+    reference.build(np.arange(1200), vectors)
+    report = evaluate_index(loaded, reference, vectors[:20], k=10, rescore_factor=4)
+    assert report["bytes"] * 3 < reference.nbytes
+    assert report["rescored_recall_at_k"] >= report["recall_at_k"]
+    assert report["rescored_recall_at_k"] > 0.6
+
+
+def test_quantized_service_does_not_keep_float32_matrix(monkeypatch, tmp_path) -> None:
+    """
+    测试使用量化索引时向量缓存的全精度矩阵写入临时文件映射，不常驻内存，重排仍能取回正确结果
+    """
+    import app.services.rag_service_optimized as rag_service_optimized
+    from app.core.config import settings
+
+    vectors = _random_vectors(300, dim=64)
+    _sqlite_vector_store(monkeypatch, tmp_path, rag_service_optimized, vectors)
+    monkeypatch.setattr(settings, "RAG_EMBEDDING_PROVIDER", "hashing")
+    monkeypatch.setattr(settings, "RAG_PERSISTENT_CACHE_PATH", None)
+    monkeypatch.setattr(settings, "RAG_RESCORE_VECTORS_DIR", str(tmp_path / "rescore"))
+
+    service = rag_service_optimized.OptimizedRAGService(vector_index=create_vector_index("int8"))
+    service._refresh_vector_cache_sync()
+    snapshot = service._vector_cache
+    assert len(snapshot) == 300
+    assert snapshot.is_spilled
+    assert isinstance(snapshot.matrix, np.memmap)
+    assert service.get_cache_stats()["vector_cache_spilled"]
+
+    rows = service._vector_rows(snapshot, vectors[42], 3)
+    assert int(snapshot.ids[rows[0][0]]) == 43
+    assert rows[0][1] == pytest.approx(1.0, abs=1e-5)
+
+    # 增量追加的行同样写入映射文件
+    updated = snapshot.apply_delta([999], vectors[:1], ["新知识"], [None])
+    assert updated.is_spilled
+
+
+def test_rag_service_index_picks_up_new_rows(monkeypatch, tmp_path) -> None:
+    """
+    测试 RAGService 的向量索引按 updated_at 高水位同步其他进程写入的新行，删除的行不再返回
+    """
+    from sqlalchemy.orm import Session
+
+    import app.services.rag_service as rag_service
+    from app.core.config import settings
+    from app.models.vector_store import VectorStore
+    from app.services.embedding_codec import embedding_columns
+
+    monkeypatch.setattr(settings, "RAG_EMBEDDING_PROVIDER", "hashing")
+    monkeypatch.setattr(settings, "RAG_INDEX_PATH", None)
+    vectors = _random_vectors(101, dim=16)
+    engine = _sqlite_vector_store(monkeypatch, tmp_path, rag_service, vectors[:100])
+    service = rag_service.RAGService(vector_index=ExactIndex())
+    assert service._search_with_index(vectors[5], 1)[0]["id"] == 6
+    assert len(service.vector_index) == 100
+
+    with Session(engine) as db:
+        db.add(VectorStore(id=101, content="新知识", source="指南", **embedding_columns(vectors[100], "float32")))
+        db.query(VectorStore).filter(VectorStore.id == 6).update({VectorStore.is_deleted: True})
+        db.commit()
+    # TTL 内不查询数据库
+    assert service._search_with_index(vectors[100], 1)[0]["id"] != 101
+
+    monkeypatch.setattr(settings, "RAG_CACHE_TTL", 0)
+    assert service._search_with_index(vectors[100], 1)[0]["id"] == 101
+    assert len(service.vector_index) == 101
+    assert service._index_stale == 1
+    assert all(result["id"] != 6 for result in service._search_with_index(vectors[5], 3))
+
+
+@pytest.mark.skipif(faiss is None, reason="未安装 faiss-cpu")
+def test_ivfpq_needs_rebuild_after_growth() -> None:
+    """
+    测试 IVF-PQ 在数据较少时训练的聚类中心数不足，规模增长后提示重建，重建后按新规模训练
+    """
+    vectors = _random_vectors(1200)
+    index = create_vector_index("ivfpq", nlist=64, nprobe=8, pq_m=8)
+    index.build(np.arange(300), vectors[:300])
+    assert not index.needs_rebuild()
+
+    index.add(np.arange(300, 1200), vectors[300:])
+    assert index.needs_rebuild()
+
+    index.build(np.arange(1200), vectors)
+    assert index.index.nlist == 1200 // 39
+    assert not index.needs_rebuild()
+
+
+@pytest.mark.parametrize("sleep_every", [50, 5])
+def test_rag_service_filtered_index_search(monkeypatch, tmp_path, sleep_every: int) -> None:
+    """
+    测试带过滤条件的索引检索：候选先按过滤条件缩小（少量时直接重排、较多时放大召回），
+    即使最相似的向量都不满足过滤条件也能返回 k 条过滤后的精确结果
+    """
+    import app.services.rag_service as rag_service
+    from app.core.config import settings
+    from app.services.metadata_filter import normalize_filters
+
+    monkeypatch.setattr(settings, "RAG_EMBEDDING_PROVIDER", "hashing")
+    monkeypatch.setattr(settings, "RAG_INDEX_PATH", None)
+    vectors = _random_vectors(400, dim=16, seed=3)
+    sources = ["睡眠质量" if i % sleep_every == 0 else "营养与饮食" for i in range(400)]
+    _sqlite_vector_store(monkeypatch, tmp_path, rag_service, vectors, sources)
+    service = rag_service.RAGService(vector_index=ExactIndex())
+
+    query = vectors[1]
+    sleep_rows = [i for i in range(400) if sources[i] == "睡眠质量"]
+    scores = normalize_rows(vectors[sleep_rows]) @ normalize_vector(query)
+    expected = [sleep_rows[i] + 1 for i in np.argsort(-scores)[:3]]
+
+    results = service._search_with_index(query, 3, normalize_filters({"topic": "睡眠质量"}))
+    assert [result["id"] for result in results] == expected
+    assert all(result["source"] == "睡眠质量" for result in results)
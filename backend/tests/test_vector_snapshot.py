@@ -0,0 +1,92 @@
+from datetime import datetime
+
+import numpy as np
+
+from app.services.vector_matrix import VectorMatrix, normalize_rows
+from app.services.vector_snapshot import VectorSnapshotStore
+
+
+def test_snapshot_publish_and_memmap_load(tmp_path) -> None:
+    """
+    测试快照发布后以只读内存映射加载，内容、元数据和检索结果与原矩阵一致
+    """
+    vectors = normalize_rows(np.random.default_rng(0).normal(size=(50, 16)))
+    ids = np.arange(50) + 100
+    contents = [f"第{i}条：健康知识" for i in range(50)]
+    updated = [datetime(2024, 1, 1, 0, 0, i) for i in range(50)]
+    store = VectorSnapshotStore(str(tmp_path))
+    manifest = store.publish(
+        ids, vectors, contents, ["来源"] * 50, updated, ['{"keywords": ["睡眠"]}'] + [None] * 49,
+        updated[-1], 0.0
+    )
+
+    assert store.current()["version"] == manifest["version"]
+    data = store.load(manifest)
+    assert isinstance(data["matrix"], np.memmap)
+    assert data["contents"] == contents
+    assert data["updated_at"] == updated
+    assert data["high_water_mark"] == updated[-1]
+
+    snapshot = VectorMatrix.from_normalized(
+        data["ids"], data["matrix"], data["contents"], data["sources"], data["updated_at"]
+    )
+    assert snapshot.is_mapped
+    assert snapshot.search(vectors[3], 1)[0]["id"] == 103
+
+    # 追加新行时复制为进程内矩阵，映射文件保持不变
+    updated_snapshot = snapshot.apply_delta([999], vectors[:1], ["新内容"], [None])
+    assert not updated_snapshot.is_mapped
+    assert len(updated_snapshot) == 51
+
+
+def test_snapshot_builder_lock_and_cleanup(tmp_path) -> None:
+    """
+    测试构建锁互斥，以及只保留最近的快照版本
+    """
+    first, second = VectorSnapshotStore(str(tmp_path)), VectorSnapshotStore(str(tmp_path))
+    assert first.try_acquire_builder()
+    assert not second.try_acquire_builder()
+    first.release_builder()
+    assert second.try_acquire_builder()
+    second.release_builder()
+
+    vectors = normalize_rows(np.ones((2, 4)))
+    for _ in range(4):
+        first.publish(np.array([1, 2]), vectors, ["a", "b"], [None, None], [None, None], [None, None], None, 0.0)
+    assert len([name for name in tmp_path.iterdir() if name.suffix == ".bin"]) == 2
+
+
+def test_matrix_capacity_grows_only_on_append() -> None:
+    """
+    测试新建矩阵只预留少量余量，增量追加在余量内共用缓冲区，放不下时才按倍数扩容
+    """
+    vectors = normalize_rows(np.random.default_rng(1).normal(size=(2600, 8)))
+    matrix = VectorMatrix(np.arange(2000), vectors[:2000], ["x"] * 2000, [None] * 2000)
+    assert matrix._buffer.capacity == 2500
+
+    appended = matrix.apply_delta(np.arange(2000, 2400), vectors[2000:2400], ["y"] * 400, [None] * 400)
+    assert appended._buffer is matrix._buffer
+
+    grown = appended.apply_delta(np.arange(2400, 2600), vectors[2400:], ["z"] * 200, [None] * 200)
+    assert grown._buffer.capacity == 2 * 2600
+    assert len(grown) == 2600
+    assert grown.search(vectors[2500], 1)[0]["id"] == 2500
+
+
+def test_old_snapshot_unaffected_by_delta() -> None:
+    """
+    测试增量刷新后，仍在使用旧快照的读者看到的行不变：旧快照中被更新或删除的 id 仍可取回与重排
+    """
+    vectors = normalize_rows(np.random.default_rng(2).normal(size=(6, 8)))
+    old = VectorMatrix([1, 2, 3, 4], vectors[:4], ["a", "b", "c", "d"], [None] * 4)
+    # 共用缓冲区追加，以及失效行过多时重建缓冲区两种情况
+    for deleted in ([3], [2, 3, 4]):
+        new = old.apply_delta([2, 5], vectors[4:6], ["b2", "e"], [None, None], deleted_ids=deleted)
+        assert old.contents[old.row_of(2)] == "b"
+        assert old.row_of(3) is not None
+        assert old.row_of(5) is None
+        assert [old.contents[row] for row, _ in old.rescore_rows([2, 3, 2], vectors[1], 5)] == ["b", "c"]
+
+        assert new.contents[new.row_of(2)] == "b2"
+        assert new.row_of(3) is None
+        assert new.contents[new.row_of(5)] == "e"
@@ -5,6 +5,7 @@ class AIAssistantManager {
         this.currentUser = null;
         this.healthData = null;
         this.chatHistory = [];
+        this.sessionId = this.createSessionId(); // 服务端据此保存对话上下文
         this.isTyping = false;
         
         this.init();
@@ -102,6 +103,13 @@ class AIAssistantManager {
         });
     }
 
+    createSessionId() {
+        if (window.crypto && window.crypto.randomUUID) {
+            return window.crypto.randomUUID();
+        }
+        return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 10)}`;
+    }
+
     switchMode(mode) {
         if (this.currentMode === mode) return;
         
@@ -243,7 +251,8 @@ class AIAssistantManager {
 
     async sendBasicChat(message) {
         return await this.sendStreamingChat('http://localhost:8000/api/v1/ai/chat/stream', {
-            message: message
+            message: message,
+            session_id: this.sessionId
         });
     }
 
@@ -254,7 +263,8 @@ class AIAssistantManager {
 
         return await this.sendStreamingChat('http://localhost:8000/api/v1/ai/health/chat/stream', {
             message: message,
-            user_data: this.healthData
+            user_data: this.healthData,
+            session_id: this.sessionId
         });
     }
 
@@ -531,6 +541,7 @@ class AIAssistantManager {
             `;
             
             this.chatHistory = [];
+            this.sessionId = this.createSessionId();
             this.showNotification('对话记录已清空', 'success');
         }
     }